@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+Clash Config Auto Builder - 异步节点探测
+基于 asyncio 流的最小 HTTP/1.1 客户端：经本地 HTTP 代理测量延迟、建立 CONNECT 隧道完成 TLS 握手，
+以及访问 mihomo external-controller API。每次请求使用独立连接 (Connection: close)
+"""
+
+import asyncio
+import errno
+import json
+import ssl
+import time
+from functools import lru_cache
+from urllib.parse import urlencode, urlsplit
+
+# 响应头的最大长度，防止异常代理返回无穷无尽的头部
+MAX_HEADER_BYTES = 65536
+
+# 表示本机资源耗尽 (文件描述符、端口、缓冲区) 而非节点自身问题的错误码
+LOCAL_PRESSURE_ERRNOS = {
+    errno.EMFILE, errno.ENFILE, errno.EADDRNOTAVAIL, errno.ENOBUFS, errno.EAGAIN,
+}
+
+
+def create_handshake_context() -> ssl.SSLContext:
+    """
+    TLS 握手测试使用的 SSL 上下文：校验证书链但不校验主机名，与原先 `openssl s_client` 的 "Verify return code: 0 (ok)" 判定一致
+    (目标主机名仍作为 SNI 发送)
+    """
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    return context
+
+
+# 创建 SSL 上下文要加载系统 CA 证书 (每次数十毫秒 CPU)，探测时共享同一个上下文，不在事件循环中反复创建
+@lru_cache(maxsize=None)
+def handshake_context() -> ssl.SSLContext:
+    """TLS 握手测试共享的 SSL 上下文 (见 create_handshake_context)"""
+    return create_handshake_context()
+
+
+@lru_cache(maxsize=None)
+def https_context() -> ssl.SSLContext:
+    """经代理请求 https 测试 URL 时共享的 SSL 上下文 (校验证书链与主机名)"""
+    return ssl.create_default_context()
+
+
+class ProbeError(Exception):
+    """探测失败；phase 标明失败阶段 (connect / tunnel / handshake / request)"""
+
+    def __init__(self, phase: str, message: str):
+        super().__init__(message)
+        self.phase = phase
+
+
+class ProbeTimeout(ProbeError):
+    """探测在 phase 阶段超时"""
+
+
+def is_local_pressure(exc: BaseException) -> bool:
+    """判断异常是否由本机资源耗尽引起"""
+    cause = exc.__cause__ if isinstance(exc, ProbeError) else exc
+    return isinstance(cause, OSError) and cause.errno in LOCAL_PRESSURE_ERRNOS
+
+
+async def _read_head(reader: asyncio.StreamReader) -> tuple:
+    """读取状态行和响应头，返回 (状态码, 小写键的头部字典)"""
+    status_line = await reader.readline()
+    parts = status_line.decode('latin-1').split(None, 2)
+    if len(parts) < 2 or not parts[0].startswith('HTTP/') or not parts[1].isdigit():
+        raise ConnectionError(f"无效的 HTTP 响应: {status_line[:100]!r}")
+
+    headers = {}
+    size = len(status_line)
+    while True:
+        line = await reader.readline()
+        size += len(line)
+        if size > MAX_HEADER_BYTES:
+            raise ConnectionError("HTTP 响应头过长")
+        if line in (b'\r\n', b'\n', b''):
+            break
+        key, _, value = line.decode('latin-1').partition(':')
+        headers[key.strip().lower()] = value.strip()
+    return int(parts[1]), headers
+
+
+async def _read_body(reader: asyncio.StreamReader, headers: dict) -> bytes:
+    """按 Transfer-Encoding / Content-Length 读取响应体，都没有时读到连接关闭"""
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        body = bytearray()
+        while True:
+            size = int((await reader.readline()).split(b';', 1)[0].strip() or b'0', 16)
+            if size == 0:
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return bytes(body)
+            body += await reader.readexactly(size)
+            await reader.readline()
+    if 'content-length' in headers:
+        return await reader.readexactly(int(headers['content-length']))
+    return await reader.read()
+
+
+def _request_bytes(method: str, target: str, host: str) -> bytes:
+    return f"{method} {target} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode('ascii')
+
+
+async def _close(writer: asyncio.StreamWriter) -> None:
+    if writer is None:
+        return
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except (OSError, ssl.SSLError):
+        pass
+
+
+async def _run_phases(coro_factory, timeout: float):
+    """
+    在总超时内执行探测。coro_factory(state) 通过 state['phase'] 记录当前阶段，
+    超时或失败时据此构造 ProbeTimeout / ProbeError。
+    """
+    state = {'phase': 'connect'}
+    try:
+        return await asyncio.wait_for(coro_factory(state), timeout)
+    except asyncio.TimeoutError as e:
+        raise ProbeTimeout(state['phase'], "timed out") from e
+    except ProbeError:
+        raise
+    except (OSError, ssl.SSLError, asyncio.IncompleteReadError, ValueError) as e:
+        raise ProbeError(state['phase'], str(e) or repr(e)) from e
+
+
+async def _open_tunnel(proxy_host: str, proxy_port: int, host: str, port: int, state: dict, timings: dict):
+    """连接本地代理并通过 CONNECT 建立到 host:port 的隧道，返回 (reader, writer)"""
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection(proxy_host, proxy_port)
+    timings['connect'] = (time.perf_counter() - start) * 1000
+
+    state['phase'] = 'tunnel'
+    start = time.perf_counter()
+    try:
+        writer.write(f"CONNECT {host}:{port} HTTP/1.1\r\nHost: {host}:{port}\r\n\r\n".encode('ascii'))
+        await writer.drain()
+        status, _ = await _read_head(reader)
+        if status != 200:
+            raise ConnectionError(f"CONNECT 失败: HTTP {status}")
+    except BaseException:
+        await _close(writer)
+        raise
+    timings['tunnel'] = (time.perf_counter() - start) * 1000
+    return reader, writer
+
+
+async def tls_handshake(proxy_host: str, proxy_port: int, host: str, port: int, timeout: float) -> dict:
+    """
+    经本地 HTTP 代理 (CONNECT 隧道) 与目标主机完成一次 TLS 握手，并校验证书链 (见 create_handshake_context)。
+    返回各阶段耗时 (毫秒): connect (连接本地代理)、tunnel (CONNECT 建立隧道)、handshake (TLS 握手)。
+    """
+    async def run(state):
+        timings = {}
+        _, writer = await _open_tunnel(proxy_host, proxy_port, host, port, state, timings)
+        try:
+            state['phase'] = 'handshake'
+            start = time.perf_counter()
+            await writer.start_tls(handshake_context(), server_hostname=host)
+            timings['handshake'] = (time.perf_counter() - start) * 1000
+            return timings
+        finally:
+            await _close(writer)
+
+    return await _run_phases(run, timeout)
+
+
+async def fetch_via_proxy(proxy_host: str, proxy_port: int, url: str, timeout: float) -> tuple:
+    """
+    经本地 HTTP 代理请求 url (http 直接转发，https 走 CONNECT 隧道)。
+    返回 (状态码, 从发起连接到收到响应头的耗时毫秒)。
+    """
+    parts = urlsplit(url)
+    target_path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+
+    async def run(state):
+        start = time.perf_counter()
+        if parts.scheme == 'https':
+            reader, writer = await _open_tunnel(
+                proxy_host, proxy_port, parts.hostname, parts.port or 443, state, {}
+            )
+            state['phase'] = 'handshake'
+            try:
+                await writer.start_tls(https_context(), server_hostname=parts.hostname)
+            except BaseException:
+                await _close(writer)
+                raise
+            request = _request_bytes('GET', target_path, parts.netloc)
+        else:
+            reader, writer = await asyncio.open_connection(proxy_host, proxy_port)
+            request = _request_bytes('GET', url, parts.netloc)
+        try:
+            state['phase'] = 'request'
+            writer.write(request)
+            await writer.drain()
+            status, _ = await _read_head(reader)
+            return status, (time.perf_counter() - start) * 1000
+        finally:
+            await _close(writer)
+
+    return await _run_phases(run, timeout)
+
+
+async def controller_get(api_url: str, path: str, params: dict = None, timeout: float = 5) -> tuple:
+    """
+    GET mihomo external-controller API，返回 (状态码, 解析后的 JSON；响应体不是 JSON 时为 None)。
+    """
+    parts = urlsplit(api_url)
+    target = path + (f"?{urlencode(params)}" if params else '')
+
+    async def run(state):
+        reader, writer = await asyncio.open_connection(parts.hostname, parts.port)
+        try:
+            state['phase'] = 'request'
+            writer.write(_request_bytes('GET', target, parts.netloc))
+            await writer.drain()
+            status, headers = await _read_head(reader)
+            body = await _read_body(reader, headers)
+        finally:
+            await _close(writer)
+        try:
+            return status, json.loads(body) if body else None
+        except ValueError:
+            return status, None
+
+    return await _run_phases(run, timeout)
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Clash Config Auto Builder - 持久化键值缓存
+基于 SQLite 的单文件缓存，支持按条目 TTL 过期和 LRU 容量淘汰，可在 CI 运行之间恢复
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class PersistentCache:
+    """
+    SQLite 键值缓存。值以 JSON 存储；每个条目记录过期时间与最近使用时间，
+    调用 evict() 时先清理过期条目，再按最近使用时间淘汰超出容量的部分。
+    """
+
+    # SQLite 单条语句的参数个数有限，批量查询时按此大小分块
+    _CHUNK_SIZE = 500
+
+    def __init__(self, path: str, ttl: float = None, max_entries: int = None):
+        """
+        Args:
+            path: 缓存数据库文件路径
+            ttl: 默认过期时间 (秒)，None 表示永不过期
+            max_entries: 最大条目数，None 表示不限制
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            ' key TEXT PRIMARY KEY,'
+            ' value TEXT NOT NULL,'
+            ' expires_at REAL,'
+            ' last_used REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries (last_used)')
+        self._conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    @staticmethod
+    def _decode_rows(rows) -> dict:
+        """解码查询到的 (key, value) 行；无法解码的条目 (如其他程序写入的二进制值) 视为未命中"""
+        decoded = {}
+        for key, value in rows:
+            try:
+                decoded[key] = json.loads(value)
+            except (ValueError, TypeError):
+                continue
+        return decoded
+
+    def get(self, key: str, default=None):
+        """读取单个条目，未命中或已过期时返回 default"""
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys) -> dict:
+        """批量读取条目，返回命中的 {key: value}，并刷新它们的最近使用时间"""
+        keys = list(dict.fromkeys(keys))
+        now = time.time()
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), self._CHUNK_SIZE):
+                chunk = keys[i:i + self._CHUNK_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f'SELECT key, value FROM entries WHERE key IN ({placeholders})'
+                    f' AND (expires_at IS NULL OR expires_at > ?)',
+                    (*chunk, now)
+                ).fetchall()
+                found.update(self._decode_rows(rows))
+            if found:
+                self._conn.executemany(
+                    'UPDATE entries SET last_used = ? WHERE key = ?',
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+        return found
+
+    def items(self) -> dict:
+        """读取全部未过期的条目 {key: value}，不刷新最近使用时间"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT key, value FROM entries WHERE expires_at IS NULL OR expires_at > ?', (time.time(),)
+            ).fetchall()
+        return self._decode_rows(rows)
+
+    def set(self, key: str, value, ttl: float = None) -> None:
+        """写入单个条目，ttl 为空时使用默认 TTL"""
+        self.set_many({key: value}, ttl)
+
+    def set_many(self, items: dict, ttl: float = None) -> None:
+        """批量写入条目，ttl 为空时使用默认 TTL"""
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        rows = [
+            (key, json.dumps(value, ensure_ascii=False, separators=(',', ':')), expires_at, now)
+            for key, value in items.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO entries (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)',
+                rows
+            )
+            self._conn.commit()
+
+    def evict(self) -> int:
+        """清理过期条目并按 LRU 淘汰超出容量的条目，返回删除的条目数"""
+        with self._lock:
+            removed = self._conn.execute(
+                'DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?', (time.time(),)
+            ).rowcount
+            if self.max_entries is not None:
+                removed += self._conn.execute(
+                    'DELETE FROM entries WHERE key IN ('
+                    ' SELECT key FROM entries ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+                    (self.max_entries,)
+                ).rowcount
+            self._conn.commit()
+        return removed
+
+    def close(self) -> None:
+        """淘汰多余条目并关闭数据库连接"""
+        if self._conn is None:
+            return
+        self.evict()
+        with self._lock:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Clash Config Auto Builder - 自适应并发控制
+AIMD (加性增、乘性减) 并发上限：根据超时率和本机压力 (事件循环延迟、系统负载、资源耗尽错误)
+动态调整同时进行中的探测数量
+"""
+
+import asyncio
+import os
+from collections import deque
+
+# 探测结果分类
+OUTCOME_OK = 'ok'
+OUTCOME_TIMEOUT = 'timeout'
+OUTCOME_LOCAL_ERROR = 'local_error'
+
+
+def _load_per_cpu() -> float:
+    """1 分钟平均负载除以 CPU 核心数；平台不支持时返回 0"""
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return 0.0
+
+
+class AimdLimiter:
+    """
+    异步并发上限。每完成 window 个探测评估一次：
+    超时率明显高于基线 (可能是本机或上游被压垮)，或出现本机压力时，上限乘以 decrease；
+    否则上限加上 increase。基线是超时率的指数滑动平均，正常窗口快速跟随、拥塞窗口缓慢跟随，
+    以便吸收 "这一批节点本来就大量超时" 这类与负载无关的变化。
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, window: int = 50,
+                 increase: int = 16, decrease: float = 0.7, timeout_margin: float = 0.15,
+                 max_loop_lag: float = 0.2, max_load_per_cpu: float = 2.0, logger=None):
+        """
+        Args:
+            initial / minimum / maximum: 初始、最小、最大并发上限
+            window: 每完成多少个探测评估一次
+            increase: 正常窗口的加性增量
+            decrease: 拥塞窗口的乘性减因子
+            timeout_margin: 超时率超过基线多少视为拥塞
+            max_loop_lag: 事件循环调度延迟 (秒) 超过此值视为 CPU 压力
+            max_load_per_cpu: 每核平均负载超过此值视为 CPU 压力
+            logger: 日志记录器
+        """
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        self.window = window
+        self.increase = increase
+        self.decrease = decrease
+        self.timeout_margin = timeout_margin
+        self.max_loop_lag = max_loop_lag
+        self.max_load_per_cpu = max_load_per_cpu
+        self.logger = logger
+
+        self.in_flight = 0
+        self.loop_lag = 0.0
+        self.baseline = None
+        self.peak_limit = self.limit
+        self.lowest_limit = self.limit
+        self._waiters = deque()
+        self._window_counts = {OUTCOME_OK: 0, OUTCOME_TIMEOUT: 0, OUTCOME_LOCAL_ERROR: 0}
+        self._monitor = None
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < self.limit:
+            future = self._waiters.popleft()
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+
+    async def acquire(self) -> None:
+        """等待一个并发名额"""
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            # 名额已分配但任务被取消时归还名额
+            if future.done() and not future.cancelled():
+                self.in_flight -= 1
+                self._wake()
+            raise
+
+    def release(self, outcome: str = OUTCOME_OK) -> None:
+        """归还名额并记录本次探测的结果分类"""
+        self.in_flight -= 1
+        self._window_counts[outcome] = self._window_counts.get(outcome, 0) + 1
+        if sum(self._window_counts.values()) >= self.window:
+            self._adjust()
+        self._wake()
+
+    def _adjust(self) -> None:
+        counts = self._window_counts
+        total = sum(counts.values())
+        timeout_rate = counts[OUTCOME_TIMEOUT] / total
+        if self.baseline is None:
+            self.baseline = timeout_rate
+
+        reasons = []
+        if counts[OUTCOME_LOCAL_ERROR]:
+            reasons.append(f"本机资源错误 {counts[OUTCOME_LOCAL_ERROR]} 次")
+        if timeout_rate > self.baseline + self.timeout_margin:
+            reasons.append(f"超时率 {timeout_rate:.0%} 高于基线 {self.baseline:.0%}")
+        if self.loop_lag > self.max_loop_lag:
+            reasons.append(f"事件循环延迟 {self.loop_lag * 1000:.0f}ms")
+        load = _load_per_cpu()
+        if load > self.max_load_per_cpu:
+            reasons.append(f"每核负载 {load:.1f}")
+
+        previous = self.limit
+        if reasons:
+            self.limit = max(self.minimum, int(self.limit * self.decrease))
+            self.baseline += (timeout_rate - self.baseline) * 0.05
+        else:
+            self.limit = min(self.maximum, self.limit + self.increase)
+            self.baseline += (timeout_rate - self.baseline) * 0.3
+        self.peak_limit = max(self.peak_limit, self.limit)
+        self.lowest_limit = min(self.lowest_limit, self.limit)
+
+        if self.logger and self.limit != previous:
+            detail = f" ({', '.join(reasons)})" if reasons else ''
+            self.logger.debug(f"并发上限 {previous} -> {self.limit}{detail}")
+        self._window_counts = dict.fromkeys(counts, 0)
+
+    async def _monitor_loop_lag(self, interval: float) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            lag = max(0.0, loop.time() - start - interval)
+            self.loop_lag = self.loop_lag * 0.7 + lag * 0.3
+
+    def start(self, interval: float = 0.1) -> None:
+        """启动事件循环延迟监控 (需在事件循环中调用)"""
+        if self._monitor is None:
+            self._monitor = asyncio.get_running_loop().create_task(self._monitor_loop_lag(interval))
+
+    async def stop(self) -> None:
+        """停止事件循环延迟监控"""
+        if self._monitor is not None:
+            self._monitor.cancel()
+            try:
+                await self._monitor
+            except asyncio.CancelledError:
+                pass
+            self._monitor = None
@@ -31,6 +31,9 @@ BLACKLIST_KEYWORDS = [
     '日期', '免费', '关注', '回国', 'CN', 'China', '中国'
 ]
 
+# 所有黑名单关键词合并为一个正则，每个名称只扫描一次 (没有关键词时永不匹配)
+BLACKLIST_PATTERN = re.compile('|'.join(re.escape(keyword) for keyword in BLACKLIST_KEYWORDS) or '(?!)')
+
 # =============================================================================
 # DNS 解析配置
 # =============================================================================
@@ -44,6 +47,23 @@ class DnsConfig:
     # sjz yd
     ECS_IP = '183.198.0.1'
 
+    # 单次查询超时 (秒) 与超时后的重试次数 (重试时轮换服务器)
+    QUERY_TIMEOUT = float(os.getenv('DNS_QUERY_TIMEOUT', '2'))
+    QUERY_RETRIES = int(os.getenv('DNS_QUERY_RETRIES', '2'))
+
+    # 同时进行中的 DNS 查询上限
+    MAX_CONCURRENCY = int(os.getenv('DNS_MAX_CONCURRENCY', '500'))
+
+    # 解析结果缓存文件名 (位于 PathConfig.CACHE_DIR 下)
+    CACHE_FILE_NAME = 'dns_cache.sqlite'
+
+    # 缓存 TTL 的上下限 (秒)，记录自身 TTL 会被限制在此范围内
+    CACHE_MIN_TTL = int(os.getenv('DNS_CACHE_MIN_TTL', '60'))
+    CACHE_MAX_TTL = int(os.getenv('DNS_CACHE_MAX_TTL', '86400'))
+
+    # 无法解析的域名的负缓存时长 (秒)
+    NEGATIVE_TTL = int(os.getenv('DNS_NEGATIVE_TTL', '1800'))
+
 
 # =============================================================================
 # 节点测试配置
@@ -64,6 +84,10 @@ class NodeTestConfig:
     # 测试配置文件名
     TEST_CONFIG_FILE = "config_for_test.yaml"
 
+    # 结果日志的磁盘同步 (fsync) 频率：累计的记录条数与时间间隔 (秒)，先到者触发
+    JOURNAL_FSYNC_RECORDS = int(os.getenv('JOURNAL_FSYNC_RECORDS', '256'))
+    JOURNAL_FSYNC_INTERVAL = float(os.getenv('JOURNAL_FSYNC_INTERVAL', '1.0'))
+
 # =============================================================================
 # 文件路径配置
 # =============================================================================
@@ -73,14 +97,117 @@ class PathConfig:
     
     # 配置输出目录
     CONFIG_DIR = "config"
+
+    # 跨运行持久化缓存目录 (由 CI 缓存恢复)
+    CACHE_DIR = os.getenv('CACHE_DIR', '.cache')
     
     # 模板文件
     CONFIG_TEMPLATE = "config-template.yaml"
     
     # 临时文件
-    TEMP_MERGED_FILE = "all_merged_nodes.yaml"
     HEALTHY_NODES_FILE = "healthy_nodes_list.yaml"
 
+    # 配置文件清单 (各文件的哈希、大小、节点数与 ETag)
+    MANIFEST_FILE = os.path.join(CONFIG_DIR, "manifest.json")
+
+# =============================================================================
+# 订阅下载与解析缓存配置
+# =============================================================================
+class SubscriptionConfig:
+    # 订阅链接 (空格分隔)
+    URL_LIST = os.getenv('URL_LIST', '')
+
+    # 并发下载数 (同时也是连接池大小)、单次请求超时 (秒) 与失败重试次数
+    MAX_WORKERS = int(os.getenv('FETCH_MAX_WORKERS', '16'))
+    TIMEOUT = float(os.getenv('FETCH_TIMEOUT', '30'))
+    RETRIES = int(os.getenv('FETCH_RETRIES', '2'))
+
+    # 请求使用的 User-Agent：不少订阅服务按 UA 决定返回 Clash YAML 还是 base64 链接列表
+    USER_AGENT = os.getenv('FETCH_USER_AGENT', 'clash.meta')
+
+    # 条件请求缓存：每个链接的 ETag / Last-Modified 记录与上次下载的内容
+    FETCH_CACHE_FILE = os.path.join(PathConfig.CACHE_DIR, 'fetch_cache.sqlite')
+    BODY_DIR = os.path.join(PathConfig.CACHE_DIR, 'subscriptions')
+    FETCH_CACHE_TTL = int(os.getenv('FETCH_CACHE_TTL', str(7 * 24 * 3600)))
+
+    # 解析结果缓存：按订阅文件内容的哈希保存解析出的节点，内容未变的文件不再解析
+    PARSE_CACHE_FILE = os.path.join(PathConfig.CACHE_DIR, 'parse_cache.sqlite')
+    PARSE_CACHE_TTL = int(os.getenv('PARSE_CACHE_TTL', str(7 * 24 * 3600)))
+    PARSE_CACHE_MAX_ENTRIES = int(os.getenv('PARSE_CACHE_MAX_ENTRIES', '500'))
+
+# =============================================================================
+# 连通性预筛配置
+# =============================================================================
+class PrefilterConfig:
+    # 单个端点的 TCP 连接超时 (秒)
+    CONNECT_TIMEOUT = float(os.getenv('PREFILTER_TIMEOUT', '3'))
+
+    # 连接失败后的重试次数 (只对超时重试，拒绝连接视为确定不可达)
+    RETRIES = int(os.getenv('PREFILTER_RETRIES', '1'))
+
+    # 同时进行中的连接上限
+    MAX_CONCURRENCY = int(os.getenv('PREFILTER_MAX_CONCURRENCY', '1000'))
+
+    # 只走 UDP 的协议：无法用 TCP 握手判断，改为发送单字节数据报并等待 ICMP 端口不可达
+    UDP_ONLY_TYPES = {'hysteria', 'hysteria2', 'tuic', 'wireguard'}
+
+    # 下游测试中单个不可达节点的平均耗时 (秒)，用于估算节省的时间
+    DOWNSTREAM_COST = float(os.getenv('PREFILTER_DOWNSTREAM_COST', '5'))
+
+# =============================================================================
+# 节点格式验证配置
+# =============================================================================
+class ValidationConfig:
+    # 每次 mihomo -t 调用中批量验证的节点数
+    BATCH_SIZE = int(os.getenv('VALIDATE_BATCH_SIZE', '200'))
+
+    # 并行运行的批次数，默认等于 CPU 核心数
+    MAX_JOBS = int(os.getenv('VALIDATE_JOBS', str(os.cpu_count() or 1)))
+
+    # 验证结果缓存文件 (按节点指纹 + mihomo 版本索引)
+    CACHE_FILE = os.path.join(PathConfig.CACHE_DIR, 'validation_cache.sqlite')
+
+    # 缓存条目有效期 (秒) 与最大条目数
+    CACHE_TTL = int(os.getenv('VALIDATE_CACHE_TTL', str(7 * 24 * 3600)))
+    CACHE_MAX_ENTRIES = int(os.getenv('VALIDATE_CACHE_MAX_ENTRIES', '200000'))
+
+# =============================================================================
+# 节点健康历史配置
+# =============================================================================
+class HistoryConfig:
+    # 健康历史数据库 (按节点指纹索引)
+    FILE = os.path.join(PathConfig.CACHE_DIR, 'health_history.sqlite')
+
+    # 每个节点保留的最近测试次数
+    MAX_SAMPLES = int(os.getenv('HISTORY_MAX_SAMPLES', '20'))
+
+    # 连续失败多少次后视为长期失效，开始退避
+    DEAD_THRESHOLD = int(os.getenv('HISTORY_DEAD_THRESHOLD', '3'))
+
+    # 长期失效节点的复测间隔 (秒)：从 BACKOFF_BASE 开始每次失败翻倍，不超过 BACKOFF_MAX
+    BACKOFF_BASE = int(os.getenv('HISTORY_BACKOFF_BASE', str(4 * 3600)))
+    BACKOFF_MAX = int(os.getenv('HISTORY_BACKOFF_MAX', str(7 * 24 * 3600)))
+
+    # 多久没有再出现的节点会被清理 (秒) 与最大节点数
+    TTL = int(os.getenv('HISTORY_TTL', str(30 * 24 * 3600)))
+    MAX_ENTRIES = int(os.getenv('HISTORY_MAX_ENTRIES', '200000'))
+
+# =============================================================================
+# 跨运行去重索引配置
+# =============================================================================
+class SeenIndexConfig:
+    # 去重索引数据库 (按去重键记录上次被淘汰的节点)，设为空字符串时禁用
+    FILE = os.getenv('SEEN_INDEX_FILE', os.path.join(PathConfig.CACHE_DIR, 'seen_index.sqlite'))
+
+    # 各阶段淘汰记录的有效期 (秒)，期满后节点重新走完整流程
+    # 无法解析: 默认 12 小时，须长于 CI 的运行间隔 (每 4 小时)，否则下次运行前记录已过期 (DNS 负缓存默认只有 30 分钟)；
+    # 格式无效: 与验证缓存一致 (升级 mihomo 后最迟在此期限后重新验证)；长期失效: 由健康历史的退避复测时间决定
+    RESOLVE_TTL = int(os.getenv('SEEN_RESOLVE_TTL', str(12 * 3600)))
+    VALIDATE_TTL = int(os.getenv('SEEN_VALIDATE_TTL', str(ValidationConfig.CACHE_TTL)))
+
+    # 最大条目数
+    MAX_ENTRIES = int(os.getenv('SEEN_INDEX_MAX_ENTRIES', '200000'))
+
 # =============================================================================
 # 配置生成规则
 # =============================================================================
@@ -99,6 +226,28 @@ CONFIGS_TO_GENERATE = [
     {"filter": "au", "output": "config/config_au.yaml", "template": "config-template.yaml"},
 ]
 
+# =============================================================================
+# proxy-providers 输出配置
+# =============================================================================
+class ProviderConfig:
+    # 配置文件的输出格式: inline (节点内联在每个配置文件中) / provider (节点放在各地区的 provider 文件中)
+    OUTPUT_FORMAT = os.getenv('CONFIG_OUTPUT_FORMAT', 'inline')
+
+    # provider 文件的下载地址模板，{repo} 为 GitHub 仓库名，{file} 为 provider 文件相对仓库根目录的路径
+    URL_TEMPLATE = os.getenv('PROVIDER_URL_TEMPLATE', 'https://cdn.jsdelivr.net/gh/{repo}@main/{file}')
+    REPOSITORY = os.getenv('GITHUB_REPOSITORY', 'busymilk/clash_config_auto_build')
+
+    # 客户端更新 provider 的间隔 (秒) 与健康检查设置
+    INTERVAL = int(os.getenv('PROVIDER_INTERVAL', '3600'))
+    HEALTH_CHECK_URL = os.getenv('PROVIDER_HEALTH_CHECK_URL', 'https://cp.cloudflare.com/generate_204')
+    HEALTH_CHECK_INTERVAL = int(os.getenv('PROVIDER_HEALTH_CHECK_INTERVAL', '300'))
+
+    # 不属于任何地区的节点所在 provider 的名称
+    OTHER_REGION = 'other'
+
+    # 额外写出的预压缩副本 (逗号分隔: gz, br)，br 需要安装 brotli
+    PRECOMPRESS = os.getenv('PRECOMPRESS', '')
+
 # =============================================================================
 # GitHub Actions 配置
 # =============================================================================
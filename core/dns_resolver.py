@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+Clash Config Auto Builder - 异步 DNS 解析器
+纯 Python 实现的 UDP DNS 客户端：直接构造/解析 DNS 报文，支持 EDNS 客户端子网 (ECS)、
+CNAME 跟随、IPv6 优先，以及单 socket 多请求流水线、超时重试和并发上限
+"""
+
+import asyncio
+import ipaddress
+import random
+import struct
+
+# DNS 记录类型
+TYPE_A = 1
+TYPE_CNAME = 5
+TYPE_AAAA = 28
+TYPE_OPT = 41
+
+# 响应码
+RCODE_NOERROR = 0
+RCODE_NXDOMAIN = 3
+
+# EDNS 选项：客户端子网
+EDNS_OPTION_ECS = 8
+
+# CNAME 链最多跟随的层数
+MAX_CNAME_HOPS = 8
+
+
+class DnsError(Exception):
+    """DNS 报文格式错误或查询失败"""
+
+
+def encode_name(name: str) -> bytes:
+    """将域名编码为 DNS 线格式 (不使用压缩)"""
+    labels = [label for label in name.rstrip('.').split('.') if label]
+    encoded = b''
+    for label in labels:
+        try:
+            raw = label.encode('idna')
+        except (UnicodeError, ValueError) as e:
+            # 标签过长或含有 IDNA 不允许的字符，视为无法解析
+            raise DnsError(f"域名标签无法编码: {label!r} ({e})") from e
+        if len(raw) > 63:
+            raise DnsError(f"域名标签过长: {label}")
+        encoded += bytes([len(raw)]) + raw
+    return encoded + b'\x00'
+
+
+def decode_name(message: bytes, offset: int) -> tuple:
+    """
+    从报文中解析域名，处理压缩指针。
+
+    Returns:
+        (域名, 紧随域名之后的偏移量)
+    """
+    labels = []
+    end_offset = None
+    jumps = 0
+    while True:
+        if offset >= len(message):
+            raise DnsError("域名越界")
+        length = message[offset]
+        if length & 0xC0 == 0xC0:
+            if offset + 1 >= len(message):
+                raise DnsError("压缩指针越界")
+            if end_offset is None:
+                end_offset = offset + 2
+            offset = ((length & 0x3F) << 8) | message[offset + 1]
+            jumps += 1
+            if jumps > 64:
+                raise DnsError("压缩指针循环")
+            continue
+        offset += 1
+        if length == 0:
+            break
+        labels.append(message[offset:offset + length].decode('ascii', errors='replace'))
+        offset += length
+    return '.'.join(labels), end_offset if end_offset is not None else offset
+
+
+def build_ecs_option(ecs_ip: str) -> bytes:
+    """构造 EDNS 客户端子网选项 (IPv4 使用 /24，IPv6 使用 /56)"""
+    ip = ipaddress.ip_address(ecs_ip)
+    family, prefix = (1, 24) if ip.version == 4 else (2, 56)
+    address = ip.packed[:(prefix + 7) // 8]
+    data = struct.pack('!HBB', family, prefix, 0) + address
+    return struct.pack('!HH', EDNS_OPTION_ECS, len(data)) + data
+
+
+def build_query(txid: int, name: str, rtype: int, ecs_option: bytes = None) -> bytes:
+    """构造一个递归查询报文，提供 ecs_option 时附带 EDNS OPT 记录"""
+    header = struct.pack('!HHHHHH', txid, 0x0100, 1, 0, 0, 1 if ecs_option else 0)
+    question = encode_name(name) + struct.pack('!HH', rtype, 1)
+    if not ecs_option:
+        return header + question
+    opt = b'\x00' + struct.pack('!HHIH', TYPE_OPT, 4096, 0, len(ecs_option)) + ecs_option
+    return header + question + opt
+
+
+def parse_response(message: bytes) -> dict:
+    """
+    解析响应报文。
+
+    Returns:
+        {'id', 'rcode', 'truncated', 'answers': [(owner, rtype, value, ttl)]}
+        其中 A/AAAA 的 value 为 IP 字符串，CNAME 的 value 为目标域名
+    """
+    if len(message) < 12:
+        raise DnsError("报文过短")
+    txid, flags, qdcount, ancount, _, _ = struct.unpack('!HHHHHH', message[:12])
+    offset = 12
+    for _ in range(qdcount):
+        _, offset = decode_name(message, offset)
+        offset += 4
+
+    answers = []
+    for _ in range(ancount):
+        owner, offset = decode_name(message, offset)
+        if offset + 10 > len(message):
+            raise DnsError("资源记录越界")
+        rtype, _, ttl, rdlength = struct.unpack('!HHIH', message[offset:offset + 10])
+        offset += 10
+        rdata = message[offset:offset + rdlength]
+        if rtype == TYPE_A and rdlength == 4:
+            answers.append((owner, rtype, str(ipaddress.IPv4Address(rdata)), ttl))
+        elif rtype == TYPE_AAAA and rdlength == 16:
+            answers.append((owner, rtype, str(ipaddress.IPv6Address(rdata)), ttl))
+        elif rtype == TYPE_CNAME:
+            target, _ = decode_name(message, offset)
+            answers.append((owner, rtype, target, ttl))
+        offset += rdlength
+
+    return {
+        'id': txid,
+        'rcode': flags & 0x000F,
+        'truncated': bool(flags & 0x0200),
+        'answers': answers,
+    }
+
+
+class _DnsClientProtocol(asyncio.DatagramProtocol):
+    """单个上游服务器的 UDP 连接，按事务 ID 将响应分发给等待中的查询"""
+
+    def __init__(self):
+        self.transport = None
+        self.pending = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if len(data) < 2:
+            return
+        future = self.pending.pop(struct.unpack('!H', data[:2])[0], None)
+        if future and not future.done():
+            future.set_result(data)
+
+    def error_received(self, exc):
+        # ICMP 不可达等错误无法对应到具体查询，交由超时重试处理
+        pass
+
+    def connection_lost(self, exc):
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(DnsError(f"连接已关闭: {exc}"))
+        self.pending.clear()
+
+
+class AsyncDnsResolver:
+    """
+    基于 asyncio 的 UDP DNS 解析器。
+    每个上游服务器只使用一个 socket，多个查询通过事务 ID 并行复用 (流水线)；
+    超时后轮换到下一个服务器重试，全局并发由信号量限制。
+    """
+
+    def __init__(self, servers: list, ecs_ip: str = None, timeout: float = 2.0,
+                 retries: int = 2, max_concurrency: int = 500, logger=None, port: int = 53):
+        """
+        Args:
+            servers: 上游 DNS 服务器 IP 列表，第一个为首选
+            port: 上游服务器端口
+            ecs_ip: ECS 使用的客户端 IP，为空则不携带 ECS
+            timeout: 单次查询超时 (秒)
+            retries: 超时后的重试次数
+            max_concurrency: 同时进行中的查询上限
+            logger: 日志记录器
+        """
+        self.servers = list(servers)
+        self.port = port
+        self.timeout = timeout
+        self.retries = retries
+        self.max_concurrency = max_concurrency
+        self.logger = logger
+        self.ecs_option = None
+        if ecs_ip:
+            try:
+                self.ecs_option = build_ecs_option(ecs_ip)
+            except ValueError:
+                if logger:
+                    logger.warning(f"无效的ECS IP地址: '{ecs_ip}'，已禁用ECS功能。")
+        self._semaphore = None
+        self._protocols = {}
+
+    async def _get_protocol(self, server: str) -> _DnsClientProtocol:
+        protocol = self._protocols.get(server)
+        if protocol is None or protocol.transport is None or protocol.transport.is_closing():
+            loop = asyncio.get_running_loop()
+            _, protocol = await loop.create_datagram_endpoint(_DnsClientProtocol, remote_addr=(server, self.port))
+            self._protocols[server] = protocol
+        return protocol
+
+    async def _send(self, server: str, name: str, rtype: int, use_ecs: bool) -> dict:
+        protocol = await self._get_protocol(server)
+        txid = random.randrange(0x10000)
+        while txid in protocol.pending:
+            txid = random.randrange(0x10000)
+        future = asyncio.get_running_loop().create_future()
+        protocol.pending[txid] = future
+        try:
+            protocol.transport.sendto(build_query(txid, name, rtype, self.ecs_option if use_ecs else None))
+            data = await asyncio.wait_for(future, self.timeout)
+        finally:
+            protocol.pending.pop(txid, None)
+        return parse_response(data)
+
+    async def query(self, name: str, rtype: int, use_ecs: bool = True) -> dict:
+        """
+        查询单条记录，超时后轮换服务器重试。
+
+        Returns:
+            parse_response 的结果；所有尝试均失败时返回 None
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                server = self.servers[attempt % len(self.servers)]
+                try:
+                    return await self._send(server, name, rtype, use_ecs)
+                except (asyncio.TimeoutError, OSError, DnsError) as e:
+                    if self.logger:
+                        self.logger.debug(f"查询 {name} (类型 {rtype}) 于 {server} 失败 (第 {attempt + 1} 次): {e!r}")
+        return None
+
+    async def _lookup_address(self, domain: str, rtype: int) -> tuple:
+        """
+        查询指定类型的地址记录，沿 CNAME 链跟随。
+
+        Returns:
+            (ip, ttl)；无记录时返回 (None, None)
+        """
+        name = domain
+        min_ttl = None
+        for _ in range(MAX_CNAME_HOPS):
+            response = await self.query(name, rtype)
+            if not response or response['rcode'] != RCODE_NOERROR:
+                return None, None
+
+            aliases = {}
+            for owner, record_type, value, ttl in response['answers']:
+                if record_type == TYPE_CNAME:
+                    aliases[owner.lower()] = (value, ttl)
+
+            # 从查询名开始沿响应中的 CNAME 链前进
+            current = name.lower()
+            seen = set()
+            while current in aliases and current not in seen:
+                seen.add(current)
+                target, ttl = aliases[current]
+                if self.logger and rtype == TYPE_AAAA and current == domain.lower():
+                    self.logger.info(f"域名 '{domain}' 的 CNAME 是 '{target}'，将解析新域名。")
+                min_ttl = ttl if min_ttl is None else min(min_ttl, ttl)
+                current = target.lower()
+
+            for owner, record_type, value, ttl in response['answers']:
+                if record_type == rtype and owner.lower() == current:
+                    return value, ttl if min_ttl is None else min(min_ttl, ttl)
+
+            if current == name.lower():
+                return None, None
+            # 响应只给出了 CNAME 而没有最终地址，继续查询链尾的域名
+            name = current
+        return None, None
+
+    async def resolve(self, domain: str) -> tuple:
+        """
+        解析域名，优先返回 IPv6 (AAAA)，没有时回退到 IPv4 (A)。
+
+        Returns:
+            (ip, ttl)；无法解析时返回 (None, None)
+        """
+        ip, ttl = await self._lookup_address(domain, TYPE_AAAA)
+        if ip:
+            return ip, ttl
+        return await self._lookup_address(domain, TYPE_A)
+
+    async def resolve_many(self, domains) -> dict:
+        """并发解析多个域名，返回 {domain: (ip, ttl)}"""
+        domains = list(dict.fromkeys(domains))
+        results = await asyncio.gather(*(self.resolve(domain) for domain in domains))
+        return dict(zip(domains, results))
+
+    def close(self) -> None:
+        """关闭所有上游连接"""
+        for protocol in self._protocols.values():
+            if protocol.transport:
+                protocol.transport.close()
+        self._protocols.clear()
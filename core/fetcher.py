@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Clash Config Auto Builder - 订阅下载器
+在共享连接池的 requests 会话上并发下载订阅，按链接缓存 ETag / Last-Modified 与上次下载的内容：
+服务器返回 304 时直接复用缓存的内容，不再传输响应体；请求声明接受 gzip (以及安装 brotli 时的 br) 压缩。
+每个链接写出到名称固定的文件，内容未变时文件也逐字节不变，下游的解析缓存因此可以命中。
+"""
+
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry, make_headers
+
+from core.cache import PersistentCache
+from core.logger import setup_logger
+
+# 下载结果状态
+STATUS_UPDATED = 'updated'            # 200，内容有变化 (或首次下载)
+STATUS_UNCHANGED = 'unchanged'        # 200，内容与缓存相同 (服务器不支持条件请求)
+STATUS_NOT_MODIFIED = 'not_modified'  # 304，复用缓存的内容
+STATUS_STALE = 'stale'                # 请求失败，复用上次缓存的内容
+STATUS_FAILED = 'failed'              # 请求失败且没有缓存
+
+# 请求失败后重试的状态码
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def subscription_file_name(url: str) -> str:
+    """由链接生成固定的文件名：路径部分 (去掉查询串，非法字符换成 _) 加上链接哈希的前 8 位，避免不同链接重名"""
+    parts = urlsplit(url)
+    base = re.sub(r'[^\w.-]+', '_', parts.path.strip('/')) or parts.hostname or 'subscription'
+    return f"{base[:80]}_{hashlib.sha256(url.encode('utf-8')).hexdigest()[:8]}.txt"
+
+
+def create_session(pool_size: int, retries: int, user_agent: str) -> requests.Session:
+    """创建下载订阅用的连接池会话：连接失败和 429/5xx 响应按指数退避重试"""
+    session = requests.Session()
+    retry = Retry(
+        total=retries, backoff_factor=1, status_forcelist=_RETRY_STATUSES, allowed_methods=frozenset({'GET'})
+    )
+    adapter = HTTPAdapter(pool_connections=max(pool_size, 1), pool_maxsize=max(pool_size, 1), max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = user_agent
+    # 已安装 brotli 时包含 br
+    session.headers['Accept-Encoding'] = make_headers(accept_encoding=True)['accept-encoding']
+    return session
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    """先写临时文件再替换，中断时不会留下半个文件"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+class SubscriptionFetcher:
+    """
+    订阅下载器。条件请求缓存 (PersistentCache) 按链接记录 {etag, lm (Last-Modified), sha (内容 SHA-256)}，
+    上次下载的内容保存在 body_dir 下与输出文件同名的文件中。
+    """
+
+    def __init__(self, cache_file: str = None, body_dir: str = None, max_workers: int = 16, timeout: float = 30,
+                 retries: int = 2, user_agent: str = 'clash.meta', cache_ttl: float = None, logger=None):
+        """
+        Args:
+            cache_file: 条件请求缓存文件路径，None 表示每次都完整下载
+            body_dir: 保存上次下载内容的目录 (与 cache_file 一同使用)
+            max_workers: 并发下载数 (同时也是连接池大小)
+            timeout: 单次请求的超时 (秒)
+            retries: 失败重试次数
+            user_agent: 请求使用的 User-Agent
+            cache_ttl: 链接多久未被下载后清理其缓存记录 (秒)
+        """
+        self.logger = logger or setup_logger("fetcher")
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self.session = create_session(self.max_workers, retries, user_agent)
+        self.cache = None
+        self.body_dir = None
+        if cache_file and body_dir:
+            try:
+                self.cache = PersistentCache(cache_file, ttl=cache_ttl)
+                os.makedirs(body_dir, exist_ok=True)
+                self.body_dir = body_dir
+            except Exception as e:
+                self.logger.warning(f"无法打开下载缓存 {cache_file}，将完整下载全部订阅: {e}")
+                self.cache = None
+
+    def close(self) -> None:
+        """关闭连接池与缓存"""
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+
+    def _cached_body(self, name: str, entry: dict):
+        """返回缓存的上次内容，没有记录或文件已丢失时返回 None"""
+        if entry is None or self.body_dir is None:
+            return None
+        try:
+            with open(os.path.join(self.body_dir, name), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _fetch(self, url: str, entry: dict) -> tuple:
+        """
+        下载单个链接。
+
+        Returns:
+            (结果 {url, file, status, size, wire, elapsed, error}, 内容 bytes 或 None, 新的缓存记录 或 None)
+        """
+        name = subscription_file_name(url)
+        result = {'url': url, 'file': name, 'status': STATUS_FAILED, 'size': 0, 'wire': 0, 'elapsed': 0.0, 'error': None}
+        cached_body = self._cached_body(name, entry)
+        headers = {}
+        if cached_body is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('lm'):
+                headers['If-Modified-Since'] = entry['lm']
+
+        start = time.perf_counter()
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+            if response.status_code == 304 and cached_body is not None:
+                body, status, new_entry = cached_body, STATUS_NOT_MODIFIED, entry
+            else:
+                response.raise_for_status()
+                body = response.content
+                digest = hashlib.sha256(body).hexdigest()
+                status = STATUS_UNCHANGED if entry is not None and entry.get('sha') == digest else STATUS_UPDATED
+                new_entry = {'etag': response.headers.get('ETag'), 'lm': response.headers.get('Last-Modified'), 'sha': digest}
+                if self.body_dir is not None and (status == STATUS_UPDATED or cached_body is None):
+                    _write_atomic(os.path.join(self.body_dir, name), body)
+            # 线路上实际传输的响应体字节数 (压缩后)
+            result['wire'] = response.raw.tell() if response.raw is not None else len(response.content)
+        except (requests.RequestException, OSError) as e:
+            result['error'] = str(e)
+            if cached_body is None:
+                result['elapsed'] = time.perf_counter() - start
+                return result, None, None
+            body, status, new_entry = cached_body, STATUS_STALE, None
+        result.update(status=status, size=len(body), elapsed=time.perf_counter() - start)
+        return result, body, new_entry
+
+    def fetch_all(self, urls: list, output_dir: str) -> list:
+        """
+        并发下载所有链接，把内容写出到 output_dir 下的固定文件名 (见 subscription_file_name)。
+        请求失败但有缓存时写出上次的内容；没有缓存时不写出。
+
+        Returns:
+            按 urls 顺序的下载结果列表
+        """
+        urls = list(dict.fromkeys(urls))
+        os.makedirs(output_dir, exist_ok=True)
+        entries = self.cache.get_many(urls) if self.cache is not None else {}
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, max(len(urls), 1))) as executor:
+            fetched = list(executor.map(lambda url: self._fetch(url, entries.get(url)), urls))
+
+        results, updates = [], {}
+        for result, body, new_entry in fetched:
+            results.append(result)
+            if body is not None:
+                _write_atomic(os.path.join(output_dir, result['file']), body)
+            if new_entry is not None:
+                updates[result['url']] = new_entry
+        if self.cache is not None and updates:
+            self.cache.set_many(updates)
+        self._prune_bodies({result['file'] for result in results})
+        return results
+
+    def _prune_bodies(self, keep: set) -> None:
+        """删除不再出现在链接列表中的订阅的缓存内容"""
+        if self.body_dir is None:
+            return
+        for name in os.listdir(self.body_dir):
+            if name not in keep:
+                try:
+                    os.remove(os.path.join(self.body_dir, name))
+                except OSError:
+                    pass
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Clash Config Auto Builder - 节点指纹
+为代理节点计算与名称无关的稳定哈希，用于跨运行的缓存与历史记录；
+以及只由协议相关字段决定的去重键，用于合并去重和跨运行的去重索引
+"""
+
+import hashlib
+import json
+
+# 不影响节点身份的字段：名称、流水线附加的 server_url，以及只改变本地拨号行为的客户端选项
+DEDUPE_IGNORED_FIELDS = frozenset({
+    'name', 'server_url', 'udp', 'tfo', 'fast-open', 'mptcp',
+    'interface-name', 'routing-mark', 'ip-version', 'dialer-proxy',
+})
+
+# 不区分大小写的字段 (统一转为小写)
+_CASE_INSENSITIVE_FIELDS = frozenset({'type', 'server', 'cipher', 'network'})
+
+# 取值为整数的字段 (订阅中常写成字符串)
+_INTEGER_FIELDS = frozenset({'port', 'alterId'})
+
+# 取值为布尔的字段 (订阅中常写成 "true"/"false")
+_BOOLEAN_FIELDS = frozenset({'tls', 'skip-cert-verify'})
+
+
+def canonical_proxy(proxy: dict) -> dict:
+    """
+    返回节点的规范化副本：去掉 name 和以下划线开头的内部临时字段 (如 _delay)
+    """
+    return {k: v for k, v in proxy.items() if k != 'name' and not str(k).startswith('_')}
+
+
+def proxy_fingerprint(proxy: dict) -> str:
+    """
+    计算节点指纹：规范化后按键排序序列化为 JSON，再取 SHA-256
+    """
+    if not isinstance(proxy, dict):
+        # core.node.Node 会缓存自身的指纹
+        return proxy.fingerprint
+    payload = json.dumps(
+        canonical_proxy(proxy), sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _normalize_value(key, value):
+    """规范化单个字段值，空值 (None、空字符串、空列表/字典) 返回 None 表示省略"""
+    if isinstance(value, dict):
+        normalized = {}
+        for k, v in value.items():
+            v = _normalize_value(k, v)
+            if v is not None:
+                normalized[str(k)] = v
+        return normalized or None
+    if isinstance(value, (list, tuple)):
+        normalized = [_normalize_value(None, v) for v in value]
+        normalized = [v for v in normalized if v is not None]
+        return normalized or None
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return None
+        if key in _CASE_INSENSITIVE_FIELDS:
+            value = value.lower()
+        if key in _INTEGER_FIELDS:
+            try:
+                return int(value)
+            except ValueError:
+                return value
+        if key in _BOOLEAN_FIELDS and value.lower() in ('true', 'false'):
+            return value.lower() == 'true'
+    return value
+
+
+def dedupe_key(proxy) -> str:
+    """
+    计算节点 (dict 或 Node) 的去重键：只取协议相关的字段 (忽略 DEDUPE_IGNORED_FIELDS 与内部临时字段)，
+    服务器取原始地址 (有 server_url 时使用它，解析前后的域名节点得到相同的键)，
+    字段值去除首尾空白、统一大小写与数值类型并省略空值，按键排序序列化后取 SHA-256。
+    uuid、密码、传输层等任一字段不同的节点得到不同的键。
+    """
+    if not isinstance(proxy, dict):
+        proxy = proxy.to_dict()
+    canonical = {}
+    for key, value in proxy.items():
+        key = str(key)
+        if key in DEDUPE_IGNORED_FIELDS or key.startswith('_'):
+            continue
+        value = _normalize_value(key, value)
+        if value is not None:
+            canonical[key] = value
+    server_url = proxy.get('server_url')
+    if server_url:
+        canonical['server'] = _normalize_value('server', server_url)
+    payload = json.dumps(canonical, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def fingerprint_shard(fingerprint: str, shard_count: int) -> int:
+    """
+    根据节点指纹确定节点所属的分片序号 (0 到 shard_count-1)，同一节点在任何机器上都落在同一分片
+    """
+    return int(fingerprint[:16], 16) % shard_count
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Clash Config Auto Builder - 节点健康历史
+按节点指纹记录跨运行的测试结果 (最近若干次的通过/失败、延迟样本、失败阶段)，
+用于安排测试顺序、对长期失效节点退避复测，以及按稳定性对节点排序
+"""
+
+import math
+import time
+
+from core.cache import PersistentCache
+from core.fingerprint import proxy_fingerprint
+
+# 测试顺序的分层：历史健康 < 无历史 < 近期失败 < 长期失效
+TIER_HEALTHY = 0
+TIER_NEW = 1
+TIER_FAILING = 2
+TIER_DEAD = 3
+
+
+def _percentile(values: list, q: float) -> float:
+    """最近秩法百分位数"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1))
+    return ordered[index]
+
+
+def stability_stats(record: dict) -> dict:
+    """
+    计算节点的稳定性指标: uptime (通过率)、p50/p90 (延迟毫秒) 与 score。
+    score = uptime * 1000 / (1000 + p90)，取值 0-1，越大越稳定；没有历史时返回 None。
+    """
+    if not record or not record.get('o'):
+        return None
+    outcomes = record['o']
+    latencies = record.get('l') or []
+    uptime = outcomes.count('1') / len(outcomes)
+    p50 = _percentile(latencies, 0.5) if latencies else None
+    p90 = _percentile(latencies, 0.9) if latencies else None
+    score = uptime * 1000 / (1000 + p90) if p90 is not None else 0.0
+    return {'uptime': uptime, 'p50': p50, 'p90': p90, 'score': score, 'samples': len(outcomes)}
+
+
+class HealthHistory:
+    """
+    节点健康历史存储。每个节点一条紧凑记录 (存放在 PersistentCache 中):
+    o: 最近的测试结果串 ('1' 通过 / '0' 失败，新结果在末尾)，l: 最近的延迟样本 (毫秒)，
+    st: 最近一次失败的阶段，cf: 连续失败次数，nc: 长期失效节点的下次复测时间，t: 最近测试时间。
+    """
+
+    def __init__(self, path: str, max_samples: int = 20, dead_threshold: int = 3,
+                 backoff_base: float = 4 * 3600, backoff_max: float = 7 * 24 * 3600,
+                 ttl: float = None, max_entries: int = None):
+        """
+        Args:
+            path: 历史数据库文件路径
+            max_samples: 每个节点保留的最近测试次数
+            dead_threshold: 连续失败多少次后开始退避
+            backoff_base / backoff_max: 退避复测间隔的初始值与上限 (秒)
+            ttl: 节点多久未被测试后清理 (秒)
+            max_entries: 最大节点数
+        """
+        self.max_samples = max_samples
+        self.dead_threshold = dead_threshold
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.store = PersistentCache(path, ttl=ttl, max_entries=max_entries)
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def lookup(self, proxies: list) -> dict:
+        """返回 {节点下标: 历史记录}，只包含有历史的节点"""
+        keys = [proxy_fingerprint(proxy) for proxy in proxies]
+        found = self.store.get_many(keys)
+        return {i: found[key] for i, key in enumerate(keys) if key in found}
+
+    def plan(self, proxies: list, now: float = None) -> tuple:
+        """
+        安排测试顺序：历史健康的节点按稳定性从高到低排在最前，其次是新节点和近期失败的节点，
+        到期复测的长期失效节点排在最后；尚在退避期内的长期失效节点本轮跳过。
+
+        Returns:
+            (按顺序待测试的节点列表, 本轮跳过的节点列表)
+        """
+        now = time.time() if now is None else now
+        records = self.lookup(proxies)
+        ordered, skipped = [], []
+        for i, proxy in enumerate(proxies):
+            record = records.get(i)
+            if record is None:
+                ordered.append((TIER_NEW, 0.0, i))
+                continue
+            if record.get('cf', 0) >= self.dead_threshold:
+                if record.get('nc') and record['nc'] > now:
+                    skipped.append(proxy)
+                else:
+                    ordered.append((TIER_DEAD, 0.0, i))
+                continue
+            stats = stability_stats(record)
+            tier = TIER_HEALTHY if stats['uptime'] > 0 and record.get('cf', 0) == 0 else TIER_FAILING
+            ordered.append((tier, -stats['score'], i))
+        ordered.sort()
+        return [proxies[i] for _, _, i in ordered], skipped
+
+    def record(self, results: list, now: float = None) -> list:
+        """
+        记录一轮测试结果。
+
+        Args:
+            results: [(proxy, passed, latency_ms 或 None, 失败阶段 或 None)]
+
+        Returns:
+            本轮处于退避期的长期失效节点 [(proxy, 下次复测时间)]
+        """
+        now = time.time() if now is None else now
+        existing = self.lookup([proxy for proxy, _, _, _ in results])
+        updates = {}
+        backoff = []
+        for i, (proxy, passed, latency, stage) in enumerate(results):
+            record = existing.get(i) or {'o': '', 'l': [], 'st': None, 'cf': 0, 'nc': None}
+            record['o'] = (record['o'] + ('1' if passed else '0'))[-self.max_samples:]
+            if latency is not None:
+                record['l'] = (record['l'] + [int(latency)])[-self.max_samples:]
+            record['t'] = now
+            if passed:
+                record['cf'] = 0
+                record['nc'] = None
+            else:
+                record['st'] = stage
+                record['cf'] = record.get('cf', 0) + 1
+                overdue = record['cf'] - self.dead_threshold
+                if overdue >= 0:
+                    record['nc'] = now + min(self.backoff_max, self.backoff_base * (2 ** min(overdue, 30)))
+                    backoff.append((proxy, record['nc']))
+            updates[proxy_fingerprint(proxy)] = record
+        self.store.set_many(updates)
+        return backoff
+
+    def stats_for(self, proxies: list) -> dict:
+        """返回 {节点下标: stability_stats}，只包含有历史的节点"""
+        return {i: stability_stats(record) for i, record in self.lookup(proxies).items()}
+
+    def close(self) -> None:
+        """清理过期节点并关闭数据库"""
+        self.store.close()
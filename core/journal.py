@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Clash Config Auto Builder - 测试结果日志
+只追加的 JSONL 日志：每得出一个节点的结论就写入一行并交给操作系统，定期同步到磁盘，
+进程中断后可据此跳过已有结论的节点，并在最后由日志汇总出结果文件
+"""
+
+import json
+import os
+import threading
+import time
+
+
+class ResultJournal:
+    """
+    线程安全的只追加 JSONL 日志。每行是一个 JSON 对象，重复的键以最后一行为准；
+    读取时忽略中断写入造成的不完整末行。
+
+    每条记录写入后立即 flush (进程被终止也不会丢失)，但 fsync 只在累计 fsync_records 条
+    或距上次同步超过 fsync_interval 秒时以及关闭时执行：fsync 会阻塞调用方 (asyncio 引擎中即事件循环)，
+    逐条同步会拖慢测试并推高自适应并发所依据的事件循环延迟。
+    """
+
+    def __init__(self, path: str, resume: bool = False, fsync_records: int = 256, fsync_interval: float = 1.0):
+        """
+        Args:
+            path: 日志文件路径
+            resume: True 时保留已有内容并在其后追加，否则清空重新开始
+            fsync_records: 累计多少条未同步的记录后执行 fsync
+            fsync_interval: 距上次 fsync 超过多少秒后，下一次写入时执行 fsync
+        """
+        self.path = path
+        self.fsync_records = max(1, fsync_records)
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a' if resume else 'w', encoding='utf-8')
+        if resume and self._file.tell() > 0:
+            # 上次中断可能留下不完整的末行，先换行，避免与新记录粘连
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    self._file.write('\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def append(self, record: dict) -> None:
+        """写入一条记录并刷新到操作系统，按条数或时间间隔同步到磁盘"""
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_records or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def _sync(self) -> None:
+        """将已写入的记录同步到磁盘 (调用方持有锁)"""
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        """同步剩余记录并关闭文件"""
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                if self._unsynced:
+                    self._sync()
+                self._file.close()
+
+    @staticmethod
+    def load(path: str, key: str) -> dict:
+        """读取日志，返回 {record[key]: 最后一条 record}；文件不存在时返回空字典"""
+        records = {}
+        if not os.path.exists(path):
+            return records
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict) and key in record:
+                    records[record[key]] = record
+        return records
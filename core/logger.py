@@ -38,8 +38,9 @@ def setup_logger(name: str, level: str = None) -> logging.Logger:
     formatter = logging.Formatter(LogConfig.FORMAT)
     console_handler.setFormatter(formatter)
     
-    # 添加处理器到日志记录器
+    # 添加处理器到日志记录器；不再向根记录器传播，避免与其他脚本的 basicConfig 重复输出
     logger.addHandler(console_handler)
+    logger.propagate = False
     
     return logger
 
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Clash Config Auto Builder - 紧凑的节点模型
+流水线中同时驻留的节点可达十万级，普通 dict 的哈希表和每个字段值的对象开销占据了大部分内存。
+Node 用 __slots__ 保存身份字段 (名称、类型、服务器、端口) 与流水线附加的字段 (server_url、_delay)，
+其余协议相关的字段打包为一段 pickle 字节串，只在需要时解包；键的顺序元组在所有同构节点间共享。
+与 Clash 的 dict 表示可以无损互转 (包括键的顺序)。
+"""
+
+import pickle
+
+from core.fingerprint import proxy_fingerprint
+
+# 由 slot 保存的字段: {dict 中的键: slot 名}
+_SLOT_FIELDS = {
+    'name': 'name',
+    'type': '_type',
+    'server': '_server',
+    'port': '_port',
+    'server_url': '_server_url',
+    '_delay': 'delay',
+}
+
+# 参与指纹计算的 slot (名称与 _delay 不参与)
+_IDENTITY_SLOTS = frozenset({'_type', '_server', '_port', '_server_url'})
+
+# 同构节点共用的键顺序元组 (协议种类有限，元组数量很少)
+_KEY_ORDERS = {}
+
+
+def _shared_keys(keys: tuple) -> tuple:
+    return _KEY_ORDERS.setdefault(keys, keys)
+
+
+class Node:
+    """
+    代理节点。身份字段直接作为属性访问；修改影响指纹的字段 (type、server、port、server_url)
+    或其余字段 (set) 时自动使缓存的指纹失效。名称与 _delay 不参与指纹计算。
+    """
+
+    __slots__ = ('name', '_type', '_server', '_port', '_server_url', 'delay', '_keys', '_packed', '_fingerprint')
+
+    def __init__(self, name=None, type=None, server=None, port=None, server_url=None, delay=None):
+        self.name = name
+        self._type = type
+        self._server = server
+        self._port = port
+        self._server_url = server_url
+        self.delay = delay
+        self._keys = ()
+        self._packed = None
+        self._fingerprint = None
+
+    @classmethod
+    def from_dict(cls, proxy: dict) -> 'Node':
+        """由 Clash 节点 dict 构造 (不修改传入的 dict)"""
+        node = cls.__new__(cls)
+        get = proxy.get
+        node.name = get('name')
+        node._type = get('type')
+        node._server = get('server')
+        node._port = get('port')
+        node._server_url = get('server_url')
+        node.delay = get('_delay')
+        node._keys = _shared_keys(tuple(proxy))
+        extra = tuple(value for key, value in proxy.items() if key not in _SLOT_FIELDS)
+        node._packed = pickle.dumps(extra, protocol=pickle.HIGHEST_PROTOCOL) if extra else None
+        node._fingerprint = None
+        return node
+
+    def to_dict(self) -> dict:
+        """还原为 Clash 节点 dict (新对象)，键的顺序与构造时相同；新设置的 slot 字段追加在末尾"""
+        extra = iter(pickle.loads(self._packed)) if self._packed is not None else iter(())
+        proxy = {}
+        for key in self._keys:
+            slot = _SLOT_FIELDS.get(key)
+            proxy[key] = getattr(self, slot) if slot is not None else next(extra)
+        for key, slot in _SLOT_FIELDS.items():
+            if key not in proxy:
+                value = getattr(self, slot)
+                if value is not None:
+                    proxy[key] = value
+        return proxy
+
+    @property
+    def extra(self) -> dict:
+        """协议相关的其余字段 (解包得到的新 dict，修改它不会影响节点，请使用 set)"""
+        if self._packed is None:
+            return {}
+        return dict(zip((key for key in self._keys if key not in _SLOT_FIELDS), pickle.loads(self._packed)))
+
+    def get(self, key, default=None):
+        """与 dict.get 相同的只读访问，便于同时接受 dict 与 Node 的辅助函数"""
+        slot = _SLOT_FIELDS.get(key)
+        if slot is not None:
+            value = getattr(self, slot)
+            return default if value is None and key not in self._keys else value
+        return self.extra.get(key, default)
+
+    def set(self, key, value) -> None:
+        """设置任意字段；修改身份字段或其余字段时使缓存的指纹失效"""
+        slot = _SLOT_FIELDS.get(key)
+        if slot is not None:
+            setattr(self, slot, value)
+            if slot in _IDENTITY_SLOTS:
+                self._fingerprint = None
+            return
+        extra = self.extra
+        extra[key] = value
+        if key not in self._keys:
+            self._keys = _shared_keys(self._keys + (key,))
+        self._packed = pickle.dumps(tuple(extra[k] for k in self._keys if k not in _SLOT_FIELDS), protocol=pickle.HIGHEST_PROTOCOL)
+        self._fingerprint = None
+
+    @property
+    def fingerprint(self) -> str:
+        """与名称无关的节点指纹 (见 core.fingerprint)，计算一次后缓存"""
+        if self._fingerprint is None:
+            self._fingerprint = proxy_fingerprint(self.to_dict())
+        return self._fingerprint
+
+    def _identity_property(slot: str):
+        def getter(self):
+            return getattr(self, slot)
+
+        def setter(self, value):
+            setattr(self, slot, value)
+            self._fingerprint = None
+        return property(getter, setter)
+
+    type = _identity_property('_type')
+    server = _identity_property('_server')
+    port = _identity_property('_port')
+    server_url = _identity_property('_server_url')
+    del _identity_property
+
+    def __getstate__(self):
+        return (self.name, self._type, self._server, self._port, self._server_url, self.delay,
+                self._keys, self._packed, self._fingerprint)
+
+    def __setstate__(self, state):
+        (self.name, self._type, self._server, self._port, self._server_url, self.delay,
+         keys, self._packed, self._fingerprint) = state
+        self._keys = _shared_keys(keys)
+
+    def __repr__(self) -> str:
+        return f"Node(name={self.name!r}, type={self._type!r}, server={self._server!r}, port={self._port!r})"
+
+
+def as_node(proxy) -> Node:
+    """dict 转为 Node，已是 Node 时原样返回"""
+    return proxy if isinstance(proxy, Node) else Node.from_dict(proxy)
+
+
+def as_dict(proxy) -> dict:
+    """Node 转为 dict，已是 dict 时原样返回 (不复制)"""
+    return proxy.to_dict() if isinstance(proxy, Node) else proxy
+
+
+def as_nodes(proxies: list) -> list:
+    return [as_node(proxy) for proxy in proxies]
+
+
+def as_dicts(proxies: list) -> list:
+    return [as_dict(proxy) for proxy in proxies]
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Clash Config Auto Builder - 进程内流水线
+按顺序执行各处理阶段，阶段之间直接传递节点列表，不再经由中间 YAML 文件；
+记录每个阶段的耗时与节点数，只在调试时按需写出各阶段的结果
+"""
+
+import os
+import time
+
+from core.logger import setup_logger
+from core.node import as_dicts
+from core.yaml_io import dump_yaml
+
+
+class Pipeline:
+    """
+    由若干阶段组成的流水线。每个阶段是一个接收上一阶段的节点列表、返回新节点列表的函数；
+    第一个阶段接收 None。某个阶段没有产出任何节点时流水线提前结束。
+    """
+
+    def __init__(self, dump_dir: str = None, logger=None):
+        """
+        Args:
+            dump_dir: 调试用目录，指定时把每个阶段的结果写出为 <序号>_<阶段名>.yaml
+            logger: 日志记录器，默认使用 "pipeline"
+        """
+        self.dump_dir = dump_dir
+        self.logger = logger or setup_logger("pipeline")
+        self.stages = []
+        self.timings = []
+
+    def add_stage(self, name: str, func) -> 'Pipeline':
+        """追加一个阶段，返回自身以便链式调用"""
+        self.stages.append((name, func))
+        return self
+
+    def run(self, nodes: list = None) -> list:
+        """依次执行所有阶段，返回最后一个阶段的结果 (提前结束时为空列表)"""
+        self.timings = []
+        for number, (name, func) in enumerate(self.stages, 1):
+            input_count = len(nodes) if nodes is not None else None
+            self.logger.info(f"=== 阶段 {number}/{len(self.stages)}: {name} ===")
+            start = time.perf_counter()
+            nodes = func(nodes)
+            elapsed = time.perf_counter() - start
+            nodes = nodes if nodes is not None else []
+            self.timings.append((name, elapsed, input_count, len(nodes)))
+            self.logger.info(f"阶段 {name} 完成，耗时 {elapsed:.2f}s，产出 {len(nodes)} 个节点")
+            if self.dump_dir:
+                self.dump_stage(number, name, nodes)
+            if not nodes:
+                self.logger.error(f"阶段 {name} 没有产出任何节点，流水线提前结束。")
+                break
+        self.report()
+        return nodes
+
+    def dump_stage(self, number: int, name: str, nodes: list) -> None:
+        """把阶段结果写出为调试文件 (与对应脚本的输出文件格式相同)"""
+        os.makedirs(self.dump_dir, exist_ok=True)
+        path = os.path.join(self.dump_dir, f"{number:02d}_{name}.yaml")
+        with open(path, 'w', encoding='utf-8') as f:
+            dump_yaml({'proxies': as_dicts(nodes)}, f, allow_unicode=True, default_flow_style=False)
+        self.logger.info(f"已写出阶段 {name} 的调试文件: {path}")
+
+    def report(self) -> None:
+        """输出各阶段的耗时与节点数"""
+        total = sum(elapsed for _, elapsed, _, _ in self.timings)
+        self.logger.info(f"--- 流水线耗时报告 (共 {total:.2f}s) ---")
+        for name, elapsed, input_count, output_count in self.timings:
+            share = elapsed / total * 100 if total else 0.0
+            counts = f"{input_count} -> {output_count}" if input_count is not None else f"{output_count}"
+            self.logger.info(f"  {name:<10} {elapsed:>8.2f}s ({share:5.1f}%)  节点 {counts}")
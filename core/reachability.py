@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Clash Config Auto Builder - 端点连通性检测
+基于 asyncio 的大规模并发 TCP 连接探测；只走 UDP 的协议通过 ICMP 端口不可达判断
+"""
+
+import asyncio
+import socket
+
+from core.async_probe import LOCAL_PRESSURE_ERRNOS
+
+# 探测结论
+REACHABLE = 'reachable'
+UNREACHABLE = 'unreachable'
+UNKNOWN = 'unknown'
+
+
+class _UdpProbeProtocol(asyncio.DatagramProtocol):
+    """发送一个单字节数据报，收到任何响应视为可达、收到 ICMP 错误视为不可达"""
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+
+    def connection_made(self, transport):
+        # asyncio 会忽略空数据报，因此发送一个字节
+        transport.sendto(b'\x00')
+
+    def datagram_received(self, data, addr):
+        if not self.future.done():
+            self.future.set_result(REACHABLE)
+
+    def error_received(self, exc):
+        if not self.future.done():
+            self.future.set_result(UNREACHABLE)
+
+
+class ReachabilityChecker:
+    """
+    对 (server, port, 传输协议) 端点进行并发连通性检测，全局并发由信号量限制。
+    本机资源耗尽导致的失败记为 UNKNOWN，调用方不应据此丢弃节点。
+    """
+
+    def __init__(self, timeout: float = 3.0, retries: int = 1, max_concurrency: int = 1000, logger=None):
+        """
+        Args:
+            timeout: 单次连接超时 (秒)，UDP 探测等待 ICMP 的时长也使用此值
+            retries: 超时后的重试次数
+            max_concurrency: 同时进行中的探测上限
+            logger: 日志记录器
+        """
+        self.timeout = timeout
+        self.retries = retries
+        self.max_concurrency = max_concurrency
+        self.logger = logger
+        self._semaphore = None
+
+    async def _check_tcp(self, host: str, port: int) -> str:
+        for attempt in range(self.retries + 1):
+            try:
+                _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), self.timeout)
+            except asyncio.TimeoutError:
+                continue
+            except OSError as e:
+                if e.errno in LOCAL_PRESSURE_ERRNOS:
+                    return UNKNOWN
+                if self.logger:
+                    self.logger.debug(f"{host}:{port} (tcp) 不可达: {e!r}")
+                return UNREACHABLE
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+            return REACHABLE
+        if self.logger:
+            self.logger.debug(f"{host}:{port} (tcp) 连接超时 ({self.retries + 1} 次)")
+        return UNREACHABLE
+
+    async def _check_udp(self, host: str, port: int) -> str:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        try:
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: _UdpProbeProtocol(future), remote_addr=(host, port)
+            )
+        except socket.gaierror:
+            return UNREACHABLE
+        except OSError as e:
+            return UNKNOWN if e.errno in LOCAL_PRESSURE_ERRNOS else UNREACHABLE
+        try:
+            # 没有响应也没有 ICMP 错误是 UDP 服务的常态，无法判断时保留节点
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            return UNKNOWN
+        finally:
+            transport.close()
+
+    async def check(self, host: str, port: int, transport: str = 'tcp') -> str:
+        """检测单个端点，返回 REACHABLE / UNREACHABLE / UNKNOWN"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            if transport == 'udp':
+                return await self._check_udp(host, port)
+            return await self._check_tcp(host, port)
+
+    async def check_many(self, endpoints) -> dict:
+        """并发检测多个 (host, port, transport) 端点，返回 {endpoint: 结论}"""
+        endpoints = list(dict.fromkeys(endpoints))
+        results = await asyncio.gather(*(self.check(*endpoint) for endpoint in endpoints))
+        return dict(zip(endpoints, results))
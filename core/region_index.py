@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Clash Config Auto Builder - 地区分类索引
+把所有地区正则合并为一个表达式，每个节点名称只扫描一次，即可得到它匹配的全部地区
+"""
+
+import re
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+# 可以写成局部 (?flags:...) 的正则标志
+_SCOPED_FLAGS = (
+    (re.IGNORECASE, 'i'), (re.MULTILINE, 'm'), (re.DOTALL, 's'), (re.VERBOSE, 'x'), (re.ASCII, 'a'),
+)
+_REPEATS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT}
+if hasattr(sre_constants, 'POSSESSIVE_REPEAT'):
+    _REPEATS.add(sre_constants.POSSESSIVE_REPEAT)
+
+
+def _scoped(pattern: re.Pattern, text: str = None) -> str:
+    """把正则 (或给定的片段) 连同其标志转写为可嵌入合并表达式的局部分组"""
+    flags = ''.join(letter for flag, letter in _SCOPED_FLAGS if pattern.flags & flag)
+    text = pattern.pattern if text is None else text
+    return f"(?{flags}:{text})" if flags else f"(?:{text})"
+
+
+def _first_chars(items) -> set:
+    """
+    返回解析后的正则序列在匹配时必然消耗的第一个字符的可能集合 (只收集字面字符)；
+    无法确定 (可能零宽匹配、字符类、通配符等) 时返回 None。
+    """
+    for op, av in items:
+        if op is sre_constants.AT:
+            continue
+        if op is sre_constants.LITERAL:
+            return {av}
+        if op is sre_constants.IN:
+            if all(kind is sre_constants.LITERAL for kind, _ in av):
+                return {value for _, value in av}
+            return None
+        if op is sre_constants.BRANCH:
+            chars = set()
+            for branch in av[1]:
+                branch_chars = _first_chars(branch)
+                if branch_chars is None:
+                    return None
+                chars |= branch_chars
+            return chars
+        if op is sre_constants.SUBPATTERN:
+            _, add_flags, del_flags, body = av
+            return None if add_flags or del_flags else _first_chars(body)
+        if op in _REPEATS:
+            return _first_chars(av[2]) if av[0] >= 1 else None
+        return None
+    return None
+
+
+class RegionIndex:
+    """
+    地区分类索引。扫描表达式是所有地区正则的零宽前瞻合并，并在前面加上由各地区首字符组成的字符类守卫，
+    因此正则引擎在一次扫描中就能跳过任何地区都不可能开始匹配的位置，只在候选位置上尝试各地区分支；
+    在每个候选位置上再依次锚定匹配"编号不小于 k 的地区"，找出在该位置开始匹配的全部地区。
+    一个地区匹配名称，当且仅当它在某个位置开始匹配，所以结果与逐个 pattern.search 完全一致。
+    """
+
+    def __init__(self, patterns: dict):
+        """
+        Args:
+            patterns: {地区键: 已编译的正则}，如 FILTER_PATTERNS
+        """
+        self.keys = list(patterns)
+        self.patterns = patterns
+        self._scanner = None
+        self._from = []
+        # 带捕获分组的正则 (可能含反向引用) 合并后编号会错位，此时退回逐个匹配
+        if not self.keys or any(p.groups for p in patterns.values()):
+            return
+        parts = [_scoped(patterns[key]) for key in self.keys]
+        guard = self._guard([patterns[key] for key in self.keys])
+        try:
+            self._scanner = re.compile(f"{guard}(?={'|'.join(parts)})")
+            self._from = [re.compile('|'.join(f"({part})" for part in parts[k:])) for k in range(len(parts))]
+        except re.error:
+            self._scanner = None
+
+    @staticmethod
+    def _guard(patterns: list) -> str:
+        """由各地区可能的首字符构造零宽守卫；任何地区无法确定首字符时不加守卫"""
+        # 标志相同的地区共用一个字符类
+        by_flags = {}
+        for pattern in patterns:
+            try:
+                chars = _first_chars(sre_parse.parse(pattern.pattern, pattern.flags))
+            except (re.error, TypeError, ValueError):
+                chars = None
+            if not chars:
+                return ''
+            _, flag_chars = by_flags.setdefault(pattern.flags, (pattern, set()))
+            flag_chars |= chars
+        classes = [
+            _scoped(pattern, '[' + ''.join(re.escape(chr(c)) for c in sorted(chars)) + ']')
+            for pattern, chars in by_flags.values()
+        ]
+        return f"(?={'|'.join(classes)})"
+
+    def classify(self, name: str) -> set:
+        """返回名称匹配的全部地区键"""
+        if self._scanner is None:
+            return {key for key in self.keys if self.patterns[key].search(name)}
+        matched = set()
+        count = len(self.keys)
+        for candidate in self._scanner.finditer(name):
+            start = candidate.start()
+            k = 0
+            while k < count:
+                match = self._from[k].match(name, start)
+                if match is None:
+                    break
+                k += match.lastindex
+                matched.add(self.keys[k - 1])
+        return matched
+
+    def build(self, names: list) -> dict:
+        """
+        对名称列表建立倒排索引，返回 {地区键: [名称下标, ...]}，下标保持原有顺序；
+        没有任何匹配的地区对应空列表。
+        """
+        index = {key: [] for key in self.keys}
+        for i, name in enumerate(names):
+            for key in self.classify(name):
+                index[key].append(i)
+        return index
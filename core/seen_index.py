@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Clash Config Auto Builder - 跨运行去重索引
+按去重键记录在某个阶段被淘汰的节点 (无法解析、格式无效、长期失效)，
+下次合并时在解析之前直接丢弃仍在有效期内的节点，免去它们在 DNS 解析、格式验证和延迟测试中的开销
+"""
+
+from core.cache import PersistentCache
+from core.constants import SeenIndexConfig
+
+# 淘汰阶段
+STAGE_RESOLVE = 'resolve'
+STAGE_VALIDATE = 'validate'
+STAGE_TEST = 'test'
+
+STAGE_LABELS = {
+    STAGE_RESOLVE: '无法解析',
+    STAGE_VALIDATE: '格式无效',
+    STAGE_TEST: '长期失效',
+}
+
+
+class SeenIndex:
+    """
+    去重索引存储。每个被淘汰的节点一条记录 {st: 淘汰阶段}，键为 core.fingerprint.dedupe_key，
+    有效期由写入时的阶段决定，过期后节点重新走完整流程。
+    """
+
+    def __init__(self, path: str, max_entries: int = None):
+        """
+        Args:
+            path: 索引数据库文件路径
+            max_entries: 最大条目数
+        """
+        self.store = PersistentCache(path, max_entries=max_entries)
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def load(self) -> dict:
+        """返回全部仍在有效期内的记录 {去重键: 淘汰阶段}"""
+        return {key: record.get('st') for key, record in self.store.items().items()}
+
+    def reject(self, stage: str, expirations: dict) -> None:
+        """
+        记录一批在 stage 阶段被淘汰的节点。
+
+        Args:
+            expirations: {去重键: 有效期 (秒)}，有效期不大于 0 的节点不记录
+        """
+        by_ttl = {}
+        for key, ttl in expirations.items():
+            if ttl > 0:
+                by_ttl.setdefault(ttl, {})[key] = {'st': stage}
+        for ttl, items in by_ttl.items():
+            self.store.set_many(items, ttl=ttl)
+
+    def close(self) -> None:
+        """清理过期条目并关闭数据库"""
+        self.store.close()
+
+
+def open_seen_index(path: str, logger) -> SeenIndex | None:
+    """打开去重索引；未指定路径或打开失败时返回 None (不影响流程)"""
+    if not path:
+        return None
+    try:
+        return SeenIndex(path, max_entries=SeenIndexConfig.MAX_ENTRIES)
+    except Exception as e:
+        logger.warning(f"无法打开去重索引 {path}，本轮不跳过任何已知节点: {e}")
+        return None
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Clash Config Auto Builder - YAML 读写工具
+统一的 YAML 加载/写出入口：libyaml 可用时使用 C 实现的解析器和序列化器，否则回退到纯 Python 实现。
+另提供按条目增量解析/写出 {'proxies': [...]} 文档的流式接口，内存占用与单个条目大小相关，而不是整个文件
+"""
+
+import os
+
+import yaml
+from yaml.composer import Composer
+from yaml.constructor import SafeConstructor
+from yaml.events import (
+    DocumentStartEvent, MappingEndEvent, MappingStartEvent, SequenceEndEvent, SequenceStartEvent
+)
+from yaml.parser import Parser
+from yaml.reader import Reader
+from yaml.resolver import Resolver
+from yaml.scanner import Scanner
+
+try:
+    from yaml._yaml import CParser
+    from yaml import CSafeLoader, CDumper
+    HAS_LIBYAML = True
+except ImportError:
+    CParser = CSafeLoader = CDumper = None
+    HAS_LIBYAML = False
+
+# 设置 YAML_PURE_PYTHON=1 可强制使用纯 Python 实现 (用于排查 libyaml 相关问题)
+USE_LIBYAML = HAS_LIBYAML and os.getenv('YAML_PURE_PYTHON', '') != '1'
+
+
+def _libyaml_enabled(use_libyaml: bool = None) -> bool:
+    return USE_LIBYAML if use_libyaml is None else (use_libyaml and HAS_LIBYAML)
+
+
+def load_yaml(stream, use_libyaml: bool = None):
+    """等价于 yaml.safe_load，优先使用 libyaml"""
+    loader = CSafeLoader if _libyaml_enabled(use_libyaml) else yaml.SafeLoader
+    return yaml.load(stream, Loader=loader)
+
+
+def dump_yaml(data, stream=None, use_libyaml: bool = None, **kwargs):
+    """等价于 yaml.dump，优先使用 libyaml；其余参数原样传给 yaml.dump"""
+    dumper = CDumper if _libyaml_enabled(use_libyaml) else yaml.Dumper
+    return yaml.dump(data, stream, Dumper=dumper, **kwargs)
+
+
+class _StreamingLoader(Reader, Scanner, Parser, Composer, SafeConstructor, Resolver):
+    """与 yaml.SafeLoader 相同的组件组合，供逐节点组装与构造使用"""
+
+    def __init__(self, stream):
+        Reader.__init__(self, stream)
+        Scanner.__init__(self)
+        Parser.__init__(self)
+        Composer.__init__(self)
+        SafeConstructor.__init__(self)
+        Resolver.__init__(self)
+
+
+if HAS_LIBYAML:
+    class _CStreamingLoader(CParser, Composer, SafeConstructor, Resolver):
+        """使用 libyaml 产生事件，再由 Python 的 Composer 逐节点组装"""
+
+        def __init__(self, stream):
+            CParser.__init__(self, stream)
+            Composer.__init__(self)
+            SafeConstructor.__init__(self)
+            Resolver.__init__(self)
+
+
+def iter_yaml_sequence(stream, key: str = 'proxies', use_libyaml: bool = None):
+    """
+    增量解析顶层映射中 key 对应的列表，逐个产出其中的条目。
+    其他顶层键的值会被解析后立即丢弃；文档不是映射或不含该列表时不产出任何内容。
+    """
+    loader = (_CStreamingLoader if _libyaml_enabled(use_libyaml) else _StreamingLoader)(stream)
+    try:
+        loader.get_event()  # StreamStartEvent
+        if not loader.check_event(DocumentStartEvent):
+            return
+        loader.get_event()
+        if not loader.check_event(MappingStartEvent):
+            return
+        loader.get_event()
+
+        while not loader.check_event(MappingEndEvent):
+            item_key = loader.construct_document(loader.compose_node(None, None))
+            if item_key == key and loader.check_event(SequenceStartEvent):
+                loader.get_event()
+                index = 0
+                while not loader.check_event(SequenceEndEvent):
+                    yield loader.construct_document(loader.compose_node(None, index))
+                    index += 1
+                loader.get_event()
+            else:
+                loader.compose_node(None, None)
+    finally:
+        loader.dispose()
+
+
+def iter_proxies_file(file_path: str, use_libyaml: bool = None):
+    """逐个产出 YAML 文件中 'proxies' 列表的条目"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        yield from iter_yaml_sequence(f, 'proxies', use_libyaml)
+
+
+def load_proxies_file(file_path: str, use_libyaml: bool = None) -> list:
+    """一次性读取 YAML 文件中 'proxies' 列表的全部条目 (供进程池并行解析使用)"""
+    return list(iter_proxies_file(file_path, use_libyaml))
+
+
+class YamlListWriter:
+    """
+    以流式方式写出 {key: [...]} 文档：每写入一个条目就立即序列化到文件。
+    输出与使用同一序列化器整体写出 {key: items} (default_flow_style=False, allow_unicode=True)
+    逐字节一致 (条目之间共享的对象不会生成锚点)。
+    """
+
+    def __init__(self, f, key: str = 'proxies', use_libyaml: bool = None):
+        self._f = f
+        self._use_libyaml = use_libyaml
+        self.count = 0
+        self._f.write(f'{key}:')
+
+    def write(self, item) -> None:
+        """序列化并写出一个条目"""
+        if self.count == 0:
+            self._f.write('\n')
+        self._f.write(dump_yaml([item], use_libyaml=self._use_libyaml, default_flow_style=False, allow_unicode=True))
+        self.count += 1
+
+    def close(self) -> None:
+        """结束列表；没有任何条目时写出空列表"""
+        if self.count == 0:
+            self._f.write(' []\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,718 @@
+# -*- coding: utf-8 -*-
+"""
+Clash Config Auto Builder - 离线性能基准
+使用本地构造的数据和替身服务测量各处理阶段的吞吐量，不依赖外部网络
+"""
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import random
+import re
+import struct
+import sys
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.cache import PersistentCache
+from core.constants import BLACKLIST_KEYWORDS, CONFIGS_TO_GENERATE, FILTER_PATTERNS
+from core.dns_resolver import (
+    AsyncDnsResolver, decode_name, encode_name,
+    TYPE_A, TYPE_AAAA, TYPE_CNAME, RCODE_NOERROR, RCODE_NXDOMAIN
+)
+from core.fetcher import STATUS_NOT_MODIFIED, STATUS_UNCHANGED, STATUS_UPDATED, SubscriptionFetcher
+from core.fingerprint import dedupe_key, proxy_fingerprint
+from core.logger import setup_logger
+from core.node import Node
+from core.region_index import RegionIndex
+from core.seen_index import STAGE_VALIDATE, open_seen_index
+from core.yaml_io import HAS_LIBYAML, dump_yaml, load_yaml
+from generate_config import ConfigGenerator, dump_config_text
+from merge_proxies import _UniqueNamer, _compile_name_filter, _finalize_proxy, _iter_source_proxies, collect_proxies
+
+
+# =============================================================================
+# 合成节点数据
+# =============================================================================
+SAMPLE_REGIONS = ['🇭🇰 香港', '🇺🇸 US', '🇯🇵 Japan', '🇬🇧 UK', '🇸🇬 新加坡', '🇹🇼 TW', '🇰🇷 Korea', '🇩🇪 DE', '未知地区']
+
+
+def sample_proxy(i: int) -> dict:
+    """生成第 i 个合成节点，覆盖常见协议与带地区关键词的名称"""
+    region = SAMPLE_REGIONS[i % len(SAMPLE_REGIONS)]
+    server = f"10.{(i >> 16) & 0xFF}.{(i >> 8) & 0xFF}.{i & 0xFF}"
+    kind = i % 4
+    if kind == 0:
+        return {'name': f"{region} {i}", 'type': 'ss', 'server': server, 'port': 8388,
+                'cipher': 'aes-256-gcm', 'password': f"pw{i}", 'udp': True}
+    if kind == 1:
+        return {'name': f"{region} {i}", 'type': 'vmess', 'server': server, 'port': 443,
+                'uuid': f"a3482e88-686a-4a58-8126-{i:012d}", 'alterId': 0, 'cipher': 'auto', 'tls': True,
+                'network': 'ws', 'ws-opts': {'path': '/ray', 'headers': {'Host': 'example.com'}}}
+    if kind == 2:
+        return {'name': f"{region} {i}", 'type': 'trojan', 'server': server, 'port': 443,
+                'password': f"pw{i}", 'sni': 'example.com', 'skip-cert-verify': True}
+    return {'name': f"{region} {i}", 'type': 'hysteria2', 'server': server, 'port': 20000 + i % 1000,
+            'password': f"pw{i}", 'sni': 'bing.com', 'skip-cert-verify': True}
+
+
+def write_sample_subscriptions(directory: str, files: int, nodes_per_file: int) -> int:
+    """在目录中写出若干合成订阅文件，返回节点总数"""
+    for f in range(files):
+        proxies = [sample_proxy(f * nodes_per_file + i) for i in range(nodes_per_file)]
+        with open(os.path.join(directory, f"sub_{f}.yaml"), 'w', encoding='utf-8') as fp:
+            dump_yaml({'proxies': proxies}, fp, allow_unicode=True, default_flow_style=False)
+    return files * nodes_per_file
+
+
+# =============================================================================
+# DNS 替身服务器
+# =============================================================================
+class StubDnsServer(asyncio.DatagramProtocol):
+    """
+    本地 DNS 替身服务器，应答一个合成的 bench.test 区域：
+    - hostN.bench.test: 全部有 A 记录，N 为偶数时另有 AAAA 记录
+    - aliasN.bench.test: CNAME 指向 hostN.bench.test
+    - 其他名称返回 NXDOMAIN
+    可设置响应延迟和丢包率，用于模拟真实上游和触发重试。
+    """
+
+    ZONE = 'bench.test'
+
+    def __init__(self, latency: float = 0.0, loss: float = 0.0, ttl: int = 300):
+        self.latency = latency
+        self.loss = loss
+        self.ttl = ttl
+        self.transport = None
+        self.queries = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.queries += 1
+        if self.loss and random.random() < self.loss:
+            return
+        response = self._answer(data)
+        if response is None:
+            return
+        if self.latency:
+            asyncio.get_running_loop().call_later(self.latency, self.transport.sendto, response, addr)
+        else:
+            self.transport.sendto(response, addr)
+
+    def _record(self, owner: str, rtype: int, rdata: bytes) -> bytes:
+        return encode_name(owner) + struct.pack('!HHIH', rtype, 1, self.ttl, len(rdata)) + rdata
+
+    def _address(self, host: str, rtype: int) -> bytes:
+        index = int(host.split('.')[0][len('host'):])
+        if rtype == TYPE_A:
+            return self._record(host, TYPE_A, struct.pack('!BBBB', 10, (index >> 16) & 0xFF, (index >> 8) & 0xFF, index & 0xFF))
+        if rtype == TYPE_AAAA and index % 2 == 0:
+            return self._record(host, TYPE_AAAA, b'\xfd' + b'\x00' * 11 + struct.pack('!I', index))
+        return b''
+
+    def _answer(self, query: bytes):
+        try:
+            txid = struct.unpack('!H', query[:2])[0]
+            name, offset = decode_name(query, 12)
+            rtype = struct.unpack('!H', query[offset:offset + 2])[0]
+        except Exception:
+            return None
+        question = query[12:offset + 4]
+        name = name.lower()
+        label = name[:-len(self.ZONE) - 1] if name.endswith('.' + self.ZONE) else ''
+
+        rcode, answers = RCODE_NOERROR, b''
+        count = 0
+        if label.startswith('alias') and label[len('alias'):].isdigit():
+            host = f"host{label[len('alias'):]}.{self.ZONE}"
+            answers = self._record(name, TYPE_CNAME, encode_name(host))
+            count = 1
+            if rtype != TYPE_CNAME:
+                record = self._address(host, rtype)
+                answers += record
+                count += 1 if record else 0
+        elif label.startswith('host') and label[len('host'):].isdigit():
+            answers = self._address(name, rtype)
+            count = 1 if answers else 0
+        else:
+            rcode = RCODE_NXDOMAIN
+
+        header = struct.pack('!HHHHHH', txid, 0x8180 | rcode, 1, count, 0, 0)
+        return header + question + answers
+
+
+# =============================================================================
+# HTTP 订阅替身服务器
+# =============================================================================
+class StubSubscriptionServer(ThreadingHTTPServer):
+    """
+    本地订阅替身服务器，在 /sub/<i>.yaml 提供 subscriptions 中的内容：
+    - 带 ETag 与 Last-Modified，请求带匹配的 If-None-Match 时返回 304
+    - 路径以 /plain/ 开头时忽略条件请求，总是返回完整内容 (模拟不支持缓存的服务器)
+    - 请求声明接受 gzip 时压缩响应体
+    可设置响应延迟，用于模拟远端服务器。
+    """
+
+    daemon_threads = True
+
+    def __init__(self, subscriptions: dict, latency: float = 0.0):
+        self.subscriptions = subscriptions
+        self.latency = latency
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        super().__init__(('127.0.0.1', 0), _StubSubscriptionHandler)
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+    def count(self, not_modified: bool, size: int) -> None:
+        with self._lock:
+            self.requests += 1
+            self.not_modified += not_modified
+            self.bytes_sent += size
+
+
+class _StubSubscriptionHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    LAST_MODIFIED = 'Mon, 01 Jan 2024 00:00:00 GMT'
+
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        key = self.path.replace('/plain/', '/sub/', 1)
+        body = server.subscriptions.get(key)
+        if body is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            server.count(False, 0)
+            return
+
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        if not self.path.startswith('/plain/') and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            server.count(True, 0)
+            return
+
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body, compresslevel=6)
+            encoding = 'gzip'
+        else:
+            encoding = None
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if not self.path.startswith('/plain/'):
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', self.LAST_MODIFIED)
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+        self.wfile.write(body)
+        server.count(False, len(body))
+
+    def log_message(self, format, *args):
+        pass
+
+
+async def _run_dns_benchmark(args) -> None:
+    logger = setup_logger("benchmark")
+    loop = asyncio.get_running_loop()
+    transport, server = await loop.create_datagram_endpoint(
+        lambda: StubDnsServer(latency=args.latency_ms / 1000, loss=args.loss),
+        local_addr=('127.0.0.1', 0)
+    )
+    port = transport.get_extra_info('sockname')[1]
+
+    domains = []
+    for i in range(args.domains):
+        kind = i % 10
+        if kind < 6:
+            domains.append(f"host{i}.{StubDnsServer.ZONE}")
+        elif kind < 9:
+            domains.append(f"alias{i}.{StubDnsServer.ZONE}")
+        else:
+            domains.append(f"dead{i}.{StubDnsServer.ZONE}")
+
+    resolver = AsyncDnsResolver(
+        ['127.0.0.1'], ecs_ip='183.198.0.1', timeout=args.timeout,
+        retries=args.retries, max_concurrency=args.concurrency, port=port
+    )
+    try:
+        start = time.perf_counter()
+        results = await resolver.resolve_many(domains)
+        elapsed = time.perf_counter() - start
+    finally:
+        resolver.close()
+        transport.close()
+
+    resolved = sum(1 for ip, _ in results.values() if ip)
+    logger.info(
+        f"DNS 基准: {len(domains)} 个域名, 成功 {resolved}, 查询报文 {server.queries} 个, "
+        f"耗时 {elapsed:.2f}s, 吞吐 {len(domains) / elapsed:.0f} 域名/s"
+    )
+
+
+def _run_yaml_benchmark(args) -> None:
+    logger = setup_logger("benchmark")
+    with tempfile.TemporaryDirectory() as directory:
+        write_sample_subscriptions(directory, args.files, args.nodes_per_file)
+        modes = [('pure', False), ('libyaml', True)] if HAS_LIBYAML else [('pure', False)]
+        for label, use_libyaml in modes:
+            for workers in sorted({1, args.workers}):
+                stats = {'loaded': 0}
+                start = time.perf_counter()
+                for _ in _iter_source_proxies(directory, stats, logger, workers, use_libyaml):
+                    pass
+                elapsed = time.perf_counter() - start
+                logger.info(
+                    f"订阅解析 [{label}, {workers} 进程]: {stats['loaded']} 个节点, 耗时 {elapsed:.2f}s, "
+                    f"{args.files / elapsed:.1f} 文件/s, {stats['loaded'] / elapsed:.0f} 节点/s"
+                )
+
+
+def sample_region_patterns(count: int) -> dict:
+    """内置的地区正则，不足 count 个时补充形如 FILTER_PATTERNS 的合成地区"""
+    patterns = dict(FILTER_PATTERNS)
+    for i in range(len(patterns), count):
+        patterns[f"r{i}"] = re.compile(rf'地区{i}号|\bR{i}\b|Region {i}\b', flags=re.IGNORECASE)
+    return patterns
+
+
+def _sample_region_names(count: int, regions: int) -> list:
+    """生成带 0-2 个地区关键词的节点名称，包含相邻旗帜等重叠匹配的情况"""
+    rng = random.Random(0)
+    tokens = ['香港', '🇭🇰', 'HK', 'US', 'United States', '日本', 'JP', 'uk', '🇬🇧', 'SG', 'Taiwan', 'Korea',
+              'South Korea', 'DE', 'Canada', '🇦🇺🇸', '🇸🇬🇧', 'HKUS', '未知地区']
+    tokens += [f"地区{i}号" for i in range(len(FILTER_PATTERNS), regions)]
+    tokens += [f"R{i}" for i in range(len(FILTER_PATTERNS), regions)]
+    names = []
+    for i in range(count):
+        picked = rng.sample(tokens, rng.randint(0, 2))
+        names.append(' '.join(picked + [f"{i:06d}"]) if rng.random() < 0.5 else ''.join(picked) + f"-{i}")
+    return names
+
+
+def _run_regions_benchmark(args) -> None:
+    logger = setup_logger("benchmark")
+    patterns = sample_region_patterns(args.regions)
+    names = _sample_region_names(args.nodes, args.regions)
+
+    start = time.perf_counter()
+    expected = {key: [i for i, name in enumerate(names) if pattern.search(name)] for key, pattern in patterns.items()}
+    per_pattern = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = RegionIndex(patterns).build(names)
+    single_pass = time.perf_counter() - start
+
+    if index != expected:
+        mismatched = [key for key in patterns if index[key] != expected[key]]
+        logger.error(f"分类结果与逐个匹配不一致，地区: {mismatched[:10]}")
+        sys.exit(1)
+    logger.info(
+        f"地区分类 [{len(patterns)} 个地区, {len(names)} 个节点]: 逐个匹配 {per_pattern:.2f}s, "
+        f"单次扫描索引 {single_pass:.2f}s (加速 {per_pattern / single_pass:.1f}x)，结果一致"
+    )
+
+
+def _sample_healthy_nodes(count: int) -> list:
+    """带延迟的合成健康节点，混入需要引号、折行或转义的名称与字段"""
+    nodes = []
+    for i in range(count):
+        node = sample_proxy(i)
+        if i % 7:
+            node['_delay'] = 40 + i % 900
+        if i % 11 == 0:
+            node['name'] += " 'quoted' \"double\" #tag: " + 'x' * 90
+        if i % 13 == 0:
+            node['plugin-opts'] = {'mode': 'websocket', 'path': '/' + 'p' * 120, 'host': ''}
+        nodes.append(node)
+    return nodes
+
+
+def _run_configs_benchmark(args) -> None:
+    logger = setup_logger("benchmark")
+    generator = ConfigGenerator()
+    generator.load_templates()
+    nodes = _sample_healthy_nodes(args.nodes)
+
+    # 参照实现：每个文件整体序列化 (即改为拼接之前的输出)
+    start = time.perf_counter()
+    region_index = generator.build_region_index(nodes)
+    expected = {}
+    for config_info in CONFIGS_TO_GENERATE:
+        indices = generator.select_region_indices(len(nodes), config_info['filter'], region_index)
+        config = {**generator.templates[config_info['template']],
+                  'proxies': [generator.prepare_node(nodes[i]) for i in indices]}
+        expected[config_info['output']] = dump_config_text(config)
+    whole = time.perf_counter() - start
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            start = time.perf_counter()
+            generated = generator.generate_all_configs(nodes)
+            spliced = time.perf_counter() - start
+            mismatched = []
+            for path in generated:
+                with open(path, 'r', encoding='utf-8') as f:
+                    if f.read() != expected[path]:
+                        mismatched.append(path)
+        finally:
+            os.chdir(cwd)
+
+    if mismatched:
+        logger.error(f"拼接生成的配置与整体序列化不一致: {mismatched}")
+        sys.exit(1)
+    logger.info(
+        f"配置生成 [{len(nodes)} 个节点, {len(generated)} 个文件]: 整体序列化 {whole:.2f}s, "
+        f"片段拼接 {spliced:.2f}s (加速 {whole / spliced:.1f}x)，输出逐字节一致"
+    )
+
+
+def _retained_bytes(build) -> tuple:
+    """返回 build() 的结果及其占用的内存 (结果存活期间新分配且未释放的字节数)"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        return result, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def _run_nodes_benchmark(args) -> None:
+    logger = setup_logger("benchmark")
+    # 从 YAML 文本解析，使字段值与真实订阅一样是各自独立的对象
+    text = dump_yaml({'proxies': _sample_healthy_nodes(args.nodes)}, allow_unicode=True, default_flow_style=False)
+
+    def load():
+        return load_yaml(text)['proxies']
+
+    dicts, dict_bytes = _retained_bytes(load)
+    nodes, node_bytes = _retained_bytes(lambda: [Node.from_dict(proxy) for proxy in load()])
+
+    for proxy, node in zip(dicts, nodes):
+        restored = node.to_dict()
+        if restored != proxy or list(restored) != list(proxy):
+            logger.error(f"节点 {proxy.get('name')} 转换后与原 dict 不一致")
+            sys.exit(1)
+
+    # 验证缓存、测试器和健康历史 (排序与记录) 各需要一次指纹
+    start = time.perf_counter()
+    for _ in range(4):
+        dict_fingerprints = [proxy_fingerprint(proxy) for proxy in dicts]
+    dict_elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(4):
+        node_fingerprints = [proxy_fingerprint(node) for node in nodes]
+    node_elapsed = time.perf_counter() - start
+    if node_fingerprints != dict_fingerprints:
+        logger.error("Node 的指纹与 dict 不一致")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    for node in nodes:
+        node.to_dict()
+    to_dict_elapsed = time.perf_counter() - start
+
+    logger.info(
+        f"节点内存 [{len(nodes)} 个节点]: dict {dict_bytes / len(dicts):.0f} 字节/节点 (共 {dict_bytes / 2**20:.1f} MiB), "
+        f"Node {node_bytes / len(nodes):.0f} 字节/节点 (共 {node_bytes / 2**20:.1f} MiB)，"
+        f"节省 {(1 - node_bytes / dict_bytes) * 100:.1f}%，无损互转"
+    )
+    logger.info(
+        f"指纹计算 4 次: dict {dict_elapsed:.2f}s, Node (缓存) {node_elapsed:.2f}s；"
+        f"Node 还原为 dict {to_dict_elapsed:.2f}s"
+    )
+
+
+def _sample_duplicate_names(count: int, bases: int) -> list:
+    """大量重名的节点名称：少数几个原名反复出现，并混入与重命名结果冲突的 "原名 #k" 和黑名单关键词"""
+    rng = random.Random(0)
+    originals = [f"{SAMPLE_REGIONS[i % len(SAMPLE_REGIONS)]}" + (f" {i}" if i >= len(SAMPLE_REGIONS) else '') for i in range(bases)]
+    names = []
+    for _ in range(count):
+        original = rng.choice(originals)
+        roll = rng.random()
+        if roll < 0.05:
+            names.append(f"{original} #{rng.randint(2, count // bases + 10)}")
+        elif roll < 0.08:
+            names.append(f"{original} {rng.choice(BLACKLIST_KEYWORDS)}")
+        else:
+            names.append(original)
+    return names
+
+
+def _reference_finalize(name: str, seen_names: set, name_filter: str = None) -> tuple:
+    """改为按原名记录序号之前的实现：逐个尝试序号，逐个检查黑名单关键词"""
+    original_name, counter = name, 2
+    while name in seen_names:
+        name = f"{original_name} #{counter}"
+        counter += 1
+    seen_names.add(name)
+    return name, not (any(keyword in name for keyword in BLACKLIST_KEYWORDS) or (name_filter and name_filter in FILTER_PATTERNS and not FILTER_PATTERNS[name_filter].search(name)))
+
+
+def _run_names_benchmark(args) -> None:
+    logger = setup_logger("benchmark")
+    names = _sample_duplicate_names(args.nodes, args.bases)
+    for name_filter in [None, 'us']:
+        start = time.perf_counter()
+        seen_names = set()
+        expected = [_reference_finalize(name, seen_names, name_filter) for name in names]
+        reference = time.perf_counter() - start
+
+        start = time.perf_counter()
+        namer, accepts = _UniqueNamer(), _compile_name_filter(name_filter)
+        nodes = [Node(name=name) for name in names]
+        verdicts = [_finalize_proxy(node, namer, accepts) for node in nodes]
+        indexed = time.perf_counter() - start
+
+        if [(node.name, verdict) for node, verdict in zip(nodes, verdicts)] != expected:
+            logger.error(f"重命名或过滤结果与逐个尝试的实现不一致 (地区过滤器: {name_filter})")
+            sys.exit(1)
+        logger.info(
+            f"唯一命名与过滤 [{len(names)} 个节点, {args.bases} 个原名, 地区过滤器: {name_filter}]: "
+            f"逐个尝试 {reference:.2f}s, 序号索引 + 合并正则 {indexed:.2f}s (加速 {reference / indexed:.1f}x)，结果一致"
+        )
+
+
+def _sample_variant_proxies(count: int, variants: int) -> list:
+    """每 variants 个节点共用同一服务器、端口和协议，只在 uuid/密码或传输层上不同 (旧的去重标识会把它们误合并)"""
+    proxies = []
+    for i in range(count):
+        proxy, variant = sample_proxy(i // variants), i % variants
+        proxy['name'] = f"{proxy['name']} v{variant}"
+        if 'uuid' in proxy:
+            proxy['uuid'] = f"{proxy['uuid'][:-4]}{variant:04d}"
+            if variant % 2:
+                proxy['network'], proxy['grpc-opts'] = 'grpc', {'grpc-service-name': f"svc{variant}"}
+                del proxy['ws-opts']
+        else:
+            proxy['password'] = f"{proxy['password']}-{variant}"
+        proxies.append(proxy)
+    return proxies
+
+
+def _run_dedupe_benchmark(args) -> None:
+    logger = setup_logger("benchmark")
+    proxies = _sample_variant_proxies(args.nodes, args.variants)
+    legacy = len({(p['server'], p['type'], p['port']) for p in proxies})
+
+    with tempfile.TemporaryDirectory() as directory:
+        proxies_dir = os.path.join(directory, 'subs')
+        os.makedirs(proxies_dir)
+        for i in range(args.mirrors):
+            with open(os.path.join(proxies_dir, f"mirror{i}.yaml"), 'w', encoding='utf-8') as f:
+                dump_yaml({'proxies': proxies}, f, allow_unicode=True)
+        seen_index_file = os.path.join(directory, 'seen_index.sqlite')
+
+        start = time.perf_counter()
+        first = collect_proxies(proxies_dir, parse_workers=1, seen_index_file=seen_index_file)
+        first_elapsed = time.perf_counter() - start
+        if len(first) != len(proxies):
+            logger.error(f"去重后应保留 {len(proxies)} 个节点，实际 {len(first)} 个")
+            sys.exit(1)
+
+        # 模拟验证阶段淘汰每 4 个节点中的 1 个
+        rejected = first[::4]
+        seen_index = open_seen_index(seen_index_file, logger)
+        seen_index.reject(STAGE_VALIDATE, {dedupe_key(node): 3600 for node in rejected})
+        seen_index.close()
+
+        start = time.perf_counter()
+        second = collect_proxies(proxies_dir, parse_workers=1, seen_index_file=seen_index_file)
+        second_elapsed = time.perf_counter() - start
+        if len(second) != len(first) - len(rejected):
+            logger.error(f"第二次合并应跳过 {len(rejected)} 个已淘汰节点，实际产出 {len(second)} 个")
+            sys.exit(1)
+
+    logger.info(
+        f"去重 [{args.nodes} 个节点 x {args.mirrors} 份镜像订阅, 每组 {args.variants} 个变体]: "
+        f"旧标识 (服务器, 类型, 端口) 保留 {legacy} 个，去重键保留 {len(first)} 个；"
+        f"第一次合并 {first_elapsed:.2f}s，第二次跳过 {len(rejected)} 个已淘汰节点，产出 {len(second)} 个，耗时 {second_elapsed:.2f}s"
+    )
+
+
+def _sample_subscriptions(count: int, nodes_per_sub: int) -> dict:
+    """{路径: YAML 内容}，每个订阅包含不同的合成节点"""
+    subscriptions = {}
+    for s in range(count):
+        proxies = [sample_proxy(s * nodes_per_sub + i) for i in range(nodes_per_sub)]
+        subscriptions[f"/sub/{s}.yaml"] = dump_yaml({'proxies': proxies}, allow_unicode=True, default_flow_style=False).encode('utf-8')
+    return subscriptions
+
+
+def _run_fetch_benchmark(args) -> None:
+    logger = setup_logger("benchmark")
+    subscriptions = _sample_subscriptions(args.subscriptions, args.nodes_per_sub)
+    server = StubSubscriptionServer(subscriptions, latency=args.latency_ms / 1000)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # 每 4 个订阅中有 1 个来自不支持条件请求的服务器
+    urls = [server.url(path.replace('/sub/', '/plain/', 1) if i % 4 == 3 else path) for i, path in enumerate(subscriptions)]
+    total_size = sum(len(body) for body in subscriptions.values())
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            output_dir = os.path.join(directory, 'subs')
+
+            # 对照：逐个请求、不复用连接、不压缩 (与原先的 curl 循环相同)
+            start = time.perf_counter()
+            for url in urls:
+                requests.get(url, headers={'Accept-Encoding': 'identity'}, timeout=30).raise_for_status()
+            naive_elapsed = time.perf_counter() - start
+            baseline_bytes = server.bytes_sent
+
+            fetcher = SubscriptionFetcher(
+                cache_file=os.path.join(directory, 'fetch_cache.sqlite'), body_dir=os.path.join(directory, 'bodies'),
+                max_workers=args.workers, logger=logger
+            )
+            rounds = []
+            try:
+                for label in ['首次', '未变化', '1 个更新']:
+                    if label == '1 个更新':
+                        first = next(iter(subscriptions))
+                        subscriptions[first] = subscriptions[first].replace(b'proxies:', b'proxies:\n# updated', 1)
+                    sent_before = server.bytes_sent
+                    start = time.perf_counter()
+                    results = fetcher.fetch_all(urls, output_dir)
+                    elapsed = time.perf_counter() - start
+                    counts = {}
+                    for result in results:
+                        counts[result['status']] = counts.get(result['status'], 0) + 1
+                    rounds.append((label, elapsed, server.bytes_sent - sent_before, counts))
+            finally:
+                fetcher.close()
+
+            expected = {
+                STATUS_UPDATED: 1,
+                STATUS_NOT_MODIFIED: len(urls) - 1 - sum(1 for i in range(len(urls)) if i % 4 == 3),
+                STATUS_UNCHANGED: sum(1 for i in range(len(urls)) if i % 4 == 3),
+            }
+            if {k: v for k, v in rounds[-1][3].items() if v} != {k: v for k, v in expected.items() if v}:
+                logger.error(f"第三轮的下载结果不符合预期: {rounds[-1][3]}")
+                sys.exit(1)
+            for url, path in zip(urls, subscriptions):
+                result_file = os.path.join(output_dir, next(r['file'] for r in results if r['url'] == url))
+                with open(result_file, 'rb') as f:
+                    if f.read() != subscriptions[path]:
+                        logger.error(f"写出的订阅内容与服务器不一致: {url}")
+                        sys.exit(1)
+
+            logger.info(
+                f"订阅下载 [{len(urls)} 个订阅, 共 {total_size} 字节, 延迟 {args.latency_ms:g}ms]: "
+                f"逐个下载 {naive_elapsed:.2f}s (传输 {baseline_bytes} 字节)"
+            )
+            for label, elapsed, sent, counts in rounds:
+                logger.info(
+                    f"  连接池并发 {args.workers} [{label}]: {elapsed:.2f}s, 传输 {sent} 字节, "
+                    f"{', '.join(f'{status} {count}' for status, count in counts.items())}"
+                )
+
+            stats = {'loaded': 0}
+            start = time.perf_counter()
+            expected_proxies = list(_iter_source_proxies(output_dir, stats, logger, 1))
+            uncached = time.perf_counter() - start
+            with PersistentCache(os.path.join(directory, 'parse_cache.sqlite')) as parse_cache:
+                list(_iter_source_proxies(output_dir, {'loaded': 0}, logger, 1, parse_cache=parse_cache))
+                stats = {'loaded': 0}
+                start = time.perf_counter()
+                cached_proxies = list(_iter_source_proxies(output_dir, stats, logger, 1, parse_cache=parse_cache))
+                cached = time.perf_counter() - start
+            if cached_proxies != expected_proxies or stats['cached_files'] != len(urls):
+                logger.error("解析缓存的结果与重新解析不一致")
+                sys.exit(1)
+            logger.info(
+                f"订阅解析 [{len(expected_proxies)} 个节点]: 重新解析 {uncached:.2f}s, "
+                f"解析缓存命中 {cached:.2f}s (加速 {uncached / cached:.1f}x)，结果一致"
+            )
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="离线性能基准测试。")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    dns_parser = subparsers.add_parser('dns', help='异步 DNS 解析器在本地替身服务器上的吞吐量')
+    dns_parser.add_argument('--domains', type=int, default=20000, help='解析的域名数量')
+    dns_parser.add_argument('--concurrency', type=int, default=500, help='同时进行中的查询上限')
+    dns_parser.add_argument('--latency-ms', type=float, default=20.0, help='替身服务器的响应延迟 (毫秒)')
+    dns_parser.add_argument('--loss', type=float, default=0.0, help='替身服务器的丢包率 (0-1)')
+    dns_parser.add_argument('--timeout', type=float, default=1.0, help='单次查询超时 (秒)')
+    dns_parser.add_argument('--retries', type=int, default=2, help='超时后的重试次数')
+
+    yaml_parser = subparsers.add_parser('yaml', help='订阅文件解析吞吐量 (纯 Python / libyaml，串行 / 进程池)')
+    yaml_parser.add_argument('--files', type=int, default=16, help='合成订阅文件数量')
+    yaml_parser.add_argument('--nodes-per-file', type=int, default=5000, help='每个文件的节点数')
+    yaml_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='并行解析的进程数')
+
+    regions_parser = subparsers.add_parser('regions', help='地区分类：逐个正则匹配与单次扫描索引的对比')
+    regions_parser.add_argument('--regions', type=int, default=50, help='地区数量 (不足时补充合成地区)')
+    regions_parser.add_argument('--nodes', type=int, default=100000, help='节点数量')
+
+    configs_parser = subparsers.add_parser('configs', help='配置生成：整体序列化与片段拼接的对比，并校验输出逐字节一致')
+    configs_parser.add_argument('--nodes', type=int, default=5000, help='健康节点数量')
+
+    nodes_parser = subparsers.add_parser('nodes', help='节点内存占用：dict 与紧凑 Node 的对比，并校验无损互转')
+    nodes_parser.add_argument('--nodes', type=int, default=100000, help='节点数量')
+
+    names_parser = subparsers.add_parser('names', help='合并时的唯一命名与黑名单过滤：逐个尝试序号与按原名记录序号的对比')
+    names_parser.add_argument('--nodes', type=int, default=10000, help='节点数量')
+    names_parser.add_argument('--bases', type=int, default=3, help='不同原名的数量 (越少重名越多)')
+
+    dedupe_parser = subparsers.add_parser('dedupe', help='合并去重：旧标识与去重键保留的节点数，以及去重索引跳过已淘汰节点')
+    dedupe_parser.add_argument('--nodes', type=int, default=20000, help='每份订阅的节点数')
+    dedupe_parser.add_argument('--variants', type=int, default=4, help='共用同一服务器、端口和协议的变体数')
+    dedupe_parser.add_argument('--mirrors', type=int, default=3, help='内容完全相同的镜像订阅份数')
+
+    fetch_parser = subparsers.add_parser('fetch', help='订阅下载：本地 HTTP 替身服务器上的条件请求与连接池，以及解析缓存')
+    fetch_parser.add_argument('--subscriptions', type=int, default=40, help='订阅数量')
+    fetch_parser.add_argument('--nodes-per-sub', type=int, default=2000, help='每个订阅的节点数')
+    fetch_parser.add_argument('--workers', type=int, default=16, help='并发下载数')
+    fetch_parser.add_argument('--latency-ms', type=float, default=50.0, help='替身服务器的响应延迟 (毫秒)')
+
+    args = parser.parse_args()
+
+    if args.command == 'dns':
+        asyncio.run(_run_dns_benchmark(args))
+    elif args.command == 'yaml':
+        _run_yaml_benchmark(args)
+    elif args.command == 'regions':
+        _run_regions_benchmark(args)
+    elif args.command == 'configs':
+        _run_configs_benchmark(args)
+    elif args.command == 'nodes':
+        _run_nodes_benchmark(args)
+    elif args.command == 'names':
+        _run_names_benchmark(args)
+    elif args.command == 'dedupe':
+        _run_dedupe_benchmark(args)
+    elif args.command == 'fetch':
+        _run_fetch_benchmark(args)
+
+
+if __name__ == "__main__":
+    main()
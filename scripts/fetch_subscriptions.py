@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Clash Config Auto Builder - 订阅下载
+并发下载 URL_LIST 中的所有订阅，写出到订阅目录供 merge_proxies.py / run_pipeline.py 使用。
+使用条件请求 (ETag / If-Modified-Since) 与压缩传输，未变化的订阅不再传输响应体，
+并写出与上次逐字节相同的文件，使合并阶段的解析缓存可以直接命中。
+"""
+
+import argparse
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.constants import PathConfig, SubscriptionConfig
+from core.fetcher import STATUS_FAILED, STATUS_NOT_MODIFIED, STATUS_STALE, SubscriptionFetcher
+from core.logger import setup_logger
+
+
+def fetch_subscriptions(urls: list, output_dir: str, max_workers: int = None, timeout: float = None,
+                        retries: int = None, user_agent: str = None, use_cache: bool = True) -> list:
+    """下载所有订阅并输出汇总日志，返回下载结果列表 (见 SubscriptionFetcher.fetch_all)"""
+    logger = setup_logger("fetch_subscriptions")
+    fetcher = SubscriptionFetcher(
+        cache_file=SubscriptionConfig.FETCH_CACHE_FILE if use_cache else None,
+        body_dir=SubscriptionConfig.BODY_DIR,
+        max_workers=max_workers or SubscriptionConfig.MAX_WORKERS,
+        timeout=timeout if timeout is not None else SubscriptionConfig.TIMEOUT,
+        retries=retries if retries is not None else SubscriptionConfig.RETRIES,
+        user_agent=user_agent or SubscriptionConfig.USER_AGENT,
+        cache_ttl=SubscriptionConfig.FETCH_CACHE_TTL,
+        logger=logger,
+    )
+    logger.info(f"开始下载 {len(urls)} 个订阅 (并发 {fetcher.max_workers}, Accept-Encoding: {fetcher.session.headers['Accept-Encoding']})...")
+    try:
+        results = fetcher.fetch_all(urls, output_dir)
+    finally:
+        fetcher.close()
+
+    for result in results:
+        if result['status'] == STATUS_FAILED:
+            logger.error(f"下载失败: {result['url']} ({result['error']})")
+        elif result['status'] == STATUS_STALE:
+            logger.warning(f"下载失败，使用上次缓存的内容: {result['url']} ({result['error']})")
+        else:
+            logger.info(
+                f"[{result['status']}] {result['url']} -> {result['file']} "
+                f"({result['size']} 字节, 传输 {result['wire']} 字节, {result['elapsed']:.2f}s)"
+            )
+
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    size = sum(r['size'] for r in results)
+    wire = sum(r['wire'] for r in results)
+    logger.info(
+        f"下载完成: {', '.join(f'{status} {count}' for status, count in counts.items())}；"
+        f"内容共 {size} 字节，实际传输 {wire} 字节 ({counts.get(STATUS_NOT_MODIFIED, 0)} 个订阅未变化，未传输响应体)"
+    )
+    return results
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="并发下载订阅链接 (条件请求 + 压缩传输)，写出到订阅目录。")
+    parser.add_argument('urls', nargs='*', help='订阅链接，默认读取环境变量 URL_LIST (空格分隔)')
+    parser.add_argument('--output-dir', type=str, default=PathConfig.PROXY_DIR, help='订阅文件的输出目录')
+    parser.add_argument('--max-workers', type=int, default=SubscriptionConfig.MAX_WORKERS, help='并发下载数 (同时也是连接池大小)')
+    parser.add_argument('--timeout', type=float, default=SubscriptionConfig.TIMEOUT, help='单次请求超时 (秒)')
+    parser.add_argument('--retries', type=int, default=SubscriptionConfig.RETRIES, help='连接失败或 429/5xx 响应的重试次数')
+    parser.add_argument('--user-agent', type=str, default=SubscriptionConfig.USER_AGENT, help='请求使用的 User-Agent')
+    parser.add_argument('--no-cache', action='store_true', help='不使用条件请求缓存，完整下载全部订阅')
+    args = parser.parse_args()
+
+    urls = args.urls or SubscriptionConfig.URL_LIST.split()
+    if not urls:
+        setup_logger("fetch_subscriptions").warning("没有需要下载的订阅链接。")
+        return
+    results = fetch_subscriptions(urls, args.output_dir, args.max_workers, args.timeout, args.retries,
+                                  args.user_agent, not args.no_cache)
+    if all(result['status'] == STATUS_FAILED for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,39 +5,102 @@ Clash Config Auto Builder - 配置生成器 (重构版)
 """
 
 import yaml
-import subprocess
+import gzip
+import hashlib
+import json
 import sys
 import os
 import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 # 添加项目根目录到Python路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from core.constants import FILTER_PATTERNS, CONFIGS_TO_GENERATE, PathConfig
+from core.constants import FILTER_PATTERNS, CONFIGS_TO_GENERATE, HistoryConfig, PathConfig, ProviderConfig
+from core.health_history import HealthHistory
 from core.logger import setup_logger
+from core.node import Node
+from core.region_index import RegionIndex
+from core.yaml_io import load_yaml
+from merge_proxies import collect_proxies
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# 最终配置的序列化参数：固定使用纯 Python 序列化器，libyaml 会把 emoji 等非 BMP 字符转义为 \U 序列
+DUMP_OPTIONS = {'default_flow_style': False, 'allow_unicode': True}
+
+
+# 节点数达到此值时才使用进程池序列化节点，节点较少时进程启动和数据传输的开销得不偿失
+PARALLEL_RENDER_MIN_NODES = 2000
+
+
+def dump_config_text(data) -> str:
+    """按最终配置的格式序列化为文本"""
+    return yaml.dump(data, **DUMP_OPTIONS)
+
+
+def dump_node_texts(nodes: list) -> list:
+    """逐个序列化节点 (按顶层列表序列化，与它在 proxies 列表中的文本相同)，供进程池调用"""
+    return [dump_config_text([node]) for node in nodes]
+
+
+def compress_data(data: bytes, encoding: str) -> bytes:
+    """生成预压缩副本；gzip 固定 mtime，相同内容得到相同的压缩结果"""
+    if encoding == 'gz':
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    return brotli.compress(data)
+
+
+def has_shared_objects(*roots) -> bool:
+    """
+    判断数据中是否有被多处引用的同一个字典/列表。序列化器会为这类对象生成锚点 (&id001) 和别名，
+    其编号取决于整个文档，此时不能分段序列化再拼接。
+    """
+    seen = set()
+    stack = list(roots)
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, dict):
+            children = obj.values()
+        elif isinstance(obj, (list, tuple)):
+            children = obj
+        else:
+            continue
+        if not children and isinstance(obj, tuple):
+            continue
+        if id(obj) in seen:
+            return True
+        seen.add(id(obj))
+        stack.extend(children)
+    return False
 
 
 class ConfigGenerator:
     """配置文件生成器"""
     
-    def __init__(self):
+    def __init__(self, render_workers: int = None, output_format: str = None, precompress=None):
+        """
+        Args:
+            render_workers: 并行序列化节点的进程数 (默认 CPU 核心数，1 表示在主进程中序列化)
+            output_format: inline (节点内联在配置文件中) 或 provider (各地区节点文件 + 引用它们的精简配置)
+            precompress: 额外写出的预压缩副本格式，如 ['gz', 'br']
+        """
         self.logger = setup_logger("config_generator")
+        self.render_workers = render_workers or os.cpu_count() or 1
+        self.output_format = output_format or ProviderConfig.OUTPUT_FORMAT
+        if precompress is None:
+            precompress = [e.strip() for e in ProviderConfig.PRECOMPRESS.split(',') if e.strip()]
+        if 'br' in precompress and brotli is None:
+            self.logger.warning("未安装 brotli，跳过 .br 预压缩副本。")
+            precompress = [e for e in precompress if e != 'br']
+        self.precompress = list(precompress)
         self.templates = {}
-    
-    def run_merge_command(self, proxies_dir: str, output_file: str) -> None:
-        """调用 merge_proxies.py 脚本来合并所有节点并去重"""
-        command = [
-            sys.executable,
-            "scripts/merge_proxies_refactored.py",
-            "--proxies-dir", proxies_dir,
-            "--output", output_file
-        ]
-        try:
-            subprocess.run(command, check=True, capture_output=True, text=True)
-            self.logger.info(f"成功合并所有节点到 {output_file}")
-        except subprocess.CalledProcessError as e:
-            self.logger.error(f"合并所有节点失败:\n{e.stderr}")
-            raise
+        # {模板名: (proxies 之前的文本, proxies 之后的文本)}，每个模板只序列化一次
+        self.template_texts = {}
     
     def load_templates(self) -> None:
         """加载所有需要的模板文件"""
@@ -46,7 +109,7 @@ class ConfigGenerator:
         for tpl_name in template_names:
             try:
                 with open(tpl_name, 'r', encoding="utf-8") as f:
-                    self.templates[tpl_name] = yaml.safe_load(f)
+                    self.templates[tpl_name] = load_yaml(f)
                 self.logger.info(f"成功加载模板: {tpl_name}")
             except Exception as e:
                 self.logger.critical(f"无法加载模板 {tpl_name}: {e}", exc_info=True)
@@ -58,99 +121,303 @@ class ConfigGenerator:
             self.logger.info(f"--- 预处理模式：使用已测试的节点文件 '{pre_tested_nodes_file}' ---")
             try:
                 with open(pre_tested_nodes_file, 'r', encoding='utf-8') as f:
-                    healthy_nodes = yaml.safe_load(f).get('proxies', [])
+                    healthy_nodes = load_yaml(f).get('proxies', [])
                 self.logger.info(f"已加载 {len(healthy_nodes)} 个健康的节点。")
                 return healthy_nodes
             except Exception as e:
                 self.logger.error(f"加载预测试节点文件失败: {e}")
                 raise
         else:
-            # 旧的合并流程，保留以备本地测试
-            self.logger.warning("--- 未提供预处理节点文件，将执行旧的合并流程 (效率较低) ---")
-            temp_merged_file = PathConfig.TEMP_MERGED_FILE
-            self.run_merge_command(PathConfig.PROXY_DIR, temp_merged_file)
-            
-            try:
-                with open(temp_merged_file, 'r', encoding='utf-8') as f:
-                    all_nodes = yaml.safe_load(f).get('proxies', [])
-                os.remove(temp_merged_file)
-                return all_nodes
-            except Exception as e:
-                self.logger.error(f"加载合并节点文件失败: {e}")
-                raise
+            # 旧的合并流程 (不测试节点)，保留以备本地测试；在进程内合并，不写出中间文件
+            self.logger.warning("--- 未提供预处理节点文件，将执行旧的合并流程 (节点未经测试) ---")
+            return collect_proxies(PathConfig.PROXY_DIR)
     
-    def filter_nodes_by_region(self, nodes: list, filter_key: str) -> list:
-        """根据地区过滤器筛选节点"""
+    def build_region_index(self, nodes: list) -> dict:
+        """一次扫描所有节点名称，建立 {地区过滤器: [节点下标]} 索引，供所有配置文件复用"""
+        return RegionIndex(FILTER_PATTERNS).build([node.get('name', '') for node in nodes])
+
+    def select_region_indices(self, node_count: int, filter_key: str, region_index: dict) -> list:
+        """根据地区过滤器从索引中取出节点下标；没有过滤器时返回全部下标"""
         if not filter_key:
-            return nodes
+            return list(range(node_count))
         
-        pattern = FILTER_PATTERNS.get(filter_key)
-        if not pattern:
+        if filter_key not in region_index:
             self.logger.warning(f"未知的过滤器 '{filter_key}'，跳过。")
             return []
         
-        filtered_nodes = [node for node in nodes if pattern.search(node.get('name', ''))]
-        self.logger.info(f"地区过滤器 '{filter_key}' 筛选出 {len(filtered_nodes)} 个节点")
-        return filtered_nodes
+        indices = region_index[filter_key]
+        self.logger.info(f"地区过滤器 '{filter_key}' 筛选出 {len(indices)} 个节点")
+        return indices
+
+    def filter_nodes_by_region(self, nodes: list, filter_key: str, region_index: dict = None) -> list:
+        """根据地区过滤器筛选节点；传入 region_index 时直接查索引，不再重新分类"""
+        if region_index is None:
+            region_index = self.build_region_index(nodes)
+        return [nodes[i] for i in self.select_region_indices(len(nodes), filter_key, region_index)]
     
-    def generate_config_from_template(self, base_config: dict, proxies_list: list, output_path: str) -> None:
-        """根据基础配置和传入的代理列表生成最终的 Clash 配置文件"""
+    def render_template_parts(self, template_name: str) -> tuple:
+        """
+        将模板中除 proxies 外的顶层键 (dns、rules、rule-providers、proxy-groups 等) 序列化并缓存为文本。
+        顶层键按序列化器的排序规则分成位于 proxies 之前和之后的两段，逐键序列化的结果与整体序列化逐字节相同。
+        """
+        if template_name not in self.template_texts:
+            base_config = self.templates[template_name]
+            keys = sorted(key for key in base_config if key != 'proxies')
+            self.template_texts[template_name] = (
+                ''.join(dump_config_text({key: base_config[key]}) for key in keys if key < 'proxies'),
+                ''.join(dump_config_text({key: base_config[key]}) for key in keys if key > 'proxies'),
+            )
+        return self.template_texts[template_name]
+
+    def write_config_text(self, output_path: str, text: str, node_count: int) -> dict:
+        """写出配置文件文本，见 write_output"""
+        return self.write_output(output_path, text.encode('utf-8'), node_count)
+
+    def write_output(self, output_path: str, data: bytes, node_count: int) -> dict:
+        """
+        写出输出文件：内容的哈希与现有文件相同时跳过写入。
+
+        Returns:
+            清单条目 {sha256, size, nodes, etag, changed}
+        """
         try:
-            # 直接使用基础配置的深拷贝，避免互相影响
-            config = yaml.safe_load(yaml.safe_dump(base_config))
-            config['proxies'] = proxies_list
-            
-            self.logger.info(f"为 {output_path} 分配了 {len(proxies_list)} 个节点。")
+            self.logger.info(f"为 {output_path} 分配了 {node_count} 个节点。")
+            digest = hashlib.sha256(data).hexdigest()
+            entry = {'sha256': digest, 'size': len(data), 'nodes': node_count, 'etag': f'"{digest[:32]}"'}
+
+            if os.path.exists(output_path):
+                with open(output_path, 'rb') as f:
+                    if hashlib.sha256(f.read()).hexdigest() == digest:
+                        self.logger.info(f"配置文件内容未变化，跳过写入: {output_path}")
+                        return {**entry, 'changed': False}
             
             # 确保输出目录存在
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
             
-            with open(output_path, 'w', encoding="utf-8") as f:
-                yaml.dump(config, f, default_flow_style=False, allow_unicode=True)
+            with open(output_path, 'wb') as f:
+                f.write(data)
                 
             self.logger.info(f"成功生成配置文件: {output_path}")
+            return {**entry, 'changed': True}
             
         except Exception as e:
             self.logger.error(f"生成配置文件 '{output_path}' 时发生未知错误: {e}", exc_info=True)
             raise
+
+    def generate_config_from_template(self, base_config: dict, proxies_list: list, output_path: str) -> dict:
+        """根据基础配置和传入的代理列表生成最终的 Clash 配置文件 (整体序列化)"""
+        # 浅拷贝即可：只替换顶层的 proxies，不修改模板中的任何对象
+        config = {**base_config, 'proxies': proxies_list}
+        return self.write_config_text(output_path, dump_config_text(config), len(proxies_list))
+
+    def render_node_texts(self, nodes: list) -> list:
+        """序列化所有节点；节点较多时按块分发到进程池并行序列化"""
+        workers = min(self.render_workers, len(nodes) // (PARALLEL_RENDER_MIN_NODES // 2) or 1)
+        if workers <= 1 or len(nodes) < PARALLEL_RENDER_MIN_NODES:
+            return dump_node_texts(nodes)
+        chunk_size = -(-len(nodes) // (workers * 4))
+        chunks = [nodes[i:i + chunk_size] for i in range(0, len(nodes), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return [text for texts in executor.map(dump_node_texts, chunks) for text in texts]
+
+    def write_manifest(self, entries: dict, manifest_path: str = PathConfig.MANIFEST_FILE) -> bool:
+        """写出配置文件清单 (哈希、大小、节点数、ETag)；内容未变化时跳过写入，返回是否有变化"""
+        manifest = {
+            'files': {
+                path: {key: value for key, value in entry.items() if key != 'changed'}
+                for path, entry in sorted(entries.items())
+            }
+        }
+        text = json.dumps(manifest, ensure_ascii=False, indent=2, sort_keys=True) + '\n'
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                if f.read() == text:
+                    return False
+        os.makedirs(os.path.dirname(manifest_path) or '.', exist_ok=True)
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        self.logger.info(f"已更新配置文件清单: {manifest_path}")
+        return True
+
+    def render_proxies_text(self, indices: list, prepared_nodes: list, node_texts: list = None) -> str:
+        """序列化 proxies 段：有预先序列化的节点文本时直接拼接，否则整体序列化"""
+        if not indices:
+            return 'proxies: []\n'
+        if node_texts is None:
+            return dump_config_text({'proxies': [prepared_nodes[i] for i in indices]})
+        return ''.join(['proxies:\n', *(node_texts[i] for i in indices)])
+
+    @staticmethod
+    def provider_path(config_output: str, provider_name: str) -> str:
+        """provider 文件与配置文件放在同一目录"""
+        return os.path.join(os.path.dirname(config_output), f"provider_{provider_name}.yaml")
+
+    @staticmethod
+    def provider_entry(path: str) -> dict:
+        """生成引用 provider 文件的 proxy-providers 条目"""
+        return {
+            'type': 'http',
+            'url': ProviderConfig.URL_TEMPLATE.format(repo=ProviderConfig.REPOSITORY, file=path.replace(os.sep, '/')),
+            'path': f"./providers/{os.path.basename(path)}",
+            'interval': ProviderConfig.INTERVAL,
+            'health-check': {
+                'enable': True,
+                'url': ProviderConfig.HEALTH_CHECK_URL,
+                'interval': ProviderConfig.HEALTH_CHECK_INTERVAL,
+                'lazy': True,
+            },
+        }
+
+    def render_provider_layout(self, selections: list, region_index: dict, prepared_nodes: list, node_texts: list = None) -> list:
+        """
+        provider 输出格式：每个地区一个只含 proxies 的 provider 文件 (不属于任何地区的节点单独一个)，
+        每个配置文件只保留模板内容，并通过 proxy-providers 引用所需的 provider；全量配置引用所有地区。
+        没有节点的 provider 不被引用 (mihomo 拒绝加载空的 provider)。
+
+        Returns:
+            ([(输出路径, 文本, 节点数)], {配置文件路径: [引用的 provider 文件路径]})
+        """
+        rendered = []
+        references = {}
+        provider_paths = {}
+        region_keys = [key for key in dict.fromkeys(info.get('filter') for info, _ in selections) if key in region_index]
+        in_region = set()
+        for key in region_keys:
+            in_region.update(region_index[key])
+        members = {key: region_index[key] for key in region_keys}
+        members[ProviderConfig.OTHER_REGION] = [i for i in range(len(prepared_nodes)) if i not in in_region]
+
+        for config_info, indices in selections:
+            output_path = config_info.get('output')
+            filter_key = config_info.get('filter')
+            names = [filter_key] if filter_key else list(members)
+            providers = {}
+            for name in names:
+                if name not in members:
+                    continue
+                if name not in provider_paths:
+                    provider_paths[name] = self.provider_path(output_path, name)
+                    text = self.render_proxies_text(members[name], prepared_nodes, node_texts)
+                    rendered.append((provider_paths[name], text, len(members[name])))
+                if members[name]:
+                    providers[name] = self.provider_entry(provider_paths[name])
+            references[output_path] = [provider_paths[name] for name in providers]
+            base_config = self.templates[config_info.get('template')]
+            config = {key: value for key, value in base_config.items() if key != 'proxies'}
+            config['proxy-providers'] = {**(base_config.get('proxy-providers') or {}), **providers}
+            rendered.append((output_path, dump_config_text(config), len(indices)))
+        return rendered, references
+
+    def log_size_report(self, inline: list, provider: list, references: dict) -> None:
+        """比较两种布局下所有文件的总字节数，以及每个配置的客户端下载量 (配置 + 引用的 provider)"""
+        def total(items, encoding=None):
+            return sum(len(compress_data(text.encode('utf-8'), encoding)) if encoding else len(text.encode('utf-8'))
+                       for _, text, _ in items)
+
+        for encoding in [None] + self.precompress:
+            label = f" ({encoding})" if encoding else ""
+            old, new = total(inline, encoding), total(provider, encoding)
+            self.logger.info(
+                f"体积报告{label}: 内联布局共 {old / 1024:.1f} KiB，provider 布局共 {new / 1024:.1f} KiB "
+                f"(节省 {(1 - new / old) * 100 if old else 0:.1f}%)"
+            )
+        sizes = {path: len(text.encode('utf-8')) for path, text, _ in provider}
+        for output_path, text, _ in inline:
+            downloaded = sizes[output_path] + sum(sizes[path] for path in references[output_path])
+            self.logger.info(f"  {output_path}: 内联 {len(text.encode('utf-8')) / 1024:.1f} KiB，provider 布局下载 {downloaded / 1024:.1f} KiB")
+
+    @staticmethod
+    def prepare_node(node) -> dict:
+        """返回用于输出的节点 (dict 或 Node) 的 dict 副本：名称前加上 [延迟ms] 前缀，并去掉临时的 _delay 字段"""
+        prepared = node.to_dict() if isinstance(node, Node) else dict(node)
+        delay = prepared.pop('_delay', None)
+        if delay is not None:
+            prepared['name'] = f"[{delay}ms] {prepared['name']}"
+        return prepared
     
-    def generate_all_configs(self, all_nodes: list) -> list:
-        """生成所有配置文件"""
-        generated_files = []
+    def generate_all_configs(self, all_nodes: list) -> dict:
+        """
+        生成所有配置文件。模板的静态部分只序列化一次，每个节点也只重命名和 (并行) 序列化一次，
+        各地区的配置文件由这些文本片段拼接而成，然后并行比对哈希并写出有变化的文件。
+
+        Returns:
+            {输出路径: 清单条目}，条目中的 changed 表示文件内容是否有变化
+        """
+        region_index = self.build_region_index(all_nodes)
+
+        # 1. 对所有节点进行重命名 (在副本上进行，不修改原始列表)
+        prepared_nodes = [self.prepare_node(node) for node in all_nodes]
+
+        # 存在被多处引用的对象时，序列化器输出的锚点依赖整个文档，退回逐个文件整体序列化
+        splice = not has_shared_objects(prepared_nodes, *self.templates.values())
+        node_texts = None
+        if splice:
+            node_texts = self.render_node_texts(prepared_nodes)
+        else:
+            self.logger.warning("节点或模板中存在共享引用的对象，改为逐个文件整体序列化。")
         
+        rendered = []
+        selections = []
         for config_info in CONFIGS_TO_GENERATE:
             filter_key = config_info.get("filter")
             output_path = config_info.get("output")
             template_name = config_info.get("template")
             
-            # 1. 根据地区过滤器筛选节点 (在原始名称上进行)
-            filtered_proxies = self.filter_nodes_by_region(all_nodes, filter_key)
+            # 2. 根据地区过滤器筛选节点 (在原始名称上进行)
+            indices = self.select_region_indices(len(all_nodes), filter_key, region_index)
+            selections.append((config_info, indices))
             
-            if not filtered_proxies and filter_key:
+            if not indices and filter_key:
                 self.logger.warning(f"地区 '{filter_key}' 没有可用节点，但仍会生成一个空的配置文件。")
 
-            # 2. 准备用于生成的节点列表 (深拷贝以避免修改原始列表)
-            proxies_for_generation = yaml.safe_load(yaml.safe_dump(filtered_proxies))
-
-            # 3. 对即将生成的列表进行重命名
-            for node in proxies_for_generation:
-                delay = node.get('_delay')
-                if delay is not None:
-                    delay_str = f"[{delay}ms]"
-                    node['name'] = f"{delay_str} {node['name']}"
-                    # 清理临时字段
-                    del node['_delay']
-            
-            # 4. 生成配置文件
-            self.generate_config_from_template(
-                base_config=self.templates[template_name],
-                proxies_list=proxies_for_generation,
-                output_path=output_path
-            )
-            generated_files.append(output_path)
+            # 3. 拼接配置文件内容
+            if not splice:
+                config = {**self.templates[template_name], 'proxies': [prepared_nodes[i] for i in indices]}
+                text = dump_config_text(config)
+            else:
+                head, tail = self.render_template_parts(template_name)
+                text = ''.join([head, self.render_proxies_text(indices, prepared_nodes, node_texts), tail])
+            rendered.append((output_path, text, len(indices)))
+
+        if self.output_format == 'provider':
+            inline = rendered
+            rendered, references = self.render_provider_layout(selections, region_index, prepared_nodes, node_texts)
+            self.log_size_report(inline, rendered, references)
+
+        # 4. 生成预压缩副本
+        outputs = [(path, text.encode('utf-8'), count) for path, text, count in rendered]
+        for encoding in self.precompress:
+            outputs += [(f"{path}.{encoding}", compress_data(data, encoding), count) for path, data, count in outputs
+                        if not path.endswith(('.gz', '.br'))]
         
-        return generated_files
+        # 5. 并行比对哈希并写出有变化的文件
+        with ThreadPoolExecutor(max_workers=min(len(outputs), 32) or 1) as executor:
+            entries = list(executor.map(lambda item: self.write_output(*item), outputs))
+        return {output_path: entry for (output_path, _, _), entry in zip(outputs, entries)}
     
+    def sort_nodes(self, all_nodes: list, rank_by: str = 'latency', history_file: str = None) -> None:
+        """
+        对所有节点进行全局排序 (原地)。
+        latency: 按本轮测得的延迟升序；
+        stability: 按健康历史的稳定性得分 (通过率与 p90 延迟) 降序，得分相同或没有历史时按本轮延迟升序。
+        """
+        if rank_by == 'stability':
+            history_file = history_file or HistoryConfig.FILE
+            if os.path.exists(history_file):
+                history = HealthHistory(history_file)
+                try:
+                    stats = history.stats_for(all_nodes)
+                finally:
+                    history.close()
+                scores = {id(all_nodes[i]): s['score'] for i, s in stats.items()}
+                all_nodes.sort(key=lambda p: (-scores.get(id(p), 0.0), p.get('_delay', float('inf'))))
+                self.logger.info(f"所有健康节点已按稳定性得分排序 ({len(scores)} 个节点有历史记录)。")
+                return
+            self.logger.warning(f"健康历史 {history_file} 不存在，改为按延迟排序。")
+
+        all_nodes.sort(key=lambda p: p.get('_delay', float('inf')))
+        self.logger.info("所有健康节点已按延迟升序排序。")
+
     def output_to_github_actions(self, generated_files: list) -> None:
         """输出产物清单到 GitHub Actions"""
         if 'GITHUB_OUTPUT' in os.environ:
@@ -162,7 +429,31 @@ class ConfigGenerator:
             except Exception as e:
                 self.logger.error(f"输出到 GitHub Actions 失败: {e}")
     
-    def run(self, pre_tested_nodes_file: str = None) -> None:
+    def generate(self, all_nodes: list, rank_by: str = 'latency', history_file: str = None) -> list:
+        """
+        由节点列表 (dict 或 Node) 生成所有配置文件与清单 (进程内流水线直接传入测试后的节点)。
+
+        Returns:
+            内容有变化的文件路径列表
+        """
+        if not self.templates:
+            self.load_templates()
+
+        # 1. 对所有节点进行全局排序 (按延迟或稳定性)
+        self.sort_nodes(all_nodes, rank_by, history_file)
+
+        # 2. 生成所有配置文件 (重命名逻辑已移入此函数)，只有内容变化的文件会被重写
+        entries = self.generate_all_configs(all_nodes)
+        changed_files = [path for path, entry in entries.items() if entry['changed']]
+        self.logger.info(f"{len(changed_files)} 个配置文件有变化，{len(entries) - len(changed_files)} 个未变化。")
+        if self.write_manifest(entries):
+            changed_files.append(PathConfig.MANIFEST_FILE)
+
+        # 3. 只输出有变化的文件，未变化的文件无需提交和刷新 CDN 缓存
+        self.output_to_github_actions(changed_files)
+        return changed_files
+
+    def run(self, pre_tested_nodes_file: str = None, rank_by: str = 'latency', history_file: str = None) -> None:
         """主执行函数"""
         try:
             self.load_templates()
@@ -172,14 +463,7 @@ class ConfigGenerator:
                 self.logger.error("没有可用的节点，退出程序")
                 sys.exit(1)
 
-            # 1. 按延迟对所有节点进行全局排序
-            all_nodes.sort(key=lambda p: p.get('_delay', float('inf')))
-            self.logger.info("所有健康节点已按延迟升序排序。")
-
-            # 2. 生成所有配置文件 (重命名逻辑已移入此函数)
-            generated_files = self.generate_all_configs(all_nodes)
-            
-            self.output_to_github_actions(generated_files)
+            self.generate(all_nodes, rank_by, history_file)
             
             self.logger.info("🎉 所有任务已成功完成！")
             
@@ -188,6 +472,15 @@ class ConfigGenerator:
             sys.exit(1)
 
 
+def parse_precompress(value: str) -> list:
+    """解析逗号分隔的预压缩格式列表 (gz, br)"""
+    precompress = [encoding.strip() for encoding in value.split(',') if encoding.strip()]
+    unknown = set(precompress) - {'gz', 'br'}
+    if unknown:
+        raise argparse.ArgumentTypeError(f"不支持的预压缩格式: {', '.join(sorted(unknown))}")
+    return precompress
+
+
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(description="生成 Clash 配置文件。")
@@ -197,10 +490,43 @@ def main():
         help='指定一个包含预先测试好的节点的YAML文件，脚本将直接使用这些节点进行分发生成。'
     )
     
+    parser.add_argument(
+        '--rank-by',
+        type=str,
+        choices=['latency', 'stability'],
+        default='latency',
+        help='节点排序方式：latency 按本轮延迟；stability 按健康历史的稳定性得分 (通过率与 p90 延迟)。'
+    )
+    parser.add_argument(
+        '--history-file',
+        type=str,
+        default=HistoryConfig.FILE,
+        help='按稳定性排序时使用的节点健康历史数据库路径。'
+    )
+    parser.add_argument(
+        '--render-workers',
+        type=int,
+        default=int(os.environ.get("RENDER_WORKERS", os.cpu_count() or 1)),
+        help='并行序列化节点的进程数 (1 表示在主进程中序列化)。'
+    )
+    parser.add_argument(
+        '--output-format',
+        type=str,
+        choices=['inline', 'provider'],
+        default=ProviderConfig.OUTPUT_FORMAT,
+        help='inline: 节点内联在每个配置文件中；provider: 每个地区一个 proxy-providers 节点文件，配置文件只引用它们。'
+    )
+    parser.add_argument(
+        '--precompress',
+        type=parse_precompress,
+        default=ProviderConfig.PRECOMPRESS,
+        help='额外写出的预压缩副本，逗号分隔 (gz, br)，br 需要安装 brotli。'
+    )
+    
     args = parser.parse_args()
     
-    generator = ConfigGenerator()
-    generator.run(args.use_pre_tested_nodes)
+    generator = ConfigGenerator(args.render_workers, args.output_format, args.precompress)
+    generator.run(args.use_pre_tested_nodes, args.rank_by, args.history_file)
 
 
 if __name__ == "__main__":
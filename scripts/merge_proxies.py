@@ -1,162 +1,435 @@
 # -*- coding: utf-8 -*-
 """
-Clash Config Auto Builder - 节点合并与解析器 (q-tool 并发版)
+Clash Config Auto Builder - 节点合并与解析器 (异步 DNS 版)
 """
 
-import yaml
 import glob
 import argparse
+import asyncio
+import hashlib
+import json
+import pickle
 import sys
 import os
 import re
 import ipaddress
-import subprocess
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import tempfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+from itertools import islice
 
 # 添加项目根目录到Python路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from core.constants import FILTER_PATTERNS, BLACKLIST_KEYWORDS, DnsConfig
+from core.cache import PersistentCache
+from core.constants import FILTER_PATTERNS, BLACKLIST_PATTERN, DnsConfig, PathConfig, SeenIndexConfig, SubscriptionConfig
+from core.dns_resolver import AsyncDnsResolver
+from core.fingerprint import dedupe_key
 from core.logger import setup_logger
+from core.node import Node
+from core.seen_index import STAGE_LABELS, STAGE_RESOLVE, open_seen_index
+from core.yaml_io import YamlListWriter, load_proxies_file
 
 DELAY_PREFIX_RE = re.compile(r'^(?:\[\s*\d+ms\]\s*)+')
 
-def _resolve_domain_with_q(domain_info: tuple, logger):
-    """使用 q 工具解析域名，手动处理CNAME，优先IPv6，使用正确的语法。"""
-    original_domain, proxy = domain_info
-    domain_to_query = original_domain
+def _open_dns_cache(logger):
+    """打开持久化的 DNS 解析缓存，失败时返回 None (不影响解析)"""
+    cache_file = os.path.join(PathConfig.CACHE_DIR, DnsConfig.CACHE_FILE_NAME)
+    try:
+        return PersistentCache(cache_file)
+    except Exception as e:
+        logger.warning(f"无法打开 DNS 缓存 {cache_file}，将全部实时解析: {e}")
+        return None
 
-    dns_servers = DnsConfig.CUSTOM_DNS_SERVERS or ['8.8.8.8', '1.1.1.1']
-    # 使用 -s 参数指定DNS服务器
-    dns_server_str = f"-s {dns_servers[0]}"
+def _dns_cache_key(domain: str) -> str:
+    """缓存键包含 ECS 地址，修改 ECS 后旧结果自动失效"""
+    return f"{DnsConfig.ECS_IP}|{domain.lower()}"
 
-    ecs_ip_str = ""
-    if DnsConfig.ECS_IP:
-        try:
-            ecs_ip_obj = ipaddress.ip_address(DnsConfig.ECS_IP)
-            prefix = 24 if ecs_ip_obj.version == 4 else 56
-            # 使用 --subnet= 参数指定ECS
-            ecs_ip_str = f"--subnet={ecs_ip_obj.exploded}/{prefix}"
-        except ValueError:
-            logger.warning(f"无效的ECS IP地址: '{DnsConfig.ECS_IP}'，已禁用ECS功能。")
+async def _resolve_domains(domains: list, logger) -> dict:
+    """
+    按唯一域名解析：先查询持久化缓存，只有未命中的域名才发起 DNS 查询。
+    成功结果按记录 TTL 缓存，无法解析的域名写入负缓存。
 
-    # 1. 手动处理 CNAME
-    # 使用 -t CNAME 和 --short 参数
-    cname_cmd = f"q -t CNAME {original_domain} {dns_server_str} --short"
+    Returns:
+        {domain: ip 或 None}
+    """
+    cache = _open_dns_cache(logger)
+    resolved = {}
     try:
-        cname_result = subprocess.run(cname_cmd, shell=True, capture_output=True, text=True, timeout=5)
-        if cname_result.returncode == 0 and cname_result.stdout:
-            new_domain = cname_result.stdout.strip().rstrip('.')
-            if new_domain and new_domain != original_domain:
-                logger.info(f"域名 '{original_domain}' 的 CNAME 是 '{new_domain}'，将解析新域名。")
-                domain_to_query = new_domain
-    except subprocess.TimeoutExpired:
-        pass # CNAME查询失败不是致命错误
-
-    def do_query(record_type):
-        # 使用 -t 和 --short 参数，不再使用 --one
-        cmd = f"q -t {record_type} {domain_to_query} {dns_server_str} {ecs_ip_str} --short"
+        if cache is not None:
+            cached = cache.get_many(_dns_cache_key(d) for d in domains)
+            for domain in domains:
+                entry = cached.get(_dns_cache_key(domain))
+                if entry is not None:
+                    resolved[domain] = entry['ip']
+            logger.info(f"DNS 缓存命中 {len(resolved)} 个域名 (其中负缓存 {sum(1 for ip in resolved.values() if ip is None)} 个)。")
+
+        pending = [d for d in domains if d not in resolved]
+        resolver = AsyncDnsResolver(
+            DnsConfig.CUSTOM_DNS_SERVERS or ['8.8.8.8', '1.1.1.1'],
+            ecs_ip=DnsConfig.ECS_IP,
+            timeout=DnsConfig.QUERY_TIMEOUT,
+            retries=DnsConfig.QUERY_RETRIES,
+            max_concurrency=DnsConfig.MAX_CONCURRENCY,
+            logger=logger
+        )
         try:
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=5)
-            if result.returncode == 0 and result.stdout:
-                for line in result.stdout.strip().split('\n'):
-                    try:
-                        ip = line.strip()
-                        ipaddress.ip_address(ip)
-                        return ip
-                    except ValueError:
-                        continue
-        except subprocess.TimeoutExpired as e:
-            logger.debug(f"执行命令 '{cmd}' 失败: {e}")
+            results = await resolver.resolve_many(pending)
+        finally:
+            resolver.close()
+
+        positive, negative = {}, {}
+        for domain, (ip, ttl) in results.items():
+            resolved[domain] = ip
+            if ip:
+                ttl = min(max(ttl or 0, DnsConfig.CACHE_MIN_TTL), DnsConfig.CACHE_MAX_TTL)
+                positive.setdefault(ttl, {})[_dns_cache_key(domain)] = {'ip': ip}
+            else:
+                negative[_dns_cache_key(domain)] = {'ip': None}
+
+        if cache is not None:
+            for ttl, items in positive.items():
+                cache.set_many(items, ttl=ttl)
+            cache.set_many(negative, ttl=DnsConfig.NEGATIVE_TTL)
+    finally:
+        if cache is not None:
+            cache.close()
+    return resolved
+
+def _report_resolution(resolved: dict, domain_counts: dict, logger) -> None:
+    """按域名输出解析结果日志"""
+    for domain, count in domain_counts.items():
+        ip = resolved.get(domain)
+        if not ip:
+            logger.warning(f"无法解析域名 '{domain}'，{count} 个节点将被丢弃。")
+            continue
+        version = 'IPv6' if ipaddress.ip_address(ip).version == 6 else 'IPv4'
+        logger.info(f"成功将域名 '{domain}' 解析为 {version}: {ip} ({count} 个节点)")
+
+def _open_parse_cache(cache_file: str, logger):
+    """打开按文件内容哈希保存解析结果的缓存；未指定路径或打开失败时返回 None (不影响解析)"""
+    if not cache_file:
+        return None
+    try:
+        return PersistentCache(cache_file, ttl=SubscriptionConfig.PARSE_CACHE_TTL,
+                               max_entries=SubscriptionConfig.PARSE_CACHE_MAX_ENTRIES)
+    except Exception as e:
+        logger.warning(f"无法打开解析缓存 {cache_file}，将解析全部订阅文件: {e}")
         return None
 
-    # 2. 优先解析 AAAA (IPv6)
-    ipv6 = do_query('AAAA')
-    if ipv6:
-        logger.info(f"成功将域名 '{original_domain}' 解析为 IPv6: {ipv6}")
-        proxy['server'] = ipv6
-        return proxy
+def _file_digest(file_path: str) -> str:
+    """文件内容的 SHA-256，作为解析缓存的键"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-    # 3. 如果没有IPv6记录，则尝试解析 A (IPv4)
-    ipv4 = do_query('A')
-    if ipv4:
-        logger.info(f"成功将域名 '{original_domain}' 解析为 IPv4: {ipv4}")
-        proxy['server'] = ipv4
-        return proxy
+def _survives_json(value) -> bool:
+    """value 经 JSON 编码再解码后是否与原值完全相同 (YAML 日期、非字符串的键等会被改变或无法编码)"""
+    try:
+        return json.loads(json.dumps(value, ensure_ascii=False)) == value
+    except (TypeError, ValueError):
+        return False
 
-    logger.warning(f"无法解析域名 '{original_domain}'，节点 '{proxy.get('name')}' 将被丢弃。")
-    return None
+class _ParsedFiles:
+    """
+    解析缓存的读写：按文件内容的哈希查找上次的解析结果，新解析的文件写回缓存。
+    缓存以 JSON 保存，解析结果无法原样经过 JSON 的文件不缓存，保证命中缓存时与重新解析的结果相同。
+    """
 
-def merge_proxies(proxies_dir: str, output_file: str, name_filter: str = None) -> None:
-    logger = setup_logger("merge_proxies")
-    
-    all_proxies, ip_proxies, domain_proxies = [], [], []
-    seen_identifiers = set()
+    def __init__(self, cache):
+        self.cache = cache
+        self._keys = {}
 
-    for file_path in glob.glob(f"{proxies_dir}/*.*"):
+    def load(self, file_path: str):
+        """返回缓存的节点列表，未命中或无法读取文件时返回 None"""
         try:
-            with open(file_path, 'r', encoding="utf-8") as f:
-                data = yaml.safe_load(f)
-            if not isinstance(data, dict) or 'proxies' not in data:
+            self._keys[file_path] = _file_digest(file_path)
+        except OSError:
+            return None
+        return self.cache.get(self._keys[file_path])
+
+    def store(self, file_path: str, proxies: list) -> None:
+        key = self._keys.get(file_path)
+        if key is not None and _survives_json(proxies):
+            self.cache.set(key, proxies)
+
+def _iter_parsed_files(files: list, parse_workers: int, use_libyaml: bool = None, parsed_files: _ParsedFiles = None):
+    """
+    使用进程池并行解析订阅文件，按文件顺序产出 (file_path, future, 是否命中解析缓存)。
+    同时在途的文件数限制为进程数的两倍，避免解析结果在内存中堆积；命中缓存的文件不交给进程池。
+    """
+    loader = partial(load_proxies_file, use_libyaml=use_libyaml)
+    with ProcessPoolExecutor(max_workers=parse_workers) as executor:
+        def schedule(path: str) -> tuple:
+            cached = parsed_files.load(path) if parsed_files is not None else None
+            if cached is None:
+                return path, executor.submit(loader, path), False
+            future = Future()
+            future.set_result(cached)
+            return path, future, True
+
+        files_iter = iter(files)
+        pending = deque(schedule(path) for path in islice(files_iter, parse_workers * 2))
+        while pending:
+            item = pending.popleft()
+            next_path = next(files_iter, None)
+            if next_path is not None:
+                pending.append(schedule(next_path))
+            yield item
+
+def _iter_source_proxies(proxies_dir: str, stats: dict, logger, parse_workers: int = 1, use_libyaml: bool = None,
+                         parse_cache=None):
+    """
+    逐个产出所有订阅文件中的代理。
+    parse_workers 为 1 时在当前进程中逐个文件解析；大于 1 时使用进程池并行解析各文件。
+    两种方式都以文件为单位：解析出错的文件整个丢弃，不会保留出错位置之前的节点。
+    指定 parse_cache 时按文件内容的哈希复用上次的解析结果，内容未变的文件不再解析。
+    """
+    files = glob.glob(f"{proxies_dir}/*.*")
+    parse_workers = max(1, min(parse_workers or 1, len(files)))
+    parsed_files = _ParsedFiles(parse_cache) if parse_cache is not None else None
+    stats.setdefault('cached_files', 0)
+    stats['files'] = len(files)
+
+    if parse_workers == 1:
+        for file_path in files:
+            cached = parsed_files.load(file_path) if parsed_files is not None else None
+            if cached is not None:
+                stats['cached_files'] += 1
+                stats['loaded'] += len(cached)
+                yield from cached
                 continue
-            all_proxies.extend(data['proxies'])
+            # 先完整解析整个文件再产出：文件中途出现格式错误时整个文件都被丢弃，与并行解析的结果一致
+            try:
+                proxies = load_proxies_file(file_path, use_libyaml)
+            except Exception as e:
+                logger.error(f"处理文件 {file_path} 时发生错误: {e}")
+                continue
+            if parsed_files is not None:
+                parsed_files.store(file_path, proxies)
+            stats['loaded'] += len(proxies)
+            yield from proxies
+        return
+
+    for file_path, future, from_cache in _iter_parsed_files(files, parse_workers, use_libyaml, parsed_files):
+        try:
+            proxies = future.result()
         except Exception as e:
             logger.error(f"处理文件 {file_path} 时发生错误: {e}")
+            continue
+        if from_cache:
+            stats['cached_files'] += 1
+        elif parsed_files is not None:
+            parsed_files.store(file_path, proxies)
+        stats['loaded'] += len(proxies)
+        yield from proxies
 
-    logger.info(f"从所有文件中共加载了 {len(all_proxies)} 个节点，开始处理...")
-
-    for proxy in all_proxies:
-        if not all(proxy.get(k) for k in ['name', 'server', 'port', 'type']):
+def _normalize_proxies(proxies):
+    """
+    规范化节点：丢弃缺少关键字段或端口无效的节点，去掉名称中的延迟前缀。
+    产出 (node, is_domain, key)，节点转为紧凑的 Node，域名节点会将原始域名记录到 server_url；
+    key 为去重键 (见 core.fingerprint.dedupe_key)，域名节点解析前后的键相同。
+    """
+    for proxy in proxies:
+        if not isinstance(proxy, dict) or not all(proxy.get(k) for k in ['name', 'server', 'port', 'type']):
             continue
-        
-        proxy['name'] = DELAY_PREFIX_RE.sub('', proxy['name']).strip()
+
+        node = Node.from_dict(proxy)
+        node.name = DELAY_PREFIX_RE.sub('', node.name).strip()
         try:
-            proxy['port'] = int(proxy['port'])
+            node.port = int(node.port)
         except (ValueError, TypeError):
             continue
 
-        server_address = proxy.get('server', '')
+        # 原始 dict 中域名节点的 server 就是 server_url，无需再从 Node 还原
+        key = dedupe_key(proxy)
         try:
-            ipaddress.ip_address(server_address)
-            ip_proxies.append(proxy)
+            ipaddress.ip_address(node.server)
+            yield node, False, key
         except ValueError:
-            proxy['server_url'] = server_address
-            domain_proxies.append(proxy)
+            node.server_url = node.server
+            yield node, True, key
 
-    logger.info(f"待解析域名共 {len(domain_proxies)} 个，开始并发解析...")
+def _is_new_identifier(key: str, seen_identifiers: set) -> bool:
+    """按去重键去重，首次出现时返回 True"""
+    if key in seen_identifiers:
+        return False
+    seen_identifiers.add(key)
+    return True
 
-    resolved_proxies = []
-    with ThreadPoolExecutor(max_workers=100) as executor:
-        future_to_domain = {executor.submit(_resolve_domain_with_q, (p.get('server_url'), p), logger): p for p in domain_proxies}
-        for future in as_completed(future_to_domain):
-            result = future.result()
-            if result:
-                resolved_proxies.append(result)
+def _report_avoided(skipped: dict, skipped_domains: int, duplicate_domains: int, logger) -> None:
+    """
+    输出去重统计：被去重索引跳过的已知节点 ({去重键: 上次被淘汰的阶段})，以及解析前就被去掉的重复域名节点，
+    并汇总各阶段因此少处理的唯一节点数 (IP 节点本来就不需要解析)
+    """
+    total = len(skipped)
+    if total:
+        by_stage = {}
+        for stage in skipped.values():
+            by_stage[stage] = by_stage.get(stage, 0) + 1
+        details = ', '.join(f"{STAGE_LABELS.get(stage, stage)} {count}" for stage, count in by_stage.items())
+        logger.info(f"去重索引跳过 {total} 个已知节点 ({details})。")
+    logger.info(
+        f"各阶段免于处理的节点数: DNS 解析 {skipped_domains + duplicate_domains} 个 "
+        f"(其中重复域名节点 {duplicate_domains} 个), 格式验证 {total} 个, 延迟测试 {total} 个。"
+    )
 
-    logger.info(f"成功解析 {len(resolved_proxies)} 个域名。")
+class _UniqueNamer:
+    """
+    为节点分配唯一名称：重名时依次尝试 "原名 #2"、"原名 #3"...，取第一个未被占用的名称。
+    按原名记录下一个待尝试的序号，已占用的序号不会被重复尝试，总耗时与节点数成线性。
+    """
 
-    final_proxies, seen_names = [], set()
-    for proxy in ip_proxies + resolved_proxies:
-        identifier = proxy.get('server_url', proxy.get('server')), proxy['type'], proxy['port']
-        if identifier in seen_identifiers:
-            continue
-        seen_identifiers.add(identifier)
+    def __init__(self):
+        self.seen = set()
+        self._next_counter = {}
 
-        original_name = proxy.get('name')
-        name, counter = original_name, 2
-        while name in seen_names:
+    def assign(self, name: str) -> str:
+        if name in self.seen:
+            original_name = name
+            # 比记录的序号更小的名称都已被占用 (已占用的名称不会被释放)，结果与从 #2 开始逐个尝试相同
+            counter = self._next_counter.get(original_name, 2)
             name = f"{original_name} #{counter}"
-            counter += 1
-        proxy['name'] = name
-        seen_names.add(name)
+            while name in self.seen:
+                counter += 1
+                name = f"{original_name} #{counter}"
+            self._next_counter[original_name] = counter + 1
+        self.seen.add(name)
+        return name
+
+def _compile_name_filter(name_filter: str = None):
+    """返回判断名称是否通过黑名单 (合并后的单个正则) 与地区过滤的函数；未知的地区过滤器视为不过滤"""
+    blacklisted = BLACKLIST_PATTERN.search
+    region = FILTER_PATTERNS.get(name_filter) if name_filter else None
+    if region is None:
+        return lambda name: blacklisted(name) is None
+    in_region = region.search
+    return lambda name: blacklisted(name) is None and in_region(name) is not None
+
+def _finalize_proxy(node: Node, namer: _UniqueNamer, accepts) -> bool:
+    """为节点分配唯一名称，并判断其是否通过黑名单与地区过滤 (accepts 由 _compile_name_filter 生成)"""
+    node.name = namer.assign(node.name)
+    return accepts(node.name)
 
-        if not (any(keyword in name for keyword in BLACKLIST_KEYWORDS) or (name_filter and name_filter in FILTER_PATTERNS and not FILTER_PATTERNS[name_filter].search(name))):
-            final_proxies.append(proxy)
+def _iter_spool(spool):
+    """依次读回暂存文件中的节点"""
+    spool.seek(0)
+    while True:
+        try:
+            yield pickle.load(spool)
+        except EOFError:
+            return
+
+def iter_merged_proxies(proxies_dir: str, name_filter: str = None, parse_workers: int = None, logger=None,
+                        seen_index_file: str = None, parse_cache_file: str = None):
+    """
+    以流式方式合并所有订阅文件，依次产出去重并通过过滤的节点 (Node)：
+    1. 逐个文件解析 (出错的文件整个丢弃)，IP 节点在规范化、去重后立即产出；
+    2. 域名节点去重后暂存到磁盘，只在内存中保留唯一域名；
+    3. 解析完所有唯一域名后再依次读回域名节点，去重并产出。
+    内存占用只与去重索引 (去重键、名称、域名) 成正比，而与节点总数无关。
+    parse_workers 大于 1 时使用进程池并行解析订阅文件，默认等于 CPU 核心数。
+    指定 seen_index_file 时，上次运行中被淘汰且仍在有效期内的节点在第 1 步即被丢弃，
+    本轮无法解析的域名节点也会写入该索引。
+    指定 parse_cache_file 时，内容与上次相同的订阅文件直接复用缓存的解析结果。
+    """
+    logger = logger or setup_logger("merge_proxies")
+
+    stats = {'loaded': 0}
+    seen_identifiers = set()
+    domain_identifiers = set()
+    namer = _UniqueNamer()
+    accepts = _compile_name_filter(name_filter)
+    domain_counts = {}
+    ip_count = 0
+    skipped = {}
+    skipped_domains = set()
+    duplicate_domains = 0
+
+    seen_index = open_seen_index(seen_index_file, logger)
+    known = seen_index.load() if seen_index is not None else {}
+    if seen_index is not None:
+        logger.info(f"已加载去重索引: {seen_index_file} ({len(known)} 个仍在有效期内的已淘汰节点)")
+    parse_cache = _open_parse_cache(parse_cache_file, logger)
+
+    try:
+        with tempfile.TemporaryFile() as spool:
+            if parse_workers is None:
+                parse_workers = os.cpu_count() or 1
+            source = _iter_source_proxies(proxies_dir, stats, logger, parse_workers, parse_cache=parse_cache)
+            for proxy, is_domain, key in _normalize_proxies(source):
+                stage = known.get(key)
+                if stage is not None:
+                    skipped[key] = stage
+                    if is_domain:
+                        skipped_domains.add(key)
+                    continue
+                if is_domain:
+                    # 同一批次中重复的域名节点 (如镜像订阅) 在暂存前就去掉；与 IP 节点的重复在读回时判断
+                    if not _is_new_identifier(key, domain_identifiers):
+                        duplicate_domains += 1
+                        continue
+                    domain_counts[proxy.server_url] = domain_counts.get(proxy.server_url, 0) + 1
+                    pickle.dump((key, proxy), spool, protocol=pickle.HIGHEST_PROTOCOL)
+                elif _is_new_identifier(key, seen_identifiers):
+                    ip_count += 1
+                    if _finalize_proxy(proxy, namer, accepts):
+                        yield proxy
+
+            if parse_cache is not None:
+                logger.info(f"解析缓存命中 {stats['cached_files']}/{stats['files']} 个订阅文件 (内容未变，跳过解析)。")
+            domain_total = sum(domain_counts.values())
+            logger.info(f"从所有文件中共加载了 {stats['loaded']} 个节点，其中唯一 IP 节点 {ip_count} 个，唯一域名节点 {domain_total} 个。")
+            logger.info(f"待解析域名节点共 {domain_total} 个 ({len(domain_counts)} 个唯一域名)，开始并发解析...")
+
+            resolved = asyncio.run(_resolve_domains(list(domain_counts), logger))
+            _report_resolution(resolved, domain_counts, logger)
+            logger.info(f"成功解析 {sum(count for domain, count in domain_counts.items() if resolved.get(domain))} 个域名节点。")
+
+            unresolved = {}
+            for key, proxy in _iter_spool(spool):
+                ip = resolved.get(proxy.server_url)
+                if not ip:
+                    unresolved[key] = SeenIndexConfig.RESOLVE_TTL
+                    continue
+                proxy.server = ip
+                if key not in seen_identifiers and _finalize_proxy(proxy, namer, accepts):
+                    yield proxy
+
+        if seen_index is not None:
+            seen_index.reject(STAGE_RESOLVE, unresolved)
+            logger.info(f"已将 {len(unresolved)} 个无法解析的域名节点写入去重索引。")
+        _report_avoided(skipped, len(skipped_domains), duplicate_domains, logger)
+    finally:
+        if seen_index is not None:
+            seen_index.close()
+        if parse_cache is not None:
+            parse_cache.close()
+
+def collect_proxies(proxies_dir: str, name_filter: str = None, parse_workers: int = None,
+                    seen_index_file: str = None, parse_cache_file: str = None) -> list:
+    """合并所有订阅文件并返回 Node 列表 (供进程内流水线使用，不写出中间文件)"""
+    logger = setup_logger("merge_proxies")
+    proxies = list(iter_merged_proxies(proxies_dir, name_filter, parse_workers, logger, seen_index_file, parse_cache_file))
+    logger.info(f"总共合并了 {len(proxies)} 个唯一的代理。")
+    return proxies
+
+def merge_proxies(proxies_dir: str, output_file: str, name_filter: str = None, parse_workers: int = None,
+                  seen_index_file: str = None, parse_cache_file: str = None) -> None:
+    """合并所有订阅文件，边合并边写出到 output_file，见 iter_merged_proxies"""
+    logger = setup_logger("merge_proxies")
 
-    logger.info(f"总共为 '{output_file}' 合并了 {len(final_proxies)} 个唯一的代理。")
     try:
         with open(output_file, 'w', encoding="utf-8") as f:
-            yaml.dump({'proxies': final_proxies}, f, default_flow_style=False, allow_unicode=True)
+            writer = YamlListWriter(f)
+            for proxy in iter_merged_proxies(proxies_dir, name_filter, parse_workers, logger, seen_index_file, parse_cache_file):
+                writer.write(proxy.to_dict())
+            writer.close()
+
+        logger.info(f"总共为 '{output_file}' 合并了 {writer.count} 个唯一的代理。")
         logger.info(f"成功写入合并结果到 {output_file}")
     except IOError as e:
         logger.error(f"写入文件 {output_file} 失败: {e}")
@@ -166,8 +439,14 @@ def main():
     parser.add_argument('--proxies-dir', type=str, required=True, help='存放代理配置文件的目录路径')
     parser.add_argument('--output', type=str, required=True, help='合并后输出的文件路径')
     parser.add_argument('--filter', type=str, choices=list(FILTER_PATTERNS.keys()), help="根据地区关键词过滤代理名称")
+    parser.add_argument('--parse-workers', type=int, default=os.cpu_count() or 1, help='并行解析订阅文件的进程数 (1 表示在主进程中流式解析)')
+    parser.add_argument('--seen-index-file', type=str, default=SeenIndexConfig.FILE, help='跨运行去重索引路径，跳过上次已被淘汰的节点')
+    parser.add_argument('--no-seen-index', action='store_true', help='不读取也不写入去重索引，处理全部节点')
+    parser.add_argument('--no-parse-cache', action='store_true', help='不使用解析缓存，重新解析全部订阅文件')
     args = parser.parse_args()
-    merge_proxies(args.proxies_dir, args.output, args.filter)
+    merge_proxies(args.proxies_dir, args.output, args.filter, args.parse_workers,
+                  None if args.no_seen_index else args.seen_index_file,
+                  None if args.no_parse_cache else SubscriptionConfig.PARSE_CACHE_FILE)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
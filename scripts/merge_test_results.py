@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Clash Config Auto Builder - 分片测试结果合并
+将多个 `node_tester_integrated.py --shard i/N` 产生的部分结果合并为一个健康节点文件，
+供 `generate_config.py --use-pre-tested-nodes` 使用。
+"""
+
+import argparse
+import glob
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.fingerprint import proxy_fingerprint
+from core.logger import setup_logger
+from core.yaml_io import dump_yaml, load_yaml
+
+
+def _delay_key(proxy: dict):
+    """延迟排序键，没有延迟的节点排在最后"""
+    delay = proxy.get('_delay')
+    return (delay is None, delay or 0)
+
+
+def merge_test_results(patterns: list, output_file: str, expected_shards: int = None) -> None:
+    """
+    读取所有匹配的部分结果文件并合并。同一节点 (按指纹) 出现在多个文件中时保留延迟最低的一份，
+    节点名称冲突时保留先出现的节点。
+    """
+    logger = setup_logger("merge_test_results")
+
+    files = sorted({path for pattern in patterns for path in (glob.glob(pattern) or [pattern])})
+    merged = {}
+    read_files = 0
+    for path in files:
+        if not os.path.exists(path):
+            # 没有找到任何健康节点的分片不会写出结果文件
+            logger.warning(f"部分结果文件 {path} 不存在，已跳过")
+            continue
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                proxies = (load_yaml(f) or {}).get('proxies') or []
+        except Exception as e:
+            logger.error(f"读取部分结果文件 {path} 失败: {e}")
+            sys.exit(1)
+        read_files += 1
+        for proxy in proxies:
+            key = proxy_fingerprint(proxy)
+            if key not in merged or _delay_key(proxy) < _delay_key(merged[key]):
+                merged[key] = proxy
+        logger.info(f"已读取 {path}: {len(proxies)} 个健康节点")
+
+    if expected_shards is not None and read_files < expected_shards:
+        logger.warning(f"只读取到 {read_files}/{expected_shards} 个分片的结果")
+
+    names = set()
+    healthy_proxies = []
+    for proxy in sorted(merged.values(), key=_delay_key):
+        if proxy.get('name') in names:
+            logger.warning(f"节点名称 {proxy.get('name')} 重复，已丢弃延迟较高的一个")
+            continue
+        names.add(proxy.get('name'))
+        healthy_proxies.append(proxy)
+
+    try:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            dump_yaml({'proxies': healthy_proxies}, f, allow_unicode=True)
+        logger.info(f"合并完成: {read_files} 个部分结果文件，共 {len(healthy_proxies)} 个健康节点，已写入 {output_file}")
+    except IOError as e:
+        logger.error(f"写入输出文件时发生错误: {e}")
+        sys.exit(1)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="合并分片测试产生的部分结果文件。")
+    parser.add_argument('inputs', nargs='+', help='部分结果文件路径或通配符 (如 "results/healthy_*.yaml")')
+    parser.add_argument('--output', type=str, required=True, help='合并后输出的健康节点 YAML 文件')
+    parser.add_argument('--expected-shards', type=int, default=None, help='期望的分片数，读取到的结果文件较少时发出警告')
+    args = parser.parse_args()
+    merge_test_results(args.inputs, args.output, args.expected_shards)
+
+
+if __name__ == "__main__":
+    main()
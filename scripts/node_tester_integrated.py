@@ -1,95 +1,661 @@
-import yaml
+import asyncio
 import requests
 import os
+import sys
 import logging
 import subprocess
 import time
 import argparse
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from queue import Queue
 import shutil
+import socket
+import ssl
+import tempfile
+from urllib.parse import quote, urlsplit
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.async_probe import (
+    ProbeError, ProbeTimeout, controller_get, fetch_via_proxy, handshake_context, https_context,
+    is_local_pressure, tls_handshake
+)
+from core.constants import HistoryConfig, NodeTestConfig, PathConfig, SeenIndexConfig
+from core.concurrency import OUTCOME_LOCAL_ERROR, OUTCOME_OK, OUTCOME_TIMEOUT, AimdLimiter
+from core.fingerprint import dedupe_key, fingerprint_shard
+from core.health_history import HealthHistory
+from core.journal import ResultJournal
+from core.node import as_dicts, as_nodes
+from core.seen_index import STAGE_TEST, open_seen_index
+from core.yaml_io import dump_yaml, load_yaml
 
 # --- 日志配置 ---
 log_level = os.environ.get("LOG_LEVEL", "INFO").upper()
 logging.basicConfig(level=log_level, format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s')
 
 # --- 核心测试逻辑 ---
-def test_node_pipeline(proxy_name: str, worker_info: dict, args: argparse.Namespace) -> tuple[str, bool]:
-    """
-    在一个复用的、独立的 Clash 进程上，通过 API 切换到指定节点，并执行两阶段测试。
-    """
+def switch_global(proxy_name: str, worker_info: dict) -> bool:
+    """通过 API 将工人的全局代理切换到指定节点"""
     api_url = worker_info['api_url']
-    proxy_url = worker_info['proxy_url']
-    logging.debug(f"节点 {proxy_name}: 使用工人 {api_url} 开始测试")
-
-    # 1. 通过 API 切换全局代理到当前节点
     try:
         switch_payload = {'name': proxy_name}
         switch_url = f"{api_url}/proxies/GLOBAL"
-        response = requests.put(switch_url, json=switch_payload, timeout=3)
+        response = worker_info['session'].put(switch_url, json=switch_payload, timeout=3)
         if response.status_code != 204:
             logging.warning(f"节点 {proxy_name}: ❌ API 切换失败 (工人: {api_url}, 状态码: {response.status_code}) - {response.text}")
-            return proxy_name, False
+            return False
     except requests.exceptions.RequestException as e:
         logging.error(f"节点 {proxy_name}: ❌ API 切换失败 (工人: {api_url}, 请求异常: {e})")
-        return proxy_name, False
+        return False
 
     time.sleep(0.1)
+    return True
 
-    # --- 阶段一：延迟测试 ---
+def measure_latency(proxy_name: str, proxy_url: str, args: argparse.Namespace) -> int | None:
+    """
+    http 延迟引擎：通过本地代理入口请求测试 URL，返回延迟 (毫秒)，未通过时返回 None。
+    """
     try:
         proxies = {"http": proxy_url, "https": proxy_url}
         response = requests.get(args.latency_test_url, proxies=proxies, timeout=args.latency_timeout)
         latency = response.elapsed.total_seconds() * 1000
         if response.status_code == 204 and latency < args.delay_limit:
             logging.info(f"节点 {proxy_name}: ✅ 延迟测试通过 ({latency:.0f}ms)")
-        else:
-            logging.warning(f"节点 {proxy_name}: ❌ 延迟测试失败 (URL: {args.latency_test_url}, 状态码: {response.status_code}, 延迟: {latency:.0f}ms)")
-            return proxy_name, False
+            return round(latency)
+        logging.warning(f"节点 {proxy_name}: ❌ 延迟测试失败 (URL: {args.latency_test_url}, 状态码: {response.status_code}, 延迟: {latency:.0f}ms)")
     except requests.exceptions.RequestException as e:
         logging.warning(f"节点 {proxy_name}: ❌ 延迟测试失败 (URL: {args.latency_test_url}, 请求异常: {e})")
-        return proxy_name, False
+    return None
+
+def _query_proxy_delay(proxy_name: str, worker_info: dict, args: argparse.Namespace) -> int | None:
+    """调用 mihomo 的 /proxies/{name}/delay 接口测量单个节点的延迟"""
+    try:
+        response = worker_info['session'].get(
+            f"{worker_info['api_url']}/proxies/{quote(proxy_name, safe='')}/delay",
+            params={'url': args.latency_test_url, 'timeout': args.delay_limit},
+            timeout=args.delay_limit / 1000 + 5
+        )
+        if response.status_code == 200:
+            return response.json().get('delay')
+        logging.debug(f"节点 {proxy_name} 延迟接口返回 {response.status_code}: {response.text}")
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logging.debug(f"节点 {proxy_name} 延迟接口请求异常: {e}")
+    return None
+
+def _query_group_delay(proxy_names: list, worker_info: dict, args: argparse.Namespace) -> dict:
+    """调用 mihomo 的 /group/GLOBAL/delay 接口一次性测量整个分片的延迟，只返回测通的节点"""
+    # mihomo 会并发测试组内所有节点，这里按分片大小留出足够的整体等待时间
+    request_timeout = args.delay_limit / 1000 * (1 + len(proxy_names) / 50) + 5
+    try:
+        response = worker_info['session'].get(
+            f"{worker_info['api_url']}/group/GLOBAL/delay",
+            params={'url': args.latency_test_url, 'timeout': args.delay_limit},
+            timeout=request_timeout
+        )
+        if response.status_code == 200:
+            return response.json()
+        logging.warning(f"工人 {worker_info['api_url']} 组延迟接口返回 {response.status_code}: {response.text}")
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logging.warning(f"工人 {worker_info['api_url']} 组延迟接口请求异常: {e}")
+    return {}
+
+def measure_latencies_via_api(proxy_names: list, worker_info: dict, args: argparse.Namespace) -> dict:
+    """
+    api / group 延迟引擎：通过 mihomo 内置的延迟接口批量测量分片内节点的延迟。
+    返回 {节点名: 延迟毫秒}，只包含在延迟上限内测通的节点。
+    """
+    if args.latency_engine == 'group':
+        measured = _query_group_delay(proxy_names, worker_info, args)
+    else:
+        with ThreadPoolExecutor(max_workers=args.listener_concurrency) as executor:
+            delays = executor.map(lambda name: _query_proxy_delay(name, worker_info, args), proxy_names)
+            measured = dict(zip(proxy_names, delays))
+
+    latencies = {}
+    for proxy_name in proxy_names:
+        delay = measured.get(proxy_name)
+        if isinstance(delay, int) and 0 < delay < args.delay_limit:
+            logging.info(f"节点 {proxy_name}: ✅ 延迟测试通过 ({delay}ms)")
+            latencies[proxy_name] = delay
+        else:
+            logging.warning(f"节点 {proxy_name}: ❌ 延迟测试失败 (URL: {args.latency_test_url}, 延迟接口结果: {delay})")
+    return latencies
+
+def _remaining(deadline: float) -> float:
+    """距离截止时间的剩余秒数，已超时则抛出 socket.timeout"""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise socket.timeout("timed out")
+    return remaining
+
+def tls_handshake_probe(proxy_url: str, host: str, port: int, timeout: float) -> dict:
+    """
+    经本地 HTTP 代理 (CONNECT 隧道) 与目标主机完成一次 TLS 握手，并校验证书链 (不校验主机名，使用共享的 handshake_context)。
+    返回各阶段耗时 (毫秒): connect (连接本地代理)、tunnel (CONNECT 建立隧道)、handshake (TLS 握手)。
+    失败时抛出异常，异常的 phase 属性标明失败阶段。
+    """
+    proxy = urlsplit(proxy_url)
+    deadline = time.monotonic() + timeout
+    timings = {}
+    phase = 'connect'
+    sock = None
+    try:
+        start = time.perf_counter()
+        sock = socket.create_connection((proxy.hostname, proxy.port), timeout=_remaining(deadline))
+        timings['connect'] = (time.perf_counter() - start) * 1000
+
+        phase = 'tunnel'
+        start = time.perf_counter()
+        sock.settimeout(_remaining(deadline))
+        sock.sendall(f"CONNECT {host}:{port} HTTP/1.1\r\nHost: {host}:{port}\r\n\r\n".encode('ascii'))
+        response = b''
+        while b'\r\n\r\n' not in response:
+            sock.settimeout(_remaining(deadline))
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise ConnectionError("代理在建立隧道时关闭了连接")
+            response += chunk
+            if len(response) > 65536:
+                raise ConnectionError("代理返回的 CONNECT 响应头过长")
+        status_line = response.split(b'\r\n', 1)[0].decode('latin-1')
+        status_parts = status_line.split()
+        if len(status_parts) < 2 or status_parts[1] != '200':
+            raise ConnectionError(f"CONNECT 失败: {status_line}")
+        timings['tunnel'] = (time.perf_counter() - start) * 1000
+
+        phase = 'handshake'
+        start = time.perf_counter()
+        sock.settimeout(_remaining(deadline))
+        sock = handshake_context().wrap_socket(sock, server_hostname=host)
+        timings['handshake'] = (time.perf_counter() - start) * 1000
+        return timings
+    except Exception as e:
+        e.phase = phase
+        raise
+    finally:
+        if sock is not None:
+            sock.close()
+
+def check_tls_handshake(proxy_name: str, proxy_url: str, args: argparse.Namespace) -> bool:
+    """通过本地代理入口对目标主机执行 TLS 握手测试"""
+    try:
+        timings = tls_handshake_probe(proxy_url, args.handshake_host, args.handshake_port, args.handshake_timeout)
+        logging.info(
+            f"节点 {proxy_name}: ✅ TLS握手测试通过 (连接 {timings['connect']:.0f}ms, "
+            f"CONNECT {timings['tunnel']:.0f}ms, 握手 {timings['handshake']:.0f}ms)"
+        )
+        return True
+    except (OSError, ssl.SSLError) as e:
+        logging.warning(f"节点 {proxy_name}: ❌ TLS握手测试失败 (阶段: {getattr(e, 'phase', '?')}, 原因: {e})")
+        return False
+    except Exception as e:
+        logging.error(f"测试节点 {proxy_name} 时发生未知错误: {e}")
+        return False
+
+def probe_node(proxy_name: str, proxy_url: str, args: argparse.Namespace, latency: int | None = None) -> tuple[str, bool, int | None]:
+    """
+    通过指定的本地代理入口对节点执行两阶段测试 (延迟测试 + TLS 握手测试)。
+    latency 不为 None 时表示延迟已由 mihomo 延迟接口测得，跳过阶段一。
+    返回 (节点名, 是否健康, 延迟毫秒)。
+    """
+    # --- 阶段一：延迟测试 ---
+    if latency is None:
+        latency = measure_latency(proxy_name, proxy_url, args)
+        if latency is None:
+            return proxy_name, False, None
 
     # --- 阶段二：TLS 握手测试 ---
+    return proxy_name, check_tls_handshake(proxy_name, proxy_url, args), latency
+
+def test_node_pipeline(proxy_name: str, worker_info: dict, args: argparse.Namespace, latency: int | None = None) -> tuple[str, bool, int | None]:
+    """
+    在一个复用的、独立的 Clash 进程上，通过 API 切换到指定节点，并执行两阶段测试。
+    """
+    logging.debug(f"节点 {proxy_name}: 使用工人 {worker_info['api_url']} 开始测试")
+    if not switch_global(proxy_name, worker_info):
+        return proxy_name, False, None
+    return probe_node(proxy_name, worker_info['proxy_url'], args, latency)
+
+def start_worker_process(worker_info: dict) -> None:
+    """(重新) 启动工人对应的 mihomo 进程"""
+    worker_info['process'] = subprocess.Popen(worker_info['cmd'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def stop_worker_process(worker_info: dict) -> None:
+    """终止工人对应的 mihomo 进程并等待其退出"""
+    process = worker_info.get('process')
+    if process and process.poll() is None:
+        process.terminate()
+        process.wait()
+
+def wait_until_ready(worker_info: dict, timeout: float) -> bool:
+    """
+    轮询 mihomo 的 external-controller API，直到其响应、进程退出或超时。
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if worker_info['process'].poll() is not None:
+            return False
+        try:
+            if requests.get(f"{worker_info['api_url']}/version", timeout=1).status_code == 200:
+                return True
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.05)
+    return False
+
+def ensure_worker_ready(worker_info: dict, args: argparse.Namespace) -> bool:
+    """
+    等待工人就绪；未能在超时内就绪时重启 mihomo 进程，重试次数用尽后放弃该工人。
+    """
+    for attempt in range(args.startup_retries + 1):
+        if attempt > 0:
+            logging.warning(f"工人 {worker_info['api_url']} 未能就绪，正在第 {attempt} 次重启...")
+            stop_worker_process(worker_info)
+            start_worker_process(worker_info)
+        if wait_until_ready(worker_info, args.startup_timeout):
+            worker_info['ready_at'] = time.perf_counter()
+            return True
+    return False
+
+def abandon_worker(worker_info: dict, node_count: int) -> None:
+    """放弃始终未能就绪的工人：其分片一个节点都没有测试，不产生任何结论，留待替补进程重测"""
+    logging.error(f"工人 {worker_info['api_url']} 始终未能就绪，已放弃，其负责的 {node_count} 个节点留待替补进程测试。")
+    stop_worker_process(worker_info)
+    worker_info['abandoned'] = True
+
+def restart_abandoned(shards: list, worker_infos: list) -> list:
+    """
+    为已放弃的工人启动替补 mihomo 进程，返回需要重测的 [(分片, 工人)]。
+    此时其余工人都已测完并关闭，替补进程不再与它们争抢启动资源。
+    """
+    retry = [(shard, w) for shard, w in zip(shards, worker_infos) if w['abandoned']]
+    if not retry:
+        return []
+    for w in worker_infos:
+        if not w['abandoned']:
+            stop_worker_process(w)
+    logging.warning(f"{len(retry)} 个工人未能就绪，正在启动替补进程重测其负责的 {sum(len(shard) for shard, _ in retry)} 个节点...")
+    for _, w in retry:
+        w['abandoned'] = False
+        start_worker_process(w)
+    return retry
+
+def report_result(worker_info: dict, results: list, result: tuple) -> None:
+    """收集一个节点的测试结论，并立即交给结果日志 (如果设置了回调)"""
+    results.append(result)
+    on_result = worker_info.get('on_result')
+    if on_result is not None:
+        on_result(result)
+
+def worker(proxy_names: list, worker_info: dict, args: argparse.Namespace) -> list[tuple[str, bool, int | None]]:
+    """
+    工作线程：等待分配给它的 mihomo 进程就绪后，测试该分片内的所有节点。
+    switch 模式下依次切换 GLOBAL 并测试；listener 模式下通过各节点专属的入站端口并发测试。
+    使用 api / group 延迟引擎时，先通过 mihomo 延迟接口批量完成阶段一，只对测通的节点做 TLS 握手测试。
+    """
+    if not ensure_worker_ready(worker_info, args):
+        abandon_worker(worker_info, len(proxy_names))
+        return []
+
+    results = []
+    latencies = {}
+    if args.latency_engine != 'http':
+        latencies = measure_latencies_via_api(proxy_names, worker_info, args)
+        for proxy_name in proxy_names:
+            if proxy_name not in latencies:
+                report_result(worker_info, results, (proxy_name, False, None))
+        proxy_names = [proxy_name for proxy_name in proxy_names if proxy_name in latencies]
+
+    if args.test_mode == 'listener':
+        node_ports = worker_info['node_ports']
+        with ThreadPoolExecutor(max_workers=args.listener_concurrency) as executor:
+            futures = {
+                executor.submit(probe_node, proxy_name, f"http://127.0.0.1:{node_ports[proxy_name]}", args, latencies.get(proxy_name)): proxy_name
+                for proxy_name in proxy_names
+            }
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logging.error(f"测试节点 {futures[future]} 时发生未知错误: {e}")
+                    result = (futures[future], False, None)
+                report_result(worker_info, results, result)
+        return results
+
+    for proxy_name in proxy_names:
+        try:
+            result = test_node_pipeline(proxy_name, worker_info, args, latencies.get(proxy_name))
+        except Exception as e:
+            logging.error(f"测试节点 {proxy_name} 时发生未知错误: {e}")
+            result = (proxy_name, False, None)
+        report_result(worker_info, results, result)
+    return results
+
+# --- asyncio 测试引擎 ---
+def _outcome_of(exc: BaseException) -> str:
+    """将探测异常映射为并发控制器使用的结果分类"""
+    if isinstance(exc, ProbeTimeout):
+        return OUTCOME_TIMEOUT
+    if is_local_pressure(exc):
+        return OUTCOME_LOCAL_ERROR
+    return OUTCOME_OK
+
+async def _limited(limiter: AimdLimiter, coro):
+    """在并发控制器的一个名额内执行探测，并把结果分类反馈给控制器"""
+    await limiter.acquire()
+    outcome = OUTCOME_OK
     try:
-        proxy_host_port = proxy_url.replace("http://", "")
-        cmd_openssl = [
-            "openssl", "s_client",
-            "-connect", f"{args.handshake_host}:{args.handshake_port}",
-            "-servername", args.handshake_host,
-            "-proxy", proxy_host_port
-        ]
-        result = subprocess.run(cmd_openssl, capture_output=True, text=True, timeout=args.handshake_timeout, check=False, encoding='utf-8', errors='ignore')
-        
-        if result.returncode == 0 and "Verify return code: 0 (ok)" in result.stdout:
-            logging.info(f"节点 {proxy_name}: ✅ TLS握手测试通过")
-            return proxy_name, True
+        return await coro
+    except ProbeError as e:
+        outcome = _outcome_of(e)
+        raise
+    finally:
+        limiter.release(outcome)
+
+async def async_measure_latency(proxy_name: str, port: int, args: argparse.Namespace, limiter: AimdLimiter) -> int | None:
+    """http 延迟引擎的异步版本：经节点专属入站端口请求测试 URL"""
+    try:
+        status, latency = await _limited(limiter, fetch_via_proxy('127.0.0.1', port, args.latency_test_url, args.latency_timeout))
+    except ProbeError as e:
+        logging.warning(f"节点 {proxy_name}: ❌ 延迟测试失败 (URL: {args.latency_test_url}, 阶段: {e.phase}, 原因: {e})")
+        return None
+    if status == 204 and latency < args.delay_limit:
+        logging.info(f"节点 {proxy_name}: ✅ 延迟测试通过 ({latency:.0f}ms)")
+        return round(latency)
+    logging.warning(f"节点 {proxy_name}: ❌ 延迟测试失败 (URL: {args.latency_test_url}, 状态码: {status}, 延迟: {latency:.0f}ms)")
+    return None
+
+async def _async_query_proxy_delay(proxy_name: str, worker_info: dict, args: argparse.Namespace, limiter: AimdLimiter) -> int | None:
+    """异步调用 mihomo 的 /proxies/{name}/delay 接口"""
+    try:
+        status, body = await _limited(limiter, controller_get(
+            worker_info['api_url'], f"/proxies/{quote(proxy_name, safe='')}/delay",
+            {'url': args.latency_test_url, 'timeout': args.delay_limit}, args.delay_limit / 1000 + 5
+        ))
+    except ProbeError as e:
+        logging.debug(f"节点 {proxy_name} 延迟接口请求异常: {e}")
+        return None
+    if status == 200 and isinstance(body, dict):
+        return body.get('delay')
+    logging.debug(f"节点 {proxy_name} 延迟接口返回 {status}: {body}")
+    return None
+
+async def async_measure_latencies_via_api(proxy_names: list, worker_info: dict, args: argparse.Namespace, limiter: AimdLimiter) -> dict:
+    """api / group 延迟引擎的异步版本，返回 {节点名: 延迟毫秒}，只包含测通的节点"""
+    if args.latency_engine == 'group':
+        measured = {}
+        try:
+            status, body = await controller_get(
+                worker_info['api_url'], "/group/GLOBAL/delay",
+                {'url': args.latency_test_url, 'timeout': args.delay_limit},
+                args.delay_limit / 1000 * (1 + len(proxy_names) / 50) + 5
+            )
+            if status == 200 and isinstance(body, dict):
+                measured = body
+            else:
+                logging.warning(f"工人 {worker_info['api_url']} 组延迟接口返回 {status}: {body}")
+        except ProbeError as e:
+            logging.warning(f"工人 {worker_info['api_url']} 组延迟接口请求异常: {e}")
+    else:
+        delays = await asyncio.gather(*(_async_query_proxy_delay(name, worker_info, args, limiter) for name in proxy_names))
+        measured = dict(zip(proxy_names, delays))
+
+    latencies = {}
+    for proxy_name in proxy_names:
+        delay = measured.get(proxy_name)
+        if isinstance(delay, int) and 0 < delay < args.delay_limit:
+            logging.info(f"节点 {proxy_name}: ✅ 延迟测试通过 ({delay}ms)")
+            latencies[proxy_name] = delay
         else:
-            logging.warning(f"节点 {proxy_name}: ❌ TLS握手测试失败")
-            logging.debug(f"节点 {proxy_name} OpenSSL 失败详情 - 返回码: {result.returncode}")
-            logging.debug(f"节点 {proxy_name} OpenSSL 失败详情 - STDOUT:\n{result.stdout}")
-            logging.debug(f"节点 {proxy_name} OpenSSL 失败详情 - STDERR:\n{result.stderr}")
-            return proxy_name, False
+            logging.warning(f"节点 {proxy_name}: ❌ 延迟测试失败 (URL: {args.latency_test_url}, 延迟接口结果: {delay})")
+    return latencies
 
+async def async_check_tls_handshake(proxy_name: str, port: int, args: argparse.Namespace, limiter: AimdLimiter) -> bool:
+    """TLS 握手测试的异步版本"""
+    try:
+        timings = await _limited(limiter, tls_handshake('127.0.0.1', port, args.handshake_host, args.handshake_port, args.handshake_timeout))
+    except ProbeError as e:
+        logging.warning(f"节点 {proxy_name}: ❌ TLS握手测试失败 (阶段: {e.phase}, 原因: {e})")
+        return False
+    logging.info(
+        f"节点 {proxy_name}: ✅ TLS握手测试通过 (连接 {timings['connect']:.0f}ms, "
+        f"CONNECT {timings['tunnel']:.0f}ms, 握手 {timings['handshake']:.0f}ms)"
+    )
+    return True
+
+async def async_probe_node(proxy_name: str, port: int, args: argparse.Namespace, limiter: AimdLimiter, latency: int | None = None) -> tuple[str, bool, int | None]:
+    """probe_node 的异步版本：经节点专属入站端口执行两阶段测试"""
+    try:
+        if latency is None:
+            latency = await async_measure_latency(proxy_name, port, args, limiter)
+            if latency is None:
+                return proxy_name, False, None
+        return proxy_name, await async_check_tls_handshake(proxy_name, port, args, limiter), latency
     except Exception as e:
         logging.error(f"测试节点 {proxy_name} 时发生未知错误: {e}")
-        return proxy_name, False
+        return proxy_name, False, None
+
+async def async_worker(proxy_names: list, worker_info: dict, args: argparse.Namespace, limiter: AimdLimiter) -> list[tuple[str, bool, int | None]]:
+    """worker 的异步版本：工人就绪后，分片内所有节点的探测共享全局并发控制器"""
+    if not await asyncio.to_thread(ensure_worker_ready, worker_info, args):
+        abandon_worker(worker_info, len(proxy_names))
+        return []
+
+    results = []
+    latencies = {}
+    if args.latency_engine != 'http':
+        latencies = await async_measure_latencies_via_api(proxy_names, worker_info, args, limiter)
+        for proxy_name in proxy_names:
+            if proxy_name not in latencies:
+                report_result(worker_info, results, (proxy_name, False, None))
+        proxy_names = [proxy_name for proxy_name in proxy_names if proxy_name in latencies]
+
+    node_ports = worker_info['node_ports']
+    for completed in asyncio.as_completed([
+        async_probe_node(proxy_name, node_ports[proxy_name], args, limiter, latencies.get(proxy_name))
+        for proxy_name in proxy_names
+    ]):
+        report_result(worker_info, results, await completed)
+    return results
+
+def _raise_open_file_limit() -> None:
+    """将打开文件数的软限制提升到硬限制，为大量并发连接留出余量 (不支持的平台忽略)"""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if hard == resource.RLIM_INFINITY or hard > soft:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
 
-def worker(proxy_name: str, worker_queue: Queue, args: argparse.Namespace) -> tuple[str, bool]:
+async def run_async_tests(shards: list, worker_infos: list, args: argparse.Namespace) -> list[tuple[str, bool, int | None]]:
     """
-    工作线程的包装器，负责从队列获取一个 Clash 进程工人并执行测试。
+    在单个事件循环中驱动所有工人的探测，全局并发由 AIMD 控制器根据超时率和本机压力动态调整。
     """
-    worker_info = None
+    _raise_open_file_limit()
+    # 在开始探测前创建共享的 SSL 上下文，加载 CA 证书的开销不落在探测期间的事件循环上
+    handshake_context()
+    https_context()
+    limiter = AimdLimiter(
+        args.initial_concurrency, args.min_concurrency, args.max_concurrency,
+        logger=logging.getLogger(__name__)
+    )
+    limiter.start()
     try:
-        worker_info = worker_queue.get()
-        return test_node_pipeline(proxy_name, worker_info, args)
+        shard_results = await asyncio.gather(*(
+            async_worker([p.name for p in shard], worker_info, args, limiter)
+            for shard, worker_info in zip(shards, worker_infos)
+        ))
     finally:
-        if worker_info:
-            worker_queue.put(worker_info)
+        await limiter.stop()
+    logging.info(
+        f"自适应并发: 最终上限 {limiter.limit}, 最高 {limiter.peak_limit}, 最低 {limiter.lowest_limit} "
+        f"(范围 {limiter.minimum}-{limiter.maximum})"
+    )
+    return [result for results in shard_results for result in results]
+
+def run_threaded_tests(shards: list, worker_infos: list, args: argparse.Namespace) -> list[tuple[str, bool, int | None]]:
+    """每个工人一个线程，各自测试分配给它的分片"""
+    results = []
+    with ThreadPoolExecutor(max_workers=len(worker_infos)) as executor:
+        futures = [
+            executor.submit(worker, [p.name for p in shard], worker_info, args)
+            for shard, worker_info in zip(shards, worker_infos)
+        ]
+        for future in as_completed(futures):
+            try:
+                results.extend(future.result())
+            except Exception as e:
+                logging.error(f"一个测试任务在主线程中出现异常: {e}")
+    return results
+
+def run_tests(shards: list, worker_infos: list, args: argparse.Namespace) -> list[tuple[str, bool, int | None]]:
+    """按所选引擎测试各工人的分片"""
+    if args.engine == 'asyncio':
+        return asyncio.run(run_async_tests(shards, worker_infos, args))
+    return run_threaded_tests(shards, worker_infos, args)
+
+# --- 健康历史 ---
+def open_history(args: argparse.Namespace) -> HealthHistory | None:
+    """打开节点健康历史；禁用或打开失败时返回 None"""
+    if args.no_history:
+        return None
+    try:
+        return HealthHistory(
+            args.history_file, max_samples=HistoryConfig.MAX_SAMPLES, dead_threshold=HistoryConfig.DEAD_THRESHOLD,
+            backoff_base=HistoryConfig.BACKOFF_BASE, backoff_max=HistoryConfig.BACKOFF_MAX,
+            ttl=HistoryConfig.TTL, max_entries=HistoryConfig.MAX_ENTRIES
+        )
+    except Exception as e:
+        logging.warning(f"无法打开健康历史 {args.history_file}，将按输入顺序测试全部节点: {e}")
+        return None
+
+def plan_with_history(all_proxies: list, args: argparse.Namespace) -> list:
+    """按健康历史安排测试顺序，并跳过仍在退避期内的长期失效节点"""
+    history = open_history(args)
+    if history is None:
+        return all_proxies
+    try:
+        ordered, skipped = history.plan(all_proxies)
+    finally:
+        history.close()
+    logging.info(f"已按健康历史排序待测节点，跳过 {len(skipped)} 个仍在退避期内的长期失效节点。")
+    return ordered
+
+def record_history(results: list, proxies_map: dict, args: argparse.Namespace) -> None:
+    """将本轮测试结果写入健康历史 (失败阶段: 没有测得延迟记为 latency，否则记为 handshake)"""
+    history = open_history(args)
+    if history is None:
+        return
+    backoff = []
+    try:
+        backoff = history.record([
+            (proxies_map[name], is_healthy, latency,
+             None if is_healthy else ('handshake' if latency is not None else 'latency'))
+            for name, is_healthy, latency in results if name in proxies_map
+        ])
+        logging.info(f"已将 {len(results)} 个节点的测试结果写入健康历史 ({len(history)} 条记录)。")
+    except Exception as e:
+        logging.warning(f"写入健康历史失败: {e}")
+    finally:
+        history.close()
+    record_dead(backoff, args)
+
+def record_dead(backoff: list, args: argparse.Namespace) -> None:
+    """将处于退避期的长期失效节点写入去重索引 (有效期到下次复测时间)，退避期内的合并直接跳过它们"""
+    if not backoff:
+        return
+    seen_index = open_seen_index(None if args.no_seen_index else args.seen_index_file, logging)
+    if seen_index is None:
+        return
+    try:
+        now = time.time()
+        seen_index.reject(STAGE_TEST, {dedupe_key(proxy): next_check - now for proxy, next_check in backoff})
+        logging.info(f"已将 {len(backoff)} 个长期失效节点写入去重索引，退避期内不再解析、验证和测试。")
+    except Exception as e:
+        logging.warning(f"写入去重索引失败: {e}")
+    finally:
+        seen_index.close()
+
+# --- 结果日志 ---
+def load_decided(journal_file: str) -> dict:
+    """读取结果日志中已有结论的节点，返回 {节点指纹: 日志记录}"""
+    try:
+        return ResultJournal.load(journal_file, 'fp')
+    except OSError as e:
+        logging.warning(f"无法读取结果日志 {journal_file}，将重新测试全部节点: {e}")
+        return {}
+
+def compact_journal(journal_file: str, input_proxies: list, fingerprints: dict, output_file: str = None) -> list:
+    """
+    由结果日志汇总出健康节点：按输入顺序返回日志中判定为健康的节点 (Node)，并写入其延迟；
+    指定 output_file 时同时写出健康节点文件。
+    """
+    decided = load_decided(journal_file)
+    healthy_proxies = []
+    for proxy in input_proxies:
+        record = decided.get(fingerprints[proxy.name])
+        if record and record.get('ok'):
+            proxy.delay = record.get('delay')
+            healthy_proxies.append(proxy)
+    if not healthy_proxies:
+        logging.warning("测试完成，没有找到任何健康节点。")
+        return healthy_proxies
+    if not output_file:
+        logging.info(f"测试完成！共找到 {len(healthy_proxies)} 个健康节点 (由结果日志汇总)。")
+        return healthy_proxies
+    # 先写临时文件再替换，避免中断时留下不完整的输出
+    temp_file = f"{output_file}.tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        dump_yaml({'proxies': as_dicts(healthy_proxies)}, f, allow_unicode=True)
+    os.replace(temp_file, output_file)
+    logging.info(f"测试完成！共找到 {len(healthy_proxies)} 个健康节点，已由结果日志汇总写入 {output_file}")
+    return healthy_proxies
+
+def create_api_session(pool_size: int) -> requests.Session:
+    """创建访问 mihomo API 的连接池会话 (延迟接口与 GLOBAL 切换共用)"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, 1))
+    session.mount('http://', adapter)
+    session.trust_env = False
+    return session
+
+def read_rss_mb(pid: int) -> float | None:
+    """读取进程的常驻内存 (MB)，仅支持提供 /proc 的系统，读取失败时返回 None"""
+    try:
+        with open(f"/proc/{pid}/status", 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+def log_worker_rss(worker_infos: list) -> None:
+    """汇总输出所有仍在运行的 mihomo 工作进程的内存占用"""
+    pids = [w['process'].pid for w in worker_infos if w['process'].poll() is None]
+    rss_values = [rss for rss in (read_rss_mb(pid) for pid in pids) if rss is not None]
+    if not rss_values:
+        logging.info("无法读取工作进程的内存占用 (当前系统不支持 /proc)。")
+        return
+    logging.info(
+        f"工作进程内存占用 (RSS): 平均 {sum(rss_values) / len(rss_values):.1f} MB, "
+        f"最大 {max(rss_values):.1f} MB, 合计 {sum(rss_values):.1f} MB"
+    )
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """解析 --shard 参数 'i/N' (0 <= i < N)"""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"分片格式应为 i/N，例如 0/4: {value!r}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"分片序号必须满足 0 <= i < N: {value!r}")
+    return index, count
 
 # --- 主函数 ---
-def main():
-    # --- 参数解析 ---
+def build_parser() -> argparse.ArgumentParser:
+    """构建测试器的命令行参数解析器 (进程内流水线复用其默认值与参数)"""
     parser = argparse.ArgumentParser(description="对 Clash/Mihomo 节点进行两阶段健康度测试。")
     parser.add_argument('--input-file', type=str, default=os.environ.get("ALL_PROXIES_FILE", "all_proxies.yaml"), help='包含所有节点的输入 YAML 文件路径')
     parser.add_argument('--output-file', type=str, default=os.environ.get("HEALTHY_PROXIES_FILE", "healthy_proxies.yaml"), help='用于保存健康节点的输出 YAML 文件路径')
@@ -101,41 +667,89 @@ def main():
     parser.add_argument('--handshake-host', type=str, default=os.environ.get("HANDSHAKE_TEST_HOST", "cloudcode-pa.googleapis.com"), help='TLS 握手测试的目标主机')
     parser.add_argument('--handshake-port', type=int, default=443, help='TLS 握手测试的目标端口')
     parser.add_argument('--handshake-timeout', type=int, default=8, help='TLS 握手测试的超时时间 (秒)')
+    parser.add_argument('--startup-timeout', type=float, default=float(os.environ.get("WORKER_STARTUP_TIMEOUT", 15)), help='等待单个 mihomo 工作进程 API 就绪的超时时间 (秒)')
+    parser.add_argument('--startup-retries', type=int, default=int(os.environ.get("WORKER_STARTUP_RETRIES", 1)), help='工作进程未能就绪时的重启次数，用尽后放弃该进程')
+    parser.add_argument('--test-mode', type=str, choices=['switch', 'listener'], default=os.environ.get("TEST_MODE", "switch"), help='switch: 通过 API 切换 GLOBAL 逐个测试; listener: 为每个节点开设专属入站端口并发测试')
+    parser.add_argument('--listener-base-port', type=int, default=int(os.environ.get("LISTENER_BASE_PORT", 20000)), help='listener 模式下各节点专属入站端口的起始端口号')
+    parser.add_argument('--listener-concurrency', type=int, default=int(os.environ.get("LISTENER_CONCURRENCY", 16)), help='listener 模式下每个工作进程同时测试的节点数')
+    parser.add_argument('--latency-engine', type=str, choices=['http', 'api', 'group'], default=os.environ.get("LATENCY_ENGINE", "http"), help='http: 经本地代理请求测试 URL; api: 并发调用 /proxies/{name}/delay; group: 每个工作进程调用一次 /group/GLOBAL/delay')
+    parser.add_argument('--engine', type=str, choices=['thread', 'asyncio'], default=os.environ.get("TEST_ENGINE", "thread"), help='thread: 每个工作进程一个线程; asyncio: 单个事件循环驱动少量 mihomo 实例上的全部探测 (总是使用 listener 模式)')
+    parser.add_argument('--instances', type=int, default=int(os.environ.get("MIHOMO_INSTANCES", os.cpu_count() or 1)), help='asyncio 引擎启动的 mihomo 实例数 (默认等于 CPU 核心数)')
+    parser.add_argument('--initial-concurrency', type=int, default=int(os.environ.get("INITIAL_CONCURRENCY", 64)), help='asyncio 引擎的初始并发探测数')
+    parser.add_argument('--min-concurrency', type=int, default=int(os.environ.get("MIN_CONCURRENCY", 8)), help='asyncio 引擎的最小并发探测数')
+    parser.add_argument('--max-concurrency', type=int, default=int(os.environ.get("MAX_CONCURRENCY", 2048)), help='asyncio 引擎的最大并发探测数')
+    parser.add_argument('--history-file', type=str, default=HistoryConfig.FILE, help='节点健康历史数据库路径，用于安排测试顺序与退避复测长期失效节点')
+    parser.add_argument('--no-history', action='store_true', help='不读取也不写入健康历史，按输入顺序测试全部节点')
+    parser.add_argument('--seen-index-file', type=str, default=SeenIndexConfig.FILE, help='跨运行去重索引路径，进入退避期的长期失效节点会写入其中，下次合并时直接跳过')
+    parser.add_argument('--no-seen-index', action='store_true', help='不把长期失效节点写入去重索引')
+    parser.add_argument('--journal-file', type=str, default=os.environ.get("RESULT_JOURNAL_FILE"), help='逐个追加节点测试结论的 JSONL 结果日志路径 (默认: <输出文件>.journal.jsonl)')
+    parser.add_argument('--resume', action='store_true', help='保留结果日志中已有结论的节点，只测试其余节点 (用于中断后续跑)')
+    parser.add_argument('--shard', type=parse_shard, default=os.environ.get("TEST_SHARD"), help='只测试第 i 个分片 (格式 i/N，按节点指纹哈希确定性划分)，各分片的输出可用 merge_test_results.py 合并')
     parser.add_argument('--base-port', type=int, default=int(os.environ.get("BASE_HTTP_PORT", 9100)), help='用于并行测试的起始端口号')
-    args = parser.parse_args()
+    return parser
 
-    logging.info(f"开始执行两阶段并行测试 (多进程复用模型)... 输入: {args.input_file}, 输出: {args.output_file}")
-    logging.info(f"将启动 {args.max_workers} 个常驻 mihomo 工作进程进行测试。")
+def run_node_tests(all_proxies: list, args: argparse.Namespace) -> list:
+    """
+    测试一组节点 (dict 或 Node) 并返回健康节点 (Node，按输入顺序，带 `_delay` 延迟)。
+    args.output_file 不为空时同时写出健康节点文件；结果日志总是写出，用于中断后续跑。
+    """
+    if args.engine == 'asyncio':
+        if args.test_mode != 'listener':
+            logging.info("asyncio 引擎依赖每个节点的专属入站端口，已切换到 listener 测试模式。")
+        args.test_mode = 'listener'
+        max_workers = args.instances
+    else:
+        max_workers = args.max_workers
 
-    # --- 准备工作 ---
-    try:
-        with open(args.input_file, 'r', encoding='utf-8') as f:
-            all_proxies_data = yaml.safe_load(f)
-        proxy_names = [p['name'] for p in all_proxies_data['proxies']]
-        logging.info(f"共找到 {len(proxy_names)} 个待测试节点")
-    except FileNotFoundError:
-        logging.fatal(f"错误: 输入文件未找到于 '{args.input_file}'。")
-        return
-    except Exception as e:
-        logging.fatal(f"读取节点文件 {args.input_file} 失败: {e}")
-        return
+    logging.info(f"将启动至多 {max_workers} 个常驻 mihomo 工作进程，每个进程只加载并测试分配给它的节点 (测试模式: {args.test_mode}, 延迟引擎: {args.latency_engine})。")
+
+    all_proxies = as_nodes(all_proxies)
+    fingerprints = {p.name: p.fingerprint for p in all_proxies}
+    if args.shard:
+        shard_index, shard_count = args.shard
+        all_proxies = [p for p in all_proxies if fingerprint_shard(fingerprints[p.name], shard_count) == shard_index]
+        logging.info(f"分片 {shard_index}/{shard_count}: 本分片负责 {len(all_proxies)} 个节点")
+    input_proxies = all_proxies
+    journal_file = args.journal_file or f"{args.output_file or PathConfig.HEALTHY_NODES_FILE}.journal.jsonl"
+    if args.resume:
+        decided = load_decided(journal_file)
+        all_proxies = [p for p in all_proxies if fingerprints[p.name] not in decided]
+        logging.info(f"续跑: 结果日志 {journal_file} 中已有 {len(input_proxies) - len(all_proxies)} 个节点的结论，剩余 {len(all_proxies)} 个待测试。")
+
+    all_proxies = plan_with_history(all_proxies, args)
+    if not all_proxies:
+        logging.warning("没有待测试的节点。")
+        if args.resume:
+            return compact_journal(journal_file, input_proxies, fingerprints, args.output_file)
+        return []
+
+    # 将节点轮流分配到各个工作进程，每个 mihomo 只加载自己负责测试的节点
+    num_workers = min(max_workers, len(all_proxies))
+    shards = [all_proxies[i::num_workers] for i in range(num_workers)]
+
+    if args.test_mode == 'listener' and args.listener_base_port + len(all_proxies) > 65536:
+        logging.fatal(f"listener 模式需要 {len(all_proxies)} 个端口，从 {args.listener_base_port} 起超出了可用范围。")
+        return []
 
     # --- 启动常驻的 mihomo 进程池 ---
-    worker_processes = []
-    worker_queue = Queue()
-    temp_base_dir = f"./temp_test_data_{int(time.time())}"
-    os.makedirs(temp_base_dir, exist_ok=True)
+    worker_infos = []
+    journal = ResultJournal(
+        journal_file, resume=args.resume,
+        fsync_records=NodeTestConfig.JOURNAL_FSYNC_RECORDS, fsync_interval=NodeTestConfig.JOURNAL_FSYNC_INTERVAL
+    )
+
+    def journal_result(result: tuple) -> None:
+        name, is_healthy, latency = result
+        journal.append({'fp': fingerprints[name], 'name': name, 'ok': is_healthy, 'delay': latency})
+    # 每次运行使用独立的临时目录，同一秒内启动的多个分片进程也不会互相覆盖或删除对方的文件
+    temp_base_dir = tempfile.mkdtemp(prefix='temp_test_data_')
 
     try:
-        for i in range(args.max_workers):
+        startup_begin = time.perf_counter()
+        for i, shard in enumerate(shards):
             http_port = args.base_port + i * 2
             api_port = args.base_port + i * 2 + 1
             
-            worker_info = {
-                'proxy_url': f'http://127.0.0.1:{http_port}',
-                'api_url': f'http://127.0.0.1:{api_port}'
-            }
-
             temp_config_path = os.path.join(temp_base_dir, f"config_worker_{i}.yaml")
             temp_mihomo_data_dir = os.path.join(temp_base_dir, f"data_worker_{i}")
             os.makedirs(temp_mihomo_data_dir, exist_ok=True)
@@ -145,53 +759,104 @@ def main():
                 'allow-lan': False, 'mode': 'rule', 'log-level': 'silent',
                 'external-controller': f'127.0.0.1:{api_port}',
                 'dns': {'enable': True, 'listen': '0.0.0.0:53', 'nameserver': ['8.8.8.8', '1.1.1.1'], 'fallback': []},
-                'proxies': all_proxies_data['proxies'],
-                'proxy-groups': [{'name': 'GLOBAL', 'type': 'select', 'proxies': [p['name'] for p in all_proxies_data['proxies']] if all_proxies_data.get('proxies') else []}],
+                'proxies': as_dicts(shard),
+                'proxy-groups': [{'name': 'GLOBAL', 'type': 'select', 'proxies': [p.name for p in shard]}],
                 'rules': ['MATCH,GLOBAL']
             }
+            node_ports = {}
+            if args.test_mode == 'listener':
+                # 节点 j 在分片 i 中的全局序号为 j * num_workers + i，以此分配互不冲突的端口
+                node_ports = {p.name: args.listener_base_port + j * num_workers + i for j, p in enumerate(shard)}
+                base_config['listeners'] = [
+                    {'name': f"node-{port}", 'type': 'mixed', 'listen': '127.0.0.1', 'port': port, 'proxy': name}
+                    for name, port in node_ports.items()
+                ]
             with open(temp_config_path, 'w', encoding='utf-8') as f:
-                yaml.dump(base_config, f, allow_unicode=True)
+                dump_yaml(base_config, f, allow_unicode=True)
 
-            cmd_mihomo = [args.clash_path, "-f", temp_config_path, "-d", temp_mihomo_data_dir]
-            process = subprocess.Popen(cmd_mihomo, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            worker_processes.append(process)
-            worker_queue.put(worker_info)
+            worker_info = {
+                'proxy_url': f'http://127.0.0.1:{http_port}',
+                'api_url': f'http://127.0.0.1:{api_port}',
+                'cmd': [args.clash_path, "-f", temp_config_path, "-d", temp_mihomo_data_dir],
+                'process': None,
+                'ready_at': None,
+                'abandoned': False,
+                'node_ports': node_ports,
+                'session': create_api_session(args.listener_concurrency),
+                'on_result': journal_result
+            }
+            start_worker_process(worker_info)
+            worker_infos.append(worker_info)
 
-        logging.info(f"已成功启动 {len(worker_processes)} 个 mihomo 工作进程。等待 3 秒以确保服务就绪...")
-        time.sleep(3)
+        logging.info(
+            f"已启动 {len(worker_infos)} 个 mihomo 工作进程 (每个约 {len(shards[0])} 个节点)，"
+            f"写出配置并启动耗时 {time.perf_counter() - startup_begin:.2f}s。各进程就绪后立即开始测试..."
+        )
 
         # --- 执行并行测试 ---
-        healthy_proxies = []
-        with ThreadPoolExecutor(max_workers=args.max_workers) as executor:
-            futures = [executor.submit(worker, name, worker_queue, args) for name in proxy_names]
-            for future in as_completed(futures):
-                try:
-                    p_name, is_healthy = future.result()
-                    if is_healthy:
-                        healthy_proxies.append({"name": p_name})
-                except Exception as e:
-                    logging.error(f"一个测试任务在主线程中出现异常: {e}")
-
-        if healthy_proxies:
-            original_proxies_map = {p['name']: p for p in all_proxies_data['proxies']}
-            final_healthy_proxies_data = [original_proxies_map[p['name']] for p in healthy_proxies if p['name'] in original_proxies_map]
-            output_data = {'proxies': final_healthy_proxies_data}
-            with open(args.output_file, 'w', encoding='utf-8') as f:
-                yaml.dump(output_data, f, allow_unicode=True)
-            logging.info(f"测试完成！共找到 {len(final_healthy_proxies_data)} 个健康节点，已写入 {args.output_file}")
-        else:
-            logging.warning("测试完成，没有找到任何健康节点。")
+        test_begin = time.perf_counter()
+        results = run_tests(shards, worker_infos, args)
+        log_worker_rss(worker_infos)
+        retry = restart_abandoned(shards, worker_infos)
+        if retry:
+            results.extend(run_tests([shard for shard, _ in retry], [w for _, w in retry], args))
+
+        test_elapsed = time.perf_counter() - test_begin
+        logging.info(
+            f"共测试 {len(results)} 个节点 ({args.engine} 引擎, 测试模式: {args.test_mode}, 延迟引擎: {args.latency_engine})，耗时 {test_elapsed:.2f}s，"
+            f"吞吐量 {len(all_proxies) / test_elapsed:.2f} 节点/s"
+        )
+
+        ready_times = sorted(w['ready_at'] - startup_begin for w in worker_infos if w['ready_at'] is not None)
+        if ready_times:
+            logging.info(
+                f"{len(ready_times)}/{len(worker_infos)} 个工作进程就绪: "
+                f"首个耗时 {ready_times[0]:.2f}s, 最后一个耗时 {ready_times[-1]:.2f}s"
+            )
+
+        # 替补进程也未能就绪的分片没有被测试，不写入结果日志和健康历史，--resume 续跑时会重新测试
+        untested = sum(len(shard) for shard, w in zip(shards, worker_infos) if w['abandoned'])
+        if untested:
+            logging.error(f"{untested} 个节点所在的工作进程 (含替补进程) 始终未能就绪，本轮未被测试，可使用 --resume 续跑。")
+
+        original_proxies_map = {p.name: p for p in all_proxies}
+        record_history(results, original_proxies_map, args)
+
+        journal.close()
+        return compact_journal(journal_file, input_proxies, fingerprints, args.output_file)
 
     finally:
+        journal.close()
         # --- 确保清理所有常驻进程和临时文件 ---
         logging.info("开始清理和关闭所有 mihomo 工作进程...")
-        for p in worker_processes:
-            p.terminate()
-            p.wait()
-        logging.info(f"{len(worker_processes)} 个工作进程已关闭。")
+        for worker_info in worker_infos:
+            stop_worker_process(worker_info)
+            worker_info['session'].close()
+        logging.info(f"{len(worker_infos)} 个工作进程已关闭。")
         if os.path.exists(temp_base_dir):
             shutil.rmtree(temp_base_dir)
             logging.info(f"已清理临时目录: {temp_base_dir}")
 
+def main():
+    # --- 参数解析 ---
+    args = build_parser().parse_args()
+
+    logging.info(f"开始执行两阶段并行测试 (多进程复用模型, {args.engine} 引擎)... 输入: {args.input_file}, 输出: {args.output_file}")
+
+    # --- 准备工作 ---
+    try:
+        with open(args.input_file, 'r', encoding='utf-8') as f:
+            all_proxies_data = load_yaml(f)
+        all_proxies = as_nodes(all_proxies_data.pop('proxies', None) or [])
+        logging.info(f"共找到 {len(all_proxies)} 个待测试节点")
+    except FileNotFoundError:
+        logging.fatal(f"错误: 输入文件未找到于 '{args.input_file}'。")
+        return
+    except Exception as e:
+        logging.fatal(f"读取节点文件 {args.input_file} 失败: {e}")
+        return
+
+    run_node_tests(all_proxies, args)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Clash Config Auto Builder - 端到端流水线
+在一个进程内依次执行 合并 -> 连通性预筛 -> 格式验证 -> 延迟测试 -> 配置生成，
+各阶段之间直接传递节点列表，只在调试时 (--dump-dir) 写出中间文件。
+未被本脚本识别的参数原样交给节点测试器 (node_tester_integrated.py) 解析。
+"""
+
+import argparse
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.constants import (
+    FILTER_PATTERNS, HistoryConfig, PathConfig, ProviderConfig, SeenIndexConfig, SubscriptionConfig, ValidationConfig
+)
+from core.logger import setup_logger
+from core.pipeline import Pipeline
+from generate_config import ConfigGenerator, parse_precompress
+from merge_proxies import collect_proxies
+from node_tester_integrated import build_parser as build_tester_parser, run_node_tests
+from prefilter_proxies import filter_reachable
+from validate_proxies import ProxyValidator, find_mihomo_executable
+
+
+def build_pipeline(args: argparse.Namespace, tester_args: argparse.Namespace, validator: ProxyValidator,
+                   generator: ConfigGenerator) -> Pipeline:
+    """按命令行参数组装各阶段"""
+    pipeline = Pipeline(args.dump_dir)
+    seen_index_file = None if args.no_seen_index else args.seen_index_file
+    parse_cache_file = None if args.no_parse_cache else SubscriptionConfig.PARSE_CACHE_FILE
+    pipeline.add_stage('merge', lambda _: collect_proxies(args.proxies_dir, args.filter, args.parse_workers,
+                                                          seen_index_file, parse_cache_file))
+    if not args.skip_prefilter:
+        pipeline.add_stage('prefilter', filter_reachable)
+    pipeline.add_stage('validate', validator.filter_valid)
+    pipeline.add_stage('test', lambda nodes: run_node_tests(nodes, tester_args))
+
+    def generate(nodes: list) -> list:
+        generator.generate(nodes, args.rank_by, args.history_file)
+        return nodes
+    pipeline.add_stage('generate', generate)
+    return pipeline
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description="在一个进程内完成合并、预筛、验证、测试与配置生成，阶段之间不写中间文件。",
+        epilog="其余参数 (如 --max-workers、--engine、--delay-limit) 原样传给节点测试器。",
+        allow_abbrev=False
+    )
+    parser.add_argument('--proxies-dir', type=str, default=PathConfig.PROXY_DIR, help='存放订阅文件的目录')
+    parser.add_argument('--filter', type=str, choices=list(FILTER_PATTERNS.keys()), help='合并时只保留名称匹配该地区的节点')
+    parser.add_argument('--parse-workers', type=int, default=os.cpu_count() or 1, help='并行解析订阅文件的进程数')
+    parser.add_argument('--no-parse-cache', action='store_true', help='不使用解析缓存，重新解析全部订阅文件')
+    parser.add_argument('--mihomo-path', type=str, default=None, help='mihomo 可执行文件路径，默认自动查找 (同时用于验证和测试)')
+    parser.add_argument('--skip-prefilter', action='store_true', help='跳过连通性预筛')
+    parser.add_argument('--no-validation-cache', action='store_true', help='禁用验证结果缓存')
+    parser.add_argument('--seen-index-file', type=str, default=SeenIndexConfig.FILE, help='跨运行去重索引路径 (合并、验证与测试共用)，跳过上次已被淘汰的节点')
+    parser.add_argument('--no-seen-index', action='store_true', help='不读取也不写入去重索引，处理全部节点')
+    parser.add_argument('--healthy-output', type=str, default=os.environ.get("HEALTHY_PROXIES_FILE"), help='额外写出健康节点文件 (与测试器的 --output-file 格式相同)，默认不写出')
+    parser.add_argument('--dump-dir', type=str, default=os.environ.get("PIPELINE_DUMP_DIR"), help='调试用：把每个阶段的结果写出到该目录')
+    parser.add_argument('--rank-by', type=str, choices=['latency', 'stability'], default='latency', help='节点排序方式')
+    parser.add_argument('--history-file', type=str, default=HistoryConfig.FILE, help='节点健康历史数据库路径 (测试与排序共用)')
+    parser.add_argument('--render-workers', type=int, default=int(os.environ.get("RENDER_WORKERS", os.cpu_count() or 1)), help='并行序列化节点的进程数')
+    parser.add_argument('--output-format', type=str, choices=['inline', 'provider'], default=ProviderConfig.OUTPUT_FORMAT, help='配置文件输出格式')
+    parser.add_argument('--precompress', type=parse_precompress, default=ProviderConfig.PRECOMPRESS, help='额外写出的预压缩副本，逗号分隔 (gz, br)')
+    args, remaining = parser.parse_known_args()
+    tester_args = build_tester_parser().parse_args(remaining)
+
+    logger = setup_logger("run_pipeline")
+    mihomo_path = args.mihomo_path or find_mihomo_executable()
+    if not mihomo_path:
+        logger.error("未找到 'mihomo' 可执行文件，请使用 --mihomo-path 指定。")
+        sys.exit(1)
+    tester_args.clash_path = mihomo_path
+    tester_args.history_file = args.history_file
+    tester_args.output_file = args.healthy_output
+    tester_args.seen_index_file = args.seen_index_file
+    tester_args.no_seen_index = args.no_seen_index
+
+    validator = ProxyValidator(
+        mihomo_path=mihomo_path,
+        cache_file=None if args.no_validation_cache else ValidationConfig.CACHE_FILE,
+        seen_index_file=None if args.no_seen_index else args.seen_index_file
+    )
+    generator = ConfigGenerator(args.render_workers, args.output_format, args.precompress)
+    try:
+        nodes = build_pipeline(args, tester_args, validator, generator).run()
+    finally:
+        validator.close()
+
+    if not nodes:
+        sys.exit(1)
+    logger.info("🎉 所有任务已成功完成！")
+
+
+if __name__ == "__main__":
+    main()
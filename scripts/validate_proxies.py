@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 """
 Clash Config Auto Builder - 代理节点格式验证与过滤器
-使用 mihomo -t 命令逐个验证代理节点的格式，并过滤掉无效节点。
+使用 mihomo -t 命令批量验证代理节点的格式 (失败批次二分定位)，并过滤掉无效节点。
 """
 
 import yaml
@@ -9,27 +9,104 @@ import subprocess
 import sys
 import os
 import argparse
+import hashlib
 import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # 将项目根目录添加到Python路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from core.cache import PersistentCache
+from core.constants import SeenIndexConfig, ValidationConfig
+from core.fingerprint import dedupe_key, proxy_fingerprint
 from core.logger import setup_logger
+from core.node import as_dicts, as_nodes
+from core.seen_index import STAGE_VALIDATE, open_seen_index
+from core.yaml_io import dump_yaml, load_yaml
 
 class ProxyValidator:
     """
     代理节点格式验证与过滤器
     """
 
-    def __init__(self, mihomo_path: str):
+    def __init__(self, mihomo_path: str, batch_size: int = None, max_jobs: int = None, cache_file: str = None,
+                 seen_index_file: str = None):
         self.logger = setup_logger("proxy_validator")
         self.mihomo_path = mihomo_path
+        self.batch_size = max(1, batch_size or ValidationConfig.BATCH_SIZE)
+        self.max_jobs = max(1, max_jobs or ValidationConfig.MAX_JOBS)
         self.invalid_proxies = []
         self.valid_proxies = []
+        self.cache = None
+        self.mihomo_version = None
+        self.seen_index_file = seen_index_file
+        if cache_file:
+            self._open_cache(cache_file)
 
-    def _create_temp_config(self, proxy: dict) -> str:
+    def _open_cache(self, cache_file: str) -> None:
         """
-        为单个代理节点创建一个临时的最小化配置文件。
+        打开验证结果缓存。缓存键包含 mihomo 版本，升级内核后旧结果自动失效。
+        """
+        try:
+            result = subprocess.run(
+                [self.mihomo_path, '-v'], check=True, capture_output=True, text=True, encoding='utf-8'
+            )
+            self.mihomo_version = result.stdout.strip().splitlines()[0]
+            self.cache = PersistentCache(
+                cache_file, ttl=ValidationConfig.CACHE_TTL, max_entries=ValidationConfig.CACHE_MAX_ENTRIES
+            )
+            self.logger.info(f"已启用验证缓存: {cache_file} ({len(self.cache)} 条记录, 内核: {self.mihomo_version})")
+        except Exception as e:
+            self.logger.warning(f"无法启用验证缓存，将验证全部节点: {e}")
+            self.cache = None
+
+    def close(self) -> None:
+        """关闭验证缓存 (同时执行过期与容量淘汰)"""
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+
+    def _cache_key(self, proxy: dict) -> str:
+        """缓存键：mihomo 版本 + 与名称无关的节点指纹"""
+        return hashlib.sha256(f"{self.mihomo_version}\0{proxy_fingerprint(proxy)}".encode('utf-8')).hexdigest()
+
+    def _lookup_cached(self, proxies: list) -> dict:
+        """查询缓存，返回 {节点下标: (is_valid, error_message)}"""
+        if self.cache is None:
+            return {}
+        keys = [self._cache_key(proxy) for proxy in proxies]
+        cached = self.cache.get_many(keys)
+        return {i: tuple(cached[key]) for i, key in enumerate(keys) if key in cached}
+
+    def _store_cached(self, results: list) -> None:
+        """将新验证的结果写入缓存，意外错误 (is_valid 为 None) 不缓存"""
+        if self.cache is None:
+            return
+        self.cache.set_many({
+            self._cache_key(proxy): [is_valid, error_message]
+            for proxy, is_valid, error_message in results if is_valid is not None
+        })
+
+    def _record_rejected(self) -> None:
+        """将本轮格式无效的节点写入去重索引，下次合并时直接跳过"""
+        if not self.invalid_proxies:
+            return
+        seen_index = open_seen_index(self.seen_index_file, self.logger)
+        if seen_index is None:
+            return
+        try:
+            seen_index.reject(STAGE_VALIDATE, {
+                dedupe_key(item['proxy_config']): SeenIndexConfig.VALIDATE_TTL for item in self.invalid_proxies
+            })
+            self.logger.info(f"已将 {len(self.invalid_proxies)} 个格式无效的节点写入去重索引。")
+        except Exception as e:
+            self.logger.warning(f"写入去重索引失败: {e}")
+        finally:
+            seen_index.close()
+
+    def _create_temp_config(self, proxies: list) -> str:
+        """
+        为一组代理节点创建一个临时的最小化配置文件。
         """
         minimal_config = {
             'port': 7890,
@@ -37,23 +114,22 @@ class ProxyValidator:
             'allow-lan': False,
             'mode': 'rule',
             'log-level': 'info',
-            'proxies': [proxy]
+            'proxies': as_dicts(proxies)
         }
         
         fd, temp_path = tempfile.mkstemp(suffix=".yaml", text=True)
         with os.fdopen(fd, 'w', encoding='utf-8') as f:
-            yaml.dump(minimal_config, f, allow_unicode=True)
+            dump_yaml(minimal_config, f, allow_unicode=True)
             
         return temp_path
 
-    def validate_single_proxy(self, proxy: dict) -> bool:
+    def _run_mihomo_check(self, proxies: list) -> tuple:
         """
-        使用 mihomo -t 验证单个代理节点的配置。
-        如果有效，则将其添加到 self.valid_proxies 列表中。
+        对一组节点执行一次 mihomo -t，返回 (是否通过, 错误信息)。
         """
         temp_config_path = None
         try:
-            temp_config_path = self._create_temp_config(proxy)
+            temp_config_path = self._create_temp_config(proxies)
             
             command = [self.mihomo_path, '-t', '-f', temp_config_path]
             
@@ -66,27 +142,119 @@ class ProxyValidator:
             )
 
             if result.returncode == 0:
-                self.logger.debug(f"节点 '{proxy.get('name')}' 格式正确。")
-                self.valid_proxies.append(proxy)
-                return True
-            else:
-                error_message = result.stderr.strip() or result.stdout.strip()
-                self.logger.error(f"节点 '{proxy.get('name')}' 格式错误: {error_message}")
-                self.invalid_proxies.append({
-                    'proxy_name': proxy.get('name'),
-                    'error': error_message,
-                    'proxy_config': proxy
-                })
-                return False
-        
-        except Exception as e:
-            self.logger.critical(f"验证节点 '{proxy.get('name')}' 时发生意外错误: {e}", exc_info=True)
-            return False
+                return True, None
+            return False, result.stderr.strip() or result.stdout.strip()
         
         finally:
             if temp_config_path and os.path.exists(temp_config_path):
                 os.remove(temp_config_path)
 
+    def _validate_chunk(self, proxies: list) -> list:
+        """
+        批量验证一组节点。整批通过则全部有效；否则二分查找出具体的无效节点。
+        单个节点的结果与 validate_single_proxy 完全一致。
+
+        Returns:
+            [(proxy, is_valid, error_message)] 列表，is_valid 为 None 表示验证过程出现意外错误
+        """
+        try:
+            ok, error_message = self._run_mihomo_check(proxies)
+        except Exception as e:
+            if len(proxies) > 1:
+                ok, error_message = False, None
+            else:
+                self.logger.critical(f"验证节点 '{proxies[0].get('name')}' 时发生意外错误: {e}", exc_info=True)
+                return [(proxies[0], None, None)]
+
+        if ok:
+            return [(proxy, True, None) for proxy in proxies]
+        if len(proxies) == 1:
+            return [(proxies[0], False, error_message)]
+
+        mid = len(proxies) // 2
+        return self._validate_chunk(proxies[:mid]) + self._validate_chunk(proxies[mid:])
+
+    def _record_result(self, proxy: dict, is_valid: bool, error_message: str) -> None:
+        """将单个节点的验证结果记录到有效/无效列表中"""
+        if is_valid:
+            self.logger.debug(f"节点 '{proxy.get('name')}' 格式正确。")
+            self.valid_proxies.append(proxy)
+        elif is_valid is False:
+            self.logger.error(f"节点 '{proxy.get('name')}' 格式错误: {error_message}")
+            self.invalid_proxies.append({
+                'proxy_name': proxy.get('name'),
+                'error': error_message,
+                'proxy_config': proxy
+            })
+
+    def validate_single_proxy(self, proxy: dict) -> bool:
+        """
+        使用 mihomo -t 验证单个代理节点的配置。
+        如果有效，则将其添加到 self.valid_proxies 列表中。
+        """
+        cached = self._lookup_cached([proxy])
+        if cached:
+            is_valid, error_message = cached[0]
+        else:
+            _, is_valid, error_message = self._validate_chunk([proxy])[0]
+            self._store_cached([(proxy, is_valid, error_message)])
+        self._record_result(proxy, is_valid, error_message)
+        return bool(is_valid)
+
+    def validate_proxies(self, proxies: list) -> None:
+        """
+        按批次并行验证所有节点：每批只启动一次 mihomo，失败的批次二分定位无效节点。
+        命中缓存的节点直接复用结果，只有未命中的节点会交给 mihomo。
+        结果按输入顺序写入 self.valid_proxies / self.invalid_proxies。
+        """
+        cached = self._lookup_cached(proxies)
+        misses = [proxy for i, proxy in enumerate(proxies) if i not in cached]
+        if self.cache is not None:
+            self.logger.info(f"缓存命中 {len(cached)} 个节点，需要验证 {len(misses)} 个新节点。")
+
+        batches = [misses[i:i + self.batch_size] for i in range(0, len(misses), self.batch_size)]
+        self.logger.info(f"共 {len(batches)} 个批次 (每批最多 {self.batch_size} 个节点)，使用 {self.max_jobs} 个并行任务验证...")
+
+        results = [None] * len(batches)
+        with ThreadPoolExecutor(max_workers=self.max_jobs) as executor:
+            future_to_index = {executor.submit(self._validate_chunk, batch): i for i, batch in enumerate(batches)}
+            for done, future in enumerate(as_completed(future_to_index), 1):
+                index = future_to_index[future]
+                results[index] = future.result()
+                self.logger.info(f"[{done}/{len(batches)}] 批次 {index + 1} 验证完成")
+
+        fresh = [item for batch_results in results for item in batch_results]
+        self._store_cached(fresh)
+
+        fresh_iter = iter(fresh)
+        for i, proxy in enumerate(proxies):
+            if i in cached:
+                is_valid, error_message = cached[i]
+            else:
+                _, is_valid, error_message = next(fresh_iter)
+            self._record_result(proxy, is_valid, error_message)
+
+    def filter_valid(self, proxies: list) -> list:
+        """
+        验证一组节点 (dict 或 Node) 并输出汇总日志，返回格式正确的节点 (保持原有顺序)。
+        进程内流水线直接调用此方法，run 读取输入文件后也由此完成验证。
+        """
+        self.logger.info(f"共发现 {len(proxies)} 个代理节点，开始批量验证...")
+        self.valid_proxies, self.invalid_proxies = [], []
+
+        self.validate_proxies(proxies)
+        self._record_rejected()
+
+        self.logger.info("--- 验证完成 ---")
+        self.logger.info(f"有效节点: {len(self.valid_proxies)}")
+        self.logger.info(f"无效节点: {len(self.invalid_proxies)}")
+
+        if self.invalid_proxies:
+            self.logger.warning("以下被剔除的节点存在格式问题:")
+            for item in self.invalid_proxies:
+                self.logger.warning(f"  - 节点: {item['proxy_name']} | 错误: {item['error']}")
+        return self.valid_proxies
+
     def run(self, input_file: str, output_valid_file: str = None):
         """
         执行验证和过滤流程
@@ -95,35 +263,19 @@ class ProxyValidator:
         
         try:
             with open(input_file, 'r', encoding='utf-8') as f:
-                all_proxies_data = yaml.safe_load(f)
+                all_proxies_data = load_yaml(f)
             
             if not isinstance(all_proxies_data, dict) or 'proxies' not in all_proxies_data:
                 self.logger.error(f"文件 {input_file} 格式不正确，应包含 'proxies' 列表。")
                 sys.exit(1)
 
-            all_proxies = all_proxies_data.get('proxies', [])
-            total_proxies = len(all_proxies)
-            self.logger.info(f"共发现 {total_proxies} 个代理节点，开始逐一验证...")
-
-            for i, proxy in enumerate(all_proxies):
-                proxy_identifier = proxy.get('name', str(proxy))
-                self.logger.info(f"[{i+1}/{total_proxies}] 正在验证: {proxy_identifier}")
-                self.validate_single_proxy(proxy)
-
-            self.logger.info("--- 验证完成 ---")
-            self.logger.info(f"有效节点: {len(self.valid_proxies)}")
-            self.logger.info(f"无效节点: {len(self.invalid_proxies)}")
-
-            if self.invalid_proxies:
-                self.logger.warning("以下被剔除的节点存在格式问题:")
-                for item in self.invalid_proxies:
-                    self.logger.warning(f"  - 节点: {item['proxy_name']} | 错误: {item['error']}")
+            self.filter_valid(as_nodes(all_proxies_data.pop('proxies') or []))
 
             if output_valid_file:
                 self.logger.info(f"将 {len(self.valid_proxies)} 个有效节点写入到: {output_valid_file}")
                 try:
                     with open(output_valid_file, 'w', encoding='utf-8') as f:
-                        yaml.dump({'proxies': self.valid_proxies}, f, allow_unicode=True, default_flow_style=False)
+                        dump_yaml({'proxies': as_dicts(self.valid_proxies)}, f, allow_unicode=True, default_flow_style=False)
                     self.logger.info("成功写入有效节点文件。")
                 except IOError as e:
                     self.logger.error(f"写入有效节点文件失败: {e}")
@@ -177,7 +329,7 @@ def main():
     主函数
     """
     parser = argparse.ArgumentParser(
-        description="使用 mihomo -t 逐个验证代理节点的格式，并过滤掉无效节点。"
+        description="使用 mihomo -t 批量验证代理节点的格式，并过滤掉无效节点。"
     )
     parser.add_argument(
         '-f', '--file',
@@ -196,6 +348,40 @@ def main():
         default=None,
         help='mihomo 可执行文件的路径。如果未提供，脚本将尝试自动查找。'
     )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=ValidationConfig.BATCH_SIZE,
+        help='每次 mihomo -t 调用验证的节点数 (1 表示逐个验证)。'
+    )
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=ValidationConfig.MAX_JOBS,
+        help='并行验证的批次数，默认等于 CPU 核心数。'
+    )
+    parser.add_argument(
+        '--cache-file',
+        type=str,
+        default=ValidationConfig.CACHE_FILE,
+        help='验证结果缓存文件路径，按节点指纹与 mihomo 版本复用历史验证结果。'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='禁用验证结果缓存，重新验证所有节点。'
+    )
+    parser.add_argument(
+        '--seen-index-file',
+        type=str,
+        default=SeenIndexConfig.FILE,
+        help='跨运行去重索引路径，格式无效的节点会写入其中，下次合并时直接跳过。'
+    )
+    parser.add_argument(
+        '--no-seen-index',
+        action='store_true',
+        help='不把格式无效的节点写入去重索引。'
+    )
     
     args = parser.parse_args()
     
@@ -208,8 +394,17 @@ def main():
         
     print(f"使用 mihomo 可执行文件: {mihomo_executable}")
 
-    validator = ProxyValidator(mihomo_path=mihomo_executable)
-    validator.run(args.file, args.output_valid)
+    validator = ProxyValidator(
+        mihomo_path=mihomo_executable,
+        batch_size=args.batch_size,
+        max_jobs=args.jobs,
+        cache_file=None if args.no_cache else args.cache_file,
+        seen_index_file=None if args.no_seen_index else args.seen_index_file
+    )
+    try:
+        validator.run(args.file, args.output_valid)
+    finally:
+        validator.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""测试公共配置：把项目根目录和 scripts 目录加入 Python 路径，与脚本的运行方式一致"""
+
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'scripts'))
+sys.path.insert(0, ROOT_DIR)
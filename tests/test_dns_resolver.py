@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""DNS 解析器测试：使用本地替身服务器，不依赖外部网络"""
+
+import asyncio
+
+import pytest
+
+from benchmark import StubDnsServer
+from core.dns_resolver import AsyncDnsResolver, DnsError, encode_name
+
+
+@pytest.mark.parametrize('name', ['a' * 64 + '.example', 'bad\u0080label.example'])
+def test_encode_name_rejects_unencodable_labels(name):
+    with pytest.raises(DnsError):
+        encode_name(name)
+
+
+def test_resolve_many_survives_unencodable_domain():
+    """无法编码的域名只算作无法解析，不影响同一批次中的其他域名"""
+    async def run():
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(StubDnsServer, local_addr=('127.0.0.1', 0))
+        port = transport.get_extra_info('sockname')[1]
+        resolver = AsyncDnsResolver(['127.0.0.1'], port=port, timeout=1.0, retries=0)
+        try:
+            return await resolver.resolve_many(['host1.bench.test', 'a' * 64 + '.bench.test'])
+        finally:
+            resolver.close()
+            transport.close()
+
+    results = asyncio.run(run())
+    assert results['host1.bench.test'] == ('10.0.0.1', 300)
+    assert results['a' * 64 + '.bench.test'] == (None, None)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+配置生成黄金测试：用固定的模板和节点生成配置，与仓库中的期望文件 (tests/golden/<布局>/) 逐字节比较。
+修改了输出格式时，使用 UPDATE_GOLDEN=1 运行本测试重新生成期望文件，并检查其差异后一同提交。
+"""
+
+import os
+
+import pytest
+
+import generate_config
+from core.constants import ProviderConfig
+from core.yaml_io import load_yaml
+from generate_config import ConfigGenerator, dump_config_text
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+TEMPLATE = 'config-template.yaml'
+
+# 覆盖全量配置、有节点的地区和没有节点的地区
+CONFIGS = [
+    {"filter": None, "output": "config/config.yaml", "template": TEMPLATE},
+    {"filter": "hk", "output": "config/config_hk.yaml", "template": TEMPLATE},
+    {"filter": "us", "output": "config/config_us.yaml", "template": TEMPLATE},
+    {"filter": "kr", "output": "config/config_kr.yaml", "template": TEMPLATE},
+]
+
+
+def _load_golden_yaml(name: str):
+    with open(os.path.join(GOLDEN_DIR, name), 'r', encoding='utf-8') as f:
+        return load_yaml(f)
+
+
+def _golden_nodes(shared: bool = False) -> list:
+    """固定节点；shared 为 True 时让两个节点引用同一个 smux 字典"""
+    nodes = _load_golden_yaml('nodes.yaml')['proxies']
+    if shared:
+        smux = {'enabled': True, 'protocol': 'h2mux'}
+        nodes[0]['smux'] = smux
+        nodes[2]['smux'] = smux
+    return nodes
+
+
+def _render(tmp_path, monkeypatch, output_format: str, nodes: list) -> dict:
+    """在临时目录中生成配置，返回 {输出路径: 文件内容 (bytes)}"""
+    monkeypatch.setattr(generate_config, 'CONFIGS_TO_GENERATE', CONFIGS)
+    monkeypatch.setattr(ProviderConfig, 'URL_TEMPLATE', 'https://cdn.example.com/{repo}/{file}')
+    monkeypatch.setattr(ProviderConfig, 'REPOSITORY', 'owner/repo')
+    monkeypatch.setattr(ProviderConfig, 'INTERVAL', 3600)
+    monkeypatch.setattr(ProviderConfig, 'HEALTH_CHECK_URL', 'https://cp.cloudflare.com/generate_204')
+    monkeypatch.setattr(ProviderConfig, 'HEALTH_CHECK_INTERVAL', 300)
+    monkeypatch.chdir(tmp_path)
+
+    generator = ConfigGenerator(render_workers=1, output_format=output_format, precompress=[])
+    generator.templates = {TEMPLATE: _load_golden_yaml('template.yaml')}
+    entries = generator.generate_all_configs(nodes)
+    outputs = {}
+    for path in entries:
+        with open(path, 'rb') as f:
+            outputs[path] = f.read()
+    return outputs
+
+
+def _assert_matches_golden(layout: str, outputs: dict) -> None:
+    """生成的文件集合与每个文件的内容都应与期望文件完全相同"""
+    directory = os.path.join(GOLDEN_DIR, layout)
+    if os.environ.get('UPDATE_GOLDEN'):
+        for path, data in outputs.items():
+            target = os.path.join(directory, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(data)
+
+    expected = {}
+    for root, _, files in os.walk(directory):
+        for name in files:
+            full_path = os.path.join(root, name)
+            with open(full_path, 'rb') as f:
+                expected[os.path.relpath(full_path, directory).replace(os.sep, '/')] = f.read()
+    assert sorted(outputs) == sorted(expected)
+    for path, data in outputs.items():
+        assert data == expected[path], f"{layout}/{path} 与期望文件不一致"
+
+
+def test_inline_layout_matches_golden(tmp_path, monkeypatch):
+    _assert_matches_golden('inline', _render(tmp_path, monkeypatch, 'inline', _golden_nodes()))
+
+
+def test_inline_layout_with_shared_objects_matches_golden(tmp_path, monkeypatch):
+    """节点之间共享同一个字典时不能分段拼接，应退回整体序列化并输出锚点和别名"""
+    nodes = _golden_nodes(shared=True)
+    assert generate_config.has_shared_objects(nodes)
+    outputs = _render(tmp_path, monkeypatch, 'inline', nodes)
+    assert b'&id001' in outputs['config/config.yaml']
+    _assert_matches_golden('shared', outputs)
+
+
+def test_provider_layout_matches_golden(tmp_path, monkeypatch):
+    _assert_matches_golden('provider', _render(tmp_path, monkeypatch, 'provider', _golden_nodes()))
+
+
+@pytest.mark.parametrize('layout', ['inline', 'shared'])
+def test_golden_matches_whole_document_dump(layout):
+    """期望文件本身应与整体序列化 (拼接优化之前的实现) 一致"""
+    template = _load_golden_yaml('template.yaml')
+    prepared = [ConfigGenerator.prepare_node(node) for node in _golden_nodes(shared=layout == 'shared')]
+    with open(os.path.join(GOLDEN_DIR, layout, 'config', 'config.yaml'), 'rb') as f:
+        assert f.read() == dump_config_text({**template, 'proxies': prepared}).encode('utf-8')
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""合并阶段的订阅解析测试：解析缓存命中时产出的节点应与重新解析完全相同，出错的文件整个丢弃"""
+
+import datetime
+import logging
+import pickle
+
+import pytest
+
+from core.cache import PersistentCache
+from merge_proxies import _file_digest, _iter_source_proxies
+
+SUBSCRIPTION = """\
+proxies:
+  - name: node-1
+    type: ss
+    server: 10.0.0.1
+    port: 8388
+    cipher: aes-256-gcm
+    password: pw
+    udp: true
+    plugin-opts:
+      mode: websocket
+      host: ""
+  - name: node-2
+    type: trojan
+    server: 10.0.0.2
+    port: 443
+    password: "1234"
+    alpn: [h2, 1.1, 2]
+"""
+
+# 含有 JSON 无法原样表示的值：非字符串键与日期
+EXOTIC_SUBSCRIPTION = """\
+proxies:
+  - name: node-3
+    type: ss
+    server: 10.0.0.3
+    port: 8388
+    cipher: aes-256-gcm
+    password: pw
+    plugin-opts:
+      1: one
+      true: yes-key
+    created: 2024-01-02
+"""
+
+
+def _collect(proxies_dir: str, cache, parse_workers: int = 1) -> tuple:
+    stats = {'loaded': 0}
+    proxies = list(_iter_source_proxies(proxies_dir, stats, logging.getLogger(__name__), parse_workers, parse_cache=cache))
+    return proxies, stats
+
+
+@pytest.mark.parametrize('parse_workers', [1, 2])
+def test_parse_cache_hit_equals_fresh_parse(tmp_path, parse_workers):
+    proxies_dir = tmp_path / 'subs'
+    proxies_dir.mkdir()
+    (proxies_dir / 'a.yaml').write_text(SUBSCRIPTION, encoding='utf-8')
+    (proxies_dir / 'b.yaml').write_text(EXOTIC_SUBSCRIPTION, encoding='utf-8')
+
+    with PersistentCache(str(tmp_path / 'parse_cache.sqlite')) as cache:
+        fresh, stats = _collect(str(proxies_dir), cache, parse_workers)
+        assert stats['cached_files'] == 0
+        cached, stats = _collect(str(proxies_dir), cache, parse_workers)
+        # 无法原样经过 JSON 的文件不缓存，每次都重新解析
+        assert stats['cached_files'] == 1
+
+    exotic = next(p for p in fresh if p['name'] == 'node-3')
+    assert exotic['plugin-opts'] == {1: 'one', True: 'yes-key'}
+    assert exotic['created'] == datetime.date(2024, 1, 2)
+    key = lambda p: p['name']
+    assert sorted(cached, key=key) == sorted(fresh, key=key)
+
+
+def test_parse_cache_ignores_undecodable_entries(tmp_path):
+    """无法按 JSON 解码的条目 (如旧版本写入的 pickle 数据) 视为未命中，重新解析后覆盖"""
+    proxies_dir = tmp_path / 'subs'
+    proxies_dir.mkdir()
+    path = proxies_dir / 'a.yaml'
+    path.write_text(SUBSCRIPTION, encoding='utf-8')
+    cache_file = str(tmp_path / 'parse_cache.sqlite')
+
+    with PersistentCache(cache_file) as cache:
+        cache._conn.execute(
+            'INSERT INTO entries (key, value, expires_at, last_used) VALUES (?, ?, NULL, 0)',
+            (_file_digest(str(path)), pickle.dumps([{'name': 'stale'}]))
+        )
+        cache._conn.commit()
+        proxies, stats = _collect(str(proxies_dir), cache)
+        assert stats['cached_files'] == 0
+        assert [p['name'] for p in proxies] == ['node-1', 'node-2']
+        cached, stats = _collect(str(proxies_dir), cache)
+        assert stats['cached_files'] == 1
+        assert cached == proxies
+
+
+@pytest.mark.parametrize('parse_workers', [1, 2])
+def test_truncated_file_is_dropped_whole(tmp_path, parse_workers):
+    """解析出错的文件整个丢弃，结果与解析进程数无关"""
+    proxies_dir = tmp_path / 'subs'
+    proxies_dir.mkdir()
+    (proxies_dir / 'a.yaml').write_text(SUBSCRIPTION, encoding='utf-8')
+    # 在第二个节点中途截断，并留下未闭合的流式列表
+    broken = SUBSCRIPTION.replace('10.0.0', '10.0.1')
+    (proxies_dir / 'b.yaml').write_text(broken[:broken.index('alpn:')] + 'alpn: [h2, ', encoding='utf-8')
+
+    proxies, stats = _collect(str(proxies_dir), None, parse_workers)
+    assert sorted(p['server'] for p in proxies) == ['10.0.0.1', '10.0.0.2']
+    assert stats['loaded'] == 2
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""紧凑节点模型的测试：修改字段后指纹与去重键应与等价 dict 的结果一致"""
+
+import pytest
+
+from core.fingerprint import dedupe_key, proxy_fingerprint
+from core.node import Node
+
+PROXY = {
+    'name': 'node-1', 'type': 'vmess', 'server': 'example.com', 'port': 443,
+    'uuid': 'a3482e88-686a-4a58-8126-000000000001', 'alterId': 0, 'cipher': 'auto', 'tls': True,
+}
+
+
+@pytest.mark.parametrize('key, value', [
+    ('server', '10.0.0.1'),
+    ('port', 8443),
+    ('type', 'vless'),
+    ('server_url', 'other.example.com'),
+    ('uuid', 'a3482e88-686a-4a58-8126-000000000002'),
+])
+def test_set_invalidates_fingerprint(key, value):
+    node = Node.from_dict(PROXY)
+    before = node.fingerprint
+    node.set(key, value)
+    expected = {**PROXY, key: value}
+    assert node.get(key) == value
+    assert node.fingerprint == proxy_fingerprint(expected) != before
+    assert dedupe_key(node) == dedupe_key(expected)
+
+
+def test_set_name_keeps_fingerprint():
+    node = Node.from_dict(PROXY)
+    before = node.fingerprint
+    node.set('name', 'renamed')
+    node.set('_delay', 120)
+    assert node.fingerprint == before
+    assert node.to_dict() == {**PROXY, 'name': 'renamed', '_delay': 120}